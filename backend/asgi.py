@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# the streams use Django settings so they must be imported after the setup
+from devices.streams import router  # noqa: E402
+
+application = router(django_application)
@@ -0,0 +1,298 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+try:
+    from prometheus_client import REGISTRY
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+except ImportError:
+    REGISTRY = None
+
+logger = logging.getLogger('django')
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.released_at = self.created_at
+
+
+class ConnectionPool:
+    """
+    Thread safe pool of the database connections. The idle connections are checked on the checkout, the connections
+    older than max_lifetime are closed and replaced, so the server side resources and the load balancer routing
+    are refreshed. At most max_size connections are open, the checkout waits up to timeout seconds for a free one.
+    """
+
+    def __init__(self, connect, close, check=None, reset=None, name: str = 'default', max_size: int = 10,
+                 max_lifetime: float = 30 * 60, timeout: float = 10, check_after: float = 0,
+                 stats_interval: float = 60):
+        """
+        :param connect: callable opening a new connection
+        :param close: callable closing the connection
+        :param check: callable returning False when the idle connection can't be used
+        :param reset: callable preparing the released connection for the next user, returns False when it's broken
+        :param check_after: seconds of idleness after which the connection is checked on the checkout
+        :param stats_interval: seconds between the logged stats, 0 disables the logging
+        """
+        self.connect = connect
+        self.close_connection = close
+        self.check = check
+        self.reset = reset
+        self.name = name
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.check_after = check_after
+        self.stats_interval = stats_interval
+        self.pid = os.getpid()
+        self.__condition = threading.Condition()
+        self.__idle = deque()
+        # connection id: PooledConnection
+        self.__in_use = {}
+        self.__opening = 0
+        self.__logged_at = time.monotonic()
+        self.metrics = {
+            'created': 0,
+            'reused': 0,
+            'expired': 0,
+            'unhealthy': 0,
+            'broken': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'wait_ms': 0.0,
+        }
+
+    def acquire(self):
+        """
+        Check out the connection, the idle ones are reused first
+        :return: connection
+        """
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        start = time.perf_counter()
+        with self.__condition:
+            while not self.__idle and len(self.__in_use) + self.__opening >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.metrics['timeouts'] += 1
+                    raise PoolTimeout('Database pool %s - no connection available in %s seconds' % (
+                        self.name, self.timeout))
+                waited = True
+                self.__condition.wait(remaining)
+            if waited:
+                self.metrics['waits'] += 1
+                self.metrics['wait_ms'] += (time.perf_counter() - start) * 1000
+            pooled = self.__idle.pop() if self.__idle else None
+            # reserve the place before the connection is checked or opened outside the lock
+            self.__opening += 1
+
+        created = False
+        try:
+            if pooled is not None and not self.__usable(pooled):
+                self.__discard(pooled)
+                pooled = None
+            if pooled is None:
+                pooled = PooledConnection(self.connect())
+                created = True
+        except Exception:
+            with self.__condition:
+                self.__opening -= 1
+                self.__condition.notify()
+            raise
+
+        with self.__condition:
+            self.__opening -= 1
+            self.__in_use[id(pooled.connection)] = pooled
+            self.metrics['created' if created else 'reused'] += 1
+        self.__log_stats()
+        return pooled.connection
+
+    def release(self, connection):
+        """
+        Return the connection to the pool, the expired and broken connections are closed
+        :param connection: connection checked out from this pool
+        :return: None
+        """
+        with self.__condition:
+            pooled = self.__in_use.pop(id(connection), None)
+        if pooled is None:
+            # not checked out from this pool, e.g. opened before the fork. The socket is shared with the parent
+            # process and closing it would end the parent's session, so only the reference is dropped
+            return
+        alive = self.__alive(pooled)
+        try:
+            keep = alive and (self.reset is None or self.reset(connection) is not False)
+        except Exception:
+            keep = False
+        if not keep:
+            self.__discard(pooled)
+        with self.__condition:
+            if keep:
+                pooled.released_at = time.monotonic()
+                self.__idle.append(pooled)
+            else:
+                self.metrics['broken' if alive else 'expired'] += 1
+            self.__condition.notify()
+
+    def discard(self, connection):
+        """
+        Close the checked out connection instead of returning it to the pool, e.g. when it's still referenced
+        :param connection: connection checked out from this pool
+        :return: None
+        """
+        with self.__condition:
+            pooled = self.__in_use.pop(id(connection), None)
+            self.__condition.notify()
+        # the connection opened before the fork is only dropped, see release
+        if pooled is not None:
+            self.__discard(pooled)
+
+    def __alive(self, pooled: PooledConnection) -> bool:
+        return time.monotonic() - pooled.created_at < self.max_lifetime
+
+    def __usable(self, pooled: PooledConnection) -> bool:
+        if not self.__alive(pooled):
+            with self.__condition:
+                self.metrics['expired'] += 1
+            return False
+        if self.check is None or time.monotonic() - pooled.released_at < self.check_after:
+            return True
+        try:
+            healthy = self.check(pooled.connection) is not False
+        except Exception:
+            healthy = False
+        if not healthy:
+            with self.__condition:
+                self.metrics['unhealthy'] += 1
+        return healthy
+
+    def __discard(self, pooled: PooledConnection):
+        try:
+            self.close_connection(pooled.connection)
+        except Exception as e:
+            logger.warning('Database pool %s - error when closing the connection; %s', self.name, e)
+
+    def stats(self) -> dict:
+        with self.__condition:
+            return {
+                'name': self.name,
+                'size': len(self.__idle) + len(self.__in_use),
+                'idle': len(self.__idle),
+                'in_use': len(self.__in_use),
+                'max_size': self.max_size,
+                **self.metrics,
+                'wait_ms': round(self.metrics['wait_ms'], 2),
+            }
+
+    def __log_stats(self):
+        if not self.stats_interval or time.monotonic() - self.__logged_at < self.stats_interval:
+            return
+        self.__logged_at = time.monotonic()
+        logger.info('Database pool %s', json.dumps(self.stats()))
+
+    def clear(self):
+        """
+        Close the idle connections, the connections in use are closed when released
+        """
+        with self.__condition:
+            idle = list(self.__idle)
+            self.__idle.clear()
+        for pooled in idle:
+            self.__discard(pooled)
+
+    def __len__(self):
+        with self.__condition:
+            return len(self.__idle) + len(self.__in_use)
+
+
+pools = {}
+pools_lock = threading.Lock()
+collector = None
+collector_lock = threading.Lock()
+
+
+class PoolCollector:
+    """
+    Prometheus collector of the pool stats, the stats of the process pools are read on the scrape
+    """
+    gauges = {
+        'idle': 'Idle connections',
+        'in_use': 'Checked out connections',
+        'max_size': 'Maximum number of the open connections',
+    }
+    counters = {
+        'created': 'Opened connections',
+        'reused': 'Checkouts of the idle connections',
+        'expired': 'Connections closed after the max lifetime',
+        'unhealthy': 'Idle connections failing the check on the checkout',
+        'broken': 'Connections closed on the release',
+        'waits': 'Checkouts waiting for a free connection',
+        'timeouts': 'Checkouts timed out',
+    }
+
+    def collect(self):
+        with pools_lock:
+            current = [pool for pool in pools.values() if pool.pid == os.getpid()]
+        # the pools of the alias with the different connection parameters are summed
+        totals = {}
+        for pool in current:
+            stats = pool.stats()
+            total = totals.setdefault(pool.name, dict.fromkeys([*self.gauges, *self.counters, 'wait_ms'], 0))
+            for name in total:
+                total[name] += stats[name]
+        for name, documentation in self.gauges.items():
+            metric = GaugeMetricFamily('db_pool_%s' % name, documentation, labels=['pool'])
+            for pool, total in totals.items():
+                metric.add_metric([pool], total[name])
+            yield metric
+        for name, documentation in self.counters.items():
+            metric = CounterMetricFamily('db_pool_%s' % name, documentation, labels=['pool'])
+            for pool, total in totals.items():
+                metric.add_metric([pool], total[name])
+            yield metric
+        metric = CounterMetricFamily('db_pool_wait_seconds', 'Time the checkouts waited for a free connection',
+                                     labels=['pool'])
+        for pool, total in totals.items():
+            metric.add_metric([pool], total['wait_ms'] / 1000)
+        yield metric
+
+
+def register_collector(registry=None):
+    """
+    Export the pool stats through the Prometheus registry, it's done once per process
+    when prometheus_client is installed
+    :param registry: CollectorRegistry, the default registry when None
+    :return: None
+    """
+    global collector
+    if REGISTRY is None or collector is not None:
+        return
+    with collector_lock:
+        if collector is None:
+            collector = PoolCollector()
+            (registry or REGISTRY).register(collector)
+
+
+def get_pool(key, factory) -> ConnectionPool:
+    """
+    Get the process wide pool, a forked process creates its own pools instead of sharing the parent's sockets
+    :param key: hashable pool identifier, e.g. the alias and the connection parameters
+    :param factory: callable creating the pool
+    :return: ConnectionPool
+    """
+    with pools_lock:
+        pool = pools.get(key)
+        if pool is None or pool.pid != os.getpid():
+            pool = pools[key] = factory()
+    # the registry collects the metrics on the registration, it takes the pools lock
+    register_collector()
+    return pool
@@ -0,0 +1,113 @@
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+from django.db.backends.postgresql import base, creation
+
+from backend.db.pool import ConnectionPool, get_pool, pools, pools_lock
+
+POOL_DEFAULTS = {
+    'MAX_SIZE': 10,
+    # seconds
+    'MAX_LIFETIME': 30 * 60,
+    'TIMEOUT': 10,
+    # the idle connections are checked with SELECT 1 on the checkout after CHECK_AFTER seconds of idleness
+    'CHECK_AFTER': 0,
+    'STATS_INTERVAL': 60,
+}
+
+
+def connect(conn_params: dict):
+    connection = psycopg2.connect(**conn_params)
+    # the same as the Django backend, JSONField decodes the jsonb itself
+    psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+    return connection
+
+
+def check(connection) -> bool:
+    if connection.closed:
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    if connection.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+    return True
+
+
+def reset(connection) -> bool:
+    """
+    Roll back the transaction left open, the connection in the unknown state is closed
+    """
+    if connection.closed:
+        return False
+    status = connection.get_transaction_status()
+    if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+    return True
+
+
+def close_pools(alias: str):
+    """
+    Close the idle connections of the database alias, e.g. before the test database is dropped
+    """
+    with pools_lock:
+        alias_pools = [pool for key, pool in pools.items() if key[0] == alias]
+    for pool in alias_pools:
+        pool.clear()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _clone_test_db(self, suffix, verbosity, keepdb=False):
+        # the source database can't be used as the template while the pooled connections are open
+        close_pools(self.connection.alias)
+        super()._clone_test_db(suffix, verbosity, keepdb)
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_pools(self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL backend taking the connections from the process wide pool. Closing the connection returns it
+    to the pool, so the requests don't pay for the new SSL connection. The pool is configured by the POOL
+    dictionary of the database settings, see POOL_DEFAULTS.
+    """
+    creation_class = DatabaseCreation
+
+    def get_pool(self, conn_params: dict) -> ConnectionPool:
+        options = {**POOL_DEFAULTS, **self.settings_dict.get('POOL', {})}
+        key = (self.alias, tuple(sorted((name, str(value)) for name, value in conn_params.items())))
+        return get_pool(key, lambda: ConnectionPool(
+            lambda: connect(conn_params), lambda connection: connection.close(), check=check, reset=reset,
+            name=self.alias, max_size=options['MAX_SIZE'], max_lifetime=options['MAX_LIFETIME'],
+            timeout=options['TIMEOUT'], check_after=options['CHECK_AFTER'],
+            stats_interval=options['STATS_INTERVAL'],
+        ))
+
+    def get_new_connection(self, conn_params):
+        connection = self.get_pool(conn_params).acquire()
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            pool = self.get_pool(self.get_connection_params())
+            with self.wrap_database_errors:
+                if self.in_atomic_block:
+                    # Django keeps the connection closed inside the atomic block until the block exits,
+                    # it can't be checked out by another thread meanwhile
+                    pool.discard(self.connection)
+                else:
+                    pool.release(self.connection)
+
+    def pool_stats(self) -> dict:
+        return self.get_pool(self.get_connection_params()).stats()
@@ -0,0 +1,105 @@
+import atexit
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+
+class QueuedHandler(QueueHandler):
+    """
+    Log handler putting the records to the queue, the target handler is called by the listener thread
+    so the logging thread doesn't wait for the I/O
+    """
+
+    def __init__(self, target: logging.Handler):
+        super().__init__(queue.SimpleQueue())
+        self.target = target
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        self.__started = True
+        atexit.register(self.stop)
+
+    def stop(self):
+        # write the queued records before exit
+        if self.__started:
+            self.__started = False
+            self.listener.stop()
+        self.target.close()
+
+    def close(self):
+        self.stop()
+        super().close()
+
+
+class QueuedStreamHandler(QueuedHandler):
+    """
+    Queued handler writing to the stream, stdout by default. Every process writes its own lines
+    so it's safe with many workers, the platform collects the output.
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(logging.StreamHandler(stream or sys.stdout))
+
+
+class QueuedRotatingFileHandler(QueuedHandler):
+    """
+    Queued handler writing to the file rotated by the size, or by the time when `when` is given, e.g. 'midnight'.
+    The rotation renames the file, so the processes can't share it, {pid} in the filename is replaced
+    by the process id.
+    """
+
+    def __init__(self, filename, maxBytes: int = 0, backupCount: int = 0, when: str = None, encoding: str = None):
+        filename = str(filename).replace('{pid}', str(os.getpid()))
+        if when:
+            target = TimedRotatingFileHandler(filename, when=when, backupCount=backupCount, encoding=encoding,
+                                              delay=True)
+        else:
+            target = RotatingFileHandler(filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding,
+                                         delay=True)
+        super().__init__(target)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let through at most `rate` records of the same message per `period` seconds. The message is the format
+    string before the arguments are applied, so the logging calls must pass the arguments lazily.
+    The next record after the period reports the number of the suppressed ones. The records from ERROR up
+    and the records logged with extra={'rate_limit': False} are never suppressed.
+    """
+
+    def __init__(self, rate: int = 10, period: float = 60, name: str = ''):
+        super().__init__(name)
+        self.rate = rate
+        self.period = period
+        self.__lock = threading.Lock()
+        # key: [window start, records in the window, suppressed records]
+        self.__windows = {}
+
+    def filter(self, record) -> bool:
+        if record.levelno >= logging.ERROR or not getattr(record, 'rate_limit', True):
+            return True
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self.__lock:
+            window = self.__windows.get(key)
+            if window is None or now - window[0] >= self.period:
+                suppressed = window[2] if window else 0
+                self.__windows[key] = [now, 1, 0]
+                if len(self.__windows) > 1000:
+                    self.__expire(now)
+            elif window[1] < self.rate:
+                window[1] += 1
+                return True
+            else:
+                window[2] += 1
+                return False
+        if suppressed:
+            record.msg = '%s (%i similar messages suppressed)' % (record.msg, suppressed)
+        return True
+
+    def __expire(self, now: float):
+        for key in [key for key, window in self.__windows.items() if now - window[0] >= self.period]:
+            del self.__windows[key]
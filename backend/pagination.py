@@ -0,0 +1,58 @@
+from functools import lru_cache
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+from backend.projections import Projection
+
+
+class KeysetPagination(CursorPagination):
+    """
+    The cursor pagination on the primary key, the next page is selected by pk > last pk so it doesn't
+    count or offset the rows. The page size is set by ?limit=.
+    The lists are paginated only when ?limit= or ?cursor= is given, otherwise the plain list is returned.
+    """
+    ordering = 'pk'
+    page_size_query_param = 'limit'
+    max_page_size = 1000
+
+    @classmethod
+    def requested(cls, request) -> bool:
+        return cls.page_size_query_param in request.query_params or cls.cursor_query_param in request.query_params
+
+
+@lru_cache(maxsize=64)
+def get_projection(serializer_class, fields: tuple or None) -> Projection:
+    return Projection(serializer_class, list(fields) if fields is not None else None)
+
+
+def request_projection(request, serializer_class) -> Projection:
+    """
+    Get the projection of the serializer limited to ?fields=pk,name
+    :param request:
+    :param serializer_class:
+    :return: Projection
+    """
+    fields = request.query_params.get('fields')
+    try:
+        return get_projection(serializer_class, tuple(field for field in fields.split(',') if field) if fields else None)
+    except ValueError as error:
+        raise ValidationError({'error': str(error)})
+
+
+def list_response(request, queryset, serializer_class, view=None) -> Response:
+    """
+    Render the list of the queryset, paginated when requested
+    :param request:
+    :param queryset:
+    :param serializer_class: serializer of the listed objects
+    :param view:
+    :return: Response
+    """
+    projection = request_projection(request, serializer_class)
+    if not KeysetPagination.requested(request):
+        return Response(projection.render(queryset))
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(projection.values(queryset), request, view)
+    return paginator.get_paginated_response(projection.render_rows(page))
@@ -0,0 +1,115 @@
+from collections import Counter
+from contextlib import ExitStack
+import json
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('django')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper counting the queries, their time and the repeated statements
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    def most_repeated(self) -> tuple:
+        """
+        :return: (sql, count) of the most repeated statement, the N+1 queries repeat the same statement
+        """
+        if not self.statements:
+            return None, 0
+        return self.statements.most_common(1)[0]
+
+
+def view_name(request) -> str or None:
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    view_class = getattr(match.func, 'view_class', None)
+    return view_class.__name__ if view_class else match.func.__name__
+
+
+class ProfilingMiddleware:
+    """
+    Record the wall time, number and time of the SQL queries and the most repeated query of the sampled requests.
+    The requests slower than PROFILING['SLOW_REQUEST_MS'] are logged as warnings. The views exceeding their
+    QUERY_BUDGETS are logged, or raise QueryBudgetExceeded in the raise mode used by the tests.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    @staticmethod
+    def options() -> dict:
+        options = {'ENABLED': True, 'SAMPLE_RATE': 0.01, 'SLOW_REQUEST_MS': 500, 'MODE': 'log'}
+        options.update(getattr(settings, 'PROFILING', {}))
+        return options
+
+    def __call__(self, request):
+        options = self.options()
+        if not options['ENABLED'] or random.random() >= options['SAMPLE_RATE']:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        record = self.record(request, response, recorder, duration)
+        if record['duration_ms'] >= options['SLOW_REQUEST_MS']:
+            logger.warning('Slow request %s', json.dumps(record))
+        elif logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Request %s', json.dumps(record))
+        self.check_budget(record, options['MODE'])
+        return response
+
+    @staticmethod
+    def record(request, response, recorder: QueryRecorder, duration: float) -> dict:
+        sql, repeated = recorder.most_repeated()
+        return {
+            'view': view_name(request),
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'queries': recorder.count,
+            'sql_ms': round(recorder.duration * 1000, 2),
+            'most_repeated': {'sql': sql, 'count': repeated},
+        }
+
+    @staticmethod
+    def check_budget(record: dict, mode: str):
+        budget = getattr(settings, 'QUERY_BUDGETS', {}).get(record['view'])
+        if budget is None or record['queries'] <= budget:
+            return
+        message = '%s executed %i queries, the budget is %i; the most repeated %i times: %s' % (
+            record['view'], record['queries'], budget, record['most_repeated']['count'],
+            record['most_repeated']['sql'])
+        if mode == 'raise':
+            raise QueryBudgetExceeded(message)
+        logger.warning('Query budget exceeded; %s', message)
@@ -0,0 +1,119 @@
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.settings import api_settings
+
+# the representation of these fields is the database value itself
+PASSTHROUGH_FIELDS = (
+    serializers.IntegerField,
+    serializers.FloatField,
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.EmailField,
+    serializers.JSONField,
+    serializers.ReadOnlyField,
+)
+
+
+class Projection:
+    """
+    Read-only fast path of the model serializer. The fields of the serializer are resolved once to the
+    database columns and representation functions, the objects are rendered from the queryset values()
+    without building the model instances and the serializer fields per object.
+    The output is the same as the serializer data for the plain model fields and primary key relations.
+    """
+
+    def __init__(self, serializer_class, fields: list = None):
+        """
+        :param serializer_class: ModelSerializer class
+        :param fields: names of the serializer fields to render, all readable fields if None
+        """
+        serializer_fields = serializer_class().fields
+        names = fields if fields is not None else \
+            [name for name, field in serializer_fields.items() if not field.write_only]
+        self.columns = []
+        self.fields = []
+        for name in names:
+            field = serializer_fields.get(name)
+            if field is None or field.write_only:
+                raise ValueError('The field %s doesn\'t exist' % name)
+            if isinstance(field, serializers.BaseSerializer) or field.source == '*' or '.' in field.source:
+                raise ValueError('The field %s of %s can\'t be projected' % (name, serializer_class.__name__))
+            if isinstance(field, PrimaryKeyRelatedField) and field.pk_field is not None:
+                raise ValueError('The field %s of %s can\'t be projected' % (name, serializer_class.__name__))
+            self.columns.append(field.source)
+            self.fields.append(field)
+        self.names = list(names)
+        self.key = '%s:%s' % (serializer_class.__name__, ','.join(self.names))
+
+    @staticmethod
+    def converter(field):
+        """
+        Get the representation function of the field, None if the value is represented by itself
+        :param field: serializer field
+        :return: callable or None
+        """
+        # the primary key relation is represented by the related pk which is the column value
+        if type(field) in PASSTHROUGH_FIELDS or isinstance(field, PrimaryKeyRelatedField):
+            return None
+        # the string choice is represented by its value
+        if type(field) is serializers.ChoiceField and \
+                all(isinstance(key, str) for key in field.choice_strings_to_values.values()):
+            return None
+        if type(field) is serializers.DateTimeField and \
+                getattr(field, 'format', api_settings.DATETIME_FORMAT).lower() == ISO_8601:
+            return iso_datetime(field)
+        return field.to_representation
+
+    def render(self, queryset) -> list:
+        """
+        Render the queryset as the list of dicts
+        :param queryset:
+        :return: list
+        """
+        fields = list(zip(self.names, [self.converter(field) for field in self.fields]))
+        return [
+            {
+                name: value if converter is None or value is None else converter(value)
+                for (name, converter), value in zip(fields, row)
+            } for row in queryset.values_list(*self.columns)
+        ]
+
+    def values(self, queryset, *extra):
+        """
+        Get the values queryset of the projected columns, e.g. to be paginated
+        :param queryset:
+        :param extra: other columns needed, the pk is always selected
+        :return: QuerySet
+        """
+        return queryset.values(*dict.fromkeys(self.columns + ['pk'] + list(extra)))
+
+    def render_rows(self, rows) -> list:
+        """
+        Render the rows of the values queryset
+        :param rows: iterable of dicts
+        :return: list
+        """
+        fields = list(zip(self.names, self.columns, [self.converter(field) for field in self.fields]))
+        return [
+            {
+                name: row[column] if converter is None or row[column] is None else converter(row[column])
+                for name, column, converter in fields
+            } for row in rows
+        ]
+
+
+def iso_datetime(field):
+    """
+    The DateTimeField representation with the time zone resolved once rather than per value
+    :param field: DateTimeField
+    :return: callable
+    """
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+
+    def to_representation(value):
+        if field_timezone is None or not timezone.is_aware(value):
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return to_representation
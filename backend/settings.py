@@ -49,6 +49,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'backend.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -96,12 +97,40 @@ REST_FRAMEWORK = {
     ),
 
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedJWTAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_VERSIONING_CLASS': 'rest_framework.versioning.NamespaceVersioning',
 }
+# the sampled requests are profiled, the slow ones are logged. The test runner profiles every request
+# and the exceeded query budgets fail the tests
+PROFILING = {
+    'ENABLED': os.environ.get('PROFILING_ENABLED', 'True') == 'True',
+    'SAMPLE_RATE': float(os.environ.get('PROFILING_SAMPLE_RATE', 0.01)),
+    'SLOW_REQUEST_MS': int(os.environ.get('PROFILING_SLOW_REQUEST_MS', 500)),
+    'MODE': os.environ.get('PROFILING_MODE', 'log'),
+}
+TEST_RUNNER = 'backend.test_runner.ProfilingTestRunner'
+# maximum SQL queries per request of the view, including the authentication
+QUERY_BUDGETS = {
+    'DashboardView': 10,
+    'DeviceList': 5,
+    'DeviceReadings': 3,
+    'DeviceReadingsBulk': 3,
+    'DeviceLogByDate': 4,
+    'DeviceSearch': 4,
+    'WorkspaceList': 10,
+    'WorkspaceSummary': 3,
+    'UserList': 5,
+    # the readings are saved per device
+    'UpdateReadings': 50,
+}
+
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+# the queued mails are sent in batches over one connection, the failures are retried with the backoff in seconds
+MAIL_QUEUE_BATCH_SIZE = int(os.environ.get('MAIL_QUEUE_BATCH_SIZE', 50))
+MAIL_QUEUE_MAX_RETRIES = int(os.environ.get('MAIL_QUEUE_MAX_RETRIES', 3))
+MAIL_QUEUE_BACKOFF = float(os.environ.get('MAIL_QUEUE_BACKOFF', 1))
 
 # Following is added to enable registration with email instead of username
 AUTHENTICATION_BACKENDS = (
@@ -140,6 +169,29 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# seconds the user authenticated by JWT is cached, at most ACCESS_TOKEN_LIFETIME
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get('AUTH_USER_CACHE_TIMEOUT', 60))
+
+# seconds the user authenticated by the DRF token is cached, the in-process cache is in front of the shared one
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.environ.get('AUTH_TOKEN_CACHE_TIMEOUT', 5 * 60))
+AUTH_TOKEN_LOCAL_CACHE_SIZE = int(os.environ.get('AUTH_TOKEN_LOCAL_CACHE_SIZE', 1000))
+AUTH_TOKEN_LOCAL_CACHE_TIMEOUT = int(os.environ.get('AUTH_TOKEN_LOCAL_CACHE_TIMEOUT', 5))
+
+# number of the logins verified at once and the failed attempts allowed per username and client IP in the seconds window
+LOGIN_HASHER_WORKERS = int(os.environ.get('LOGIN_HASHER_WORKERS', 4))
+LOGIN_RATE_LIMIT = (int(os.environ.get('LOGIN_RATE_LIMIT', 10)), int(os.environ.get('LOGIN_RATE_WINDOW', 60)))
+
+# reCAPTCHA verification, the timeouts are (connect, read) seconds
+CAPTCHA_VERIFY_URL = os.environ.get('CAPTCHA_VERIFY_URL', 'https://www.google.com/recaptcha/api/siteverify')
+CAPTCHA_TIMEOUT = (float(os.environ.get('CAPTCHA_CONNECT_TIMEOUT', 3.05)),
+                   float(os.environ.get('CAPTCHA_READ_TIMEOUT', 5)))
+# failures in a row which stop the verification calls for the reset timeout seconds
+CAPTCHA_FAILURE_THRESHOLD = int(os.environ.get('CAPTCHA_FAILURE_THRESHOLD', 5))
+CAPTCHA_RESET_TIMEOUT = int(os.environ.get('CAPTCHA_RESET_TIMEOUT', 30))
+
+# seconds after all blacklisted refresh tokens are reloaded from the database
+TOKEN_BLACKLIST_SYNC_INTERVAL = int(os.environ.get('TOKEN_BLACKLIST_SYNC_INTERVAL', 60))
+
 # AUTHENTICATION_BACKENDS = [
 #     'django.contrib.auth.backends.ModelBackend',
 #      "allauth.account.auth_backends.AuthenticationBackend",
@@ -152,6 +204,44 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 
 DJANGO_REST_PASSWORDRESET_NO_INFORMATION_LEAKAGE = True
 
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+SHARED_CACHE = not CACHES['default']['BACKEND'].endswith('LocMemCache')
+if not SHARED_CACHE:
+    # the devices fragments are cached per device
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 10000))}
+    # the in-process cache isn't shared by the workers, the invalidation done in one worker or the scheduler
+    # isn't seen by the others, so the dashboard versions and the cached users expire after this many seconds.
+    # Use the shared cache, e.g. Redis or Memcached, in production
+    CACHE_STALENESS_LIMIT = int(os.environ.get('CACHE_STALENESS_LIMIT', 15))
+    AUTH_USER_CACHE_TIMEOUT = min(AUTH_USER_CACHE_TIMEOUT, CACHE_STALENESS_LIMIT)
+    AUTH_TOKEN_CACHE_TIMEOUT = min(AUTH_TOKEN_CACHE_TIMEOUT, CACHE_STALENESS_LIMIT)
+    # the names changed by the other processes are searched after this many seconds, the indexes are rebuilt
+    SEARCH_INDEX_STALENESS_LIMIT = int(os.environ.get('SEARCH_INDEX_STALENESS_LIMIT', 60))
+# seconds the dashboard payload is kept in the cache
+DASHBOARD_CACHE_TIMEOUT = int(os.environ.get('DASHBOARD_CACHE_TIMEOUT', 5 * 60))
+
+# the search uses the in-memory names index, disable it to search in the database
+SEARCH_INDEX_ENABLED = os.environ.get('SEARCH_INDEX_ENABLED', 'True') == 'True'
+
+# maximum seconds the readings request waits for the change
+READINGS_LONG_POLL_MAX_WAIT = int(os.environ.get('READINGS_LONG_POLL_MAX_WAIT', 30))
+
+# IoT Hub transport used to send messages to the devices, use local to work offline
+IOT_HUB_TRANSPORT = os.environ.get('IOT_HUB_TRANSPORT', 'azure')
+# seconds after the pooled IoT Hub client is reconnected
+IOT_HUB_CLIENT_MAX_AGE = int(os.environ.get('IOT_HUB_CLIENT_MAX_AGE', 60 * 60))
+# minimum seconds the relay stays in the state before the sensor events can switch it again, disabled by default.
+# Keep it below the 5 minutes sensor tick otherwise the relay can switch only every other tick
+RELAY_MIN_DWELL_TIME = {
+    'ON': int(os.environ.get('RELAY_MIN_ON_TIME', 0)),
+    'OFF': int(os.environ.get('RELAY_MIN_OFF_TIME', 0)),
+}
+
 # add ssl mode
 if os.environ.get('ENV') == 'production':
     DATABASES = {
@@ -162,7 +252,18 @@ if os.environ.get('ENV') == 'production':
             'PASSWORD': os.environ.get('DB_PASSWORD'),
             'HOST': os.environ.get('DB_HOST'),
             'PORT': os.environ.get('DB_PORT'),
-            'OPTIONS': {'sslmode': 'require'}
+            'OPTIONS': {'sslmode': 'require'},
+            # keep the connection between the requests of the same thread, with the pooled engine
+            # backend.db.postgresql_pool use 0, the connection is returned to the pool after every request
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+            # used by backend.db.postgresql_pool
+            'POOL': {
+                'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+                'MAX_LIFETIME': int(os.environ.get('DB_POOL_MAX_LIFETIME', 30 * 60)),
+                'TIMEOUT': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+                'CHECK_AFTER': int(os.environ.get('DB_POOL_CHECK_AFTER', 0)),
+                'STATS_INTERVAL': int(os.environ.get('DB_POOL_STATS_INTERVAL', 60)),
+            },
         }
     }
 else:
@@ -200,21 +301,41 @@ LOGGING = {
             'datefmt': '%Y-%m-%dT%H:%M:%S',
         },
     },
+    'filters': {
+        # the same message below ERROR is logged at most `rate` times per `period` seconds
+        'rate_limit': {
+            '()': 'backend.log_handlers.RateLimitFilter',
+            'rate': int(os.environ.get('LOG_RATE_LIMIT', 10)),
+            'period': int(os.environ.get('LOG_RATE_LIMIT_PERIOD', 60)),
+        },
+    },
     'handlers': {
-        'file': {
+        # the log is written by the background thread to stdout collected by the platform
+        'default': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': os.path.join(BASE_DIR, 'debug.log'),
-            'formatter': 'simple'
+            'class': 'backend.log_handlers.QueuedStreamHandler',
+            'formatter': 'simple',
+            'filters': ['rate_limit'],
         },
     },
     'loggers': {
         'django': {
-            'level': 'DEBUG',
-            'handlers': ['file']
+            'level': os.environ.get('LOG_LEVEL', 'INFO'),
+            'handlers': ['default']
         }
     },
 }
+# the file is rotated by the size or by the time when LOG_ROTATE_WHEN is set, the processes can't share the rotated
+# file so use {pid} in LOG_FILE with many workers, e.g. logs/app.{pid}.log. Production logs to stdout by default
+LOG_FILE = os.environ.get('LOG_FILE', '' if os.environ.get('ENV') == 'production' else str(BASE_DIR / 'debug.log'))
+if LOG_FILE:
+    LOGGING['handlers']['default'].update({
+        'class': 'backend.log_handlers.QueuedRotatingFileHandler',
+        'filename': LOG_FILE,
+        'maxBytes': int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024)),
+        'backupCount': int(os.environ.get('LOG_BACKUP_COUNT', 5)),
+        'when': os.environ.get('LOG_ROTATE_WHEN') or None,
+    })
 
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class ProfilingTestRunner(DiscoverRunner):
+    """
+    Profile every request of the tests, the views exceeding their QUERY_BUDGETS fail the tests
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.profiling = override_settings(PROFILING={
+            **getattr(settings, 'PROFILING', {}),
+            'ENABLED': True,
+            'SAMPLE_RATE': 1,
+            'MODE': 'raise',
+        })
+        self.profiling.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.profiling.disable()
+        super().teardown_test_environment(**kwargs)
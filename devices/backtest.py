@@ -0,0 +1,107 @@
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.db.models import FloatField
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from devices.models import Device, DeviceLog
+
+COMPARISONS = {
+    '>': np.greater,
+    '<': np.less,
+}
+RULES = tuple(COMPARISONS)
+ACTIONS = ('ON', 'OFF')
+
+
+def load_history(sensor: Device, reading_type: str, date_from=None, date_to=None) -> tuple:
+    """
+    Load the sensor readings from the log as NumPy arrays, the reading is extracted by the database
+    :param sensor:
+    :param reading_type: e.g. temperature
+    :param date_from: datetime
+    :param date_to: datetime
+    :return: (times in seconds, values)
+    """
+    logs = DeviceLog.objects.filter(device=sensor)
+    if date_from:
+        logs = logs.filter(time__gte=date_from)
+    if date_to:
+        logs = logs.filter(time__lte=date_to)
+    rows = logs.annotate(
+        reading=Cast(KeyTextTransform(reading_type, 'readings'), FloatField())
+    ).filter(reading__isnull=False).order_by('time').values_list('time', 'reading')
+
+    times = np.fromiter((row[0].timestamp() for row in rows), dtype=np.float64)
+    values = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(times))
+    return times, values
+
+
+def evaluate_rules(times: np.ndarray, values: np.ndarray, rules: list) -> list:
+    """
+    Simulate the relay state of the candidate rules across the whole series at once, with the hysteresis band
+    of the scheduler. The rule switches the relay to its action when the reading passes the far edge
+    of the band, the relay is assumed to go back to the opposite state, e.g. by the opposite rule, when
+    the reading passes the near edge. The zero readings are skipped like in the scheduler, the dwell times
+    aren't simulated.
+    :param times: timestamps in seconds, ascending
+    :param values: sensor readings
+    :param rules: [{'rule': '>' or '<', 'value': float, 'hysteresis': float, 'action': 'ON' or 'OFF'}]
+    :return: [{'fired': int, 'firing_times': [timestamp], 'duty_cycle': float}]
+    """
+    for rule in rules:
+        if rule['rule'] not in COMPARISONS:
+            raise ValueError('The rule %s isn\'t implemented' % rule['rule'])
+    if not values.size:
+        return [{'fired': 0, 'firing_times': [], 'duty_cycle': 0.0} for _ in rules]
+    turn_on = np.array([rule['action'].upper() == 'ON' for rule in rules])[:, None]
+
+    # 1 - relay switched to the rule action, 0 - switched back, -1 - the state doesn't change
+    decisions = np.full((len(rules), values.size), -1, dtype=np.int8)
+    read = values != 0
+    for i, rule in enumerate(rules):
+        compare = COMPARISONS[rule['rule']]
+        # the far edge of the band is above the value for > and below it for <
+        edge = float(rule.get('hysteresis') or 0) * (1 if rule['rule'] == '>' else -1)
+        value = float(rule['value'])
+        decisions[i, read & ~compare(values, value - edge)] = 0
+        decisions[i, read & compare(values, value + edge)] = 1
+    positions = np.where(decisions >= 0, np.arange(values.size)[None, :], 0)
+    np.maximum.accumulate(positions, axis=1, out=positions)
+    state = np.take_along_axis(decisions, positions, axis=1) == 1
+
+    previous = np.zeros_like(state)
+    previous[:, 1:] = state[:, :-1]
+    fired = state & ~previous
+
+    relay_on = np.where(turn_on, state, ~state)
+    durations = np.zeros_like(times)
+    durations[:-1] = np.diff(times)
+    total = durations.sum()
+    duty_cycles = (relay_on * durations[None, :]).sum(axis=1) / total if total else relay_on.mean(axis=1)
+
+    return [{
+        'fired': int(fired[i].sum()),
+        'firing_times': times[fired[i]].tolist(),
+        'duty_cycle': float(duty_cycles[i]),
+    } for i in range(len(rules))]
+
+
+def backtest(sensor: Device, reading_type: str, rules: list, date_from=None, date_to=None) -> dict:
+    """
+    Check how often the rules would have fired against the sensor history
+    :return: {'samples': int, 'rules': [...]}
+    """
+    times, values = load_history(sensor, reading_type, date_from, date_to)
+    results = evaluate_rules(times, values, rules)
+    for result in results:
+        result['firing_times'] = [
+            timezone.localtime(datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)).isoformat()
+            for timestamp in result['firing_times']
+        ]
+    return {
+        'samples': int(values.size),
+        'rules': [{**rule, **result} for rule, result in zip(rules, results)]
+    }
@@ -0,0 +1,150 @@
+from datetime import timedelta
+import logging
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from devices.models import Device, DeviceEvent, DeviceLog
+
+logger = logging.getLogger('django')
+
+
+def relay_state(device: Device) -> str or None:
+    """
+    :param device: relay
+    :return: on, off or None when the state isn't known
+    """
+    if not isinstance(device.readings, dict) or not isinstance(device.readings.get('state'), str):
+        return None
+    return device.readings['state'].lower()
+
+
+def is_state_change(device: Device, action: str) -> bool:
+    """
+    Check does the action change the current relay state
+    :param device:
+    :param action: ON or OFF
+    :return: bool
+    """
+    if not device.readings:
+        return True
+    try:
+        readings = device.readings
+        device_state = readings['state'].lower()
+        return action.lower() != device_state
+    except KeyError:
+        logger.error('Task - the device state cannot be obtained')
+        return False
+    except TypeError:
+        logger.error('Task - the device state not found in readings')
+        return False
+
+
+def merge_actions(actions: list) -> str:
+    """
+    Merge all actions planned for the device in the same tick into the final one.
+    OFF wins because it's the safe state for the electrical appliances.
+    :param actions: list of ON / OFF
+    :return: ON or OFF
+    """
+    if any(action.upper() == 'OFF' for action in actions):
+        return 'OFF'
+    return 'ON'
+
+
+class CommandPlanner:
+    """
+    Collects the actions of the events fired in one tick and sends at most one command per relay.
+    The commands which don't change the relay state or switch it back before the minimum
+    on / off dwell time are suppressed.
+    """
+
+    def __init__(self, now=None):
+        self.__now = now or timezone.now()
+        self.__devices = {}
+        self.__events = {}
+
+    @property
+    def now(self):
+        return self.__now
+
+    def add(self, event: DeviceEvent):
+        """
+        Add the intended action of the event
+        :param event:
+        :return: None
+        """
+        self.__devices[event.device.pk] = event.device
+        self.__events.setdefault(event.device.pk, []).append(event)
+
+    def __last_switches(self) -> dict:
+        """
+        The state changes are saved to the log so the last log time of relay is the last switch
+        :return: {device_pk: datetime}
+        """
+        logs = DeviceLog.objects.filter(device__in=list(self.__devices)).values('device').annotate(last=Max('time'))
+        return {log['device']: log['last'] for log in logs}
+
+    def __min_dwell(self, state: str) -> timedelta:
+        dwell_times = getattr(settings, 'RELAY_MIN_DWELL_TIME', {})
+        return timedelta(seconds=dwell_times.get(state.upper(), 0))
+
+    def is_dwell_time_passed(self, device: Device, last_switch) -> bool:
+        """
+        The relay must stay at least minimum dwell time in the current state
+        :param device:
+        :param last_switch: datetime or None
+        :return: bool
+        """
+        if not last_switch or not isinstance(device.readings, dict) or 'state' not in device.readings:
+            return True
+        return self.__now - last_switch >= self.__min_dwell(str(device.readings['state']))
+
+    def plan(self) -> list:
+        """
+        Merge the actions for each device and remove the redundant commands
+        :return: [{'device': Device, 'action': str, 'events': [DeviceEvent]}]
+        """
+        last_switches = None
+        commands = []
+        for pk, events in self.__events.items():
+            device = self.__devices[pk]
+            action = merge_actions([event.action for event in events])
+            if not is_state_change(device, action):
+                continue
+            # time events are set explicitly by user, the dwell time protects only from the sensor chatter
+            if all(event.type == 'sensor' for event in events):
+                if last_switches is None:
+                    last_switches = self.__last_switches()
+                if not self.is_dwell_time_passed(device, last_switches.get(pk)):
+                    logger.info('Task - command %s for %s suppressed by dwell time', action, device.name)
+                    continue
+            commands.append({
+                'device': device,
+                'action': action,
+                'events': events
+            })
+        return commands
+
+    def flush(self, send, stats=None) -> list:
+        """
+        Send the planned commands
+        :param send: callable(device, action) returns the sent state or None
+        :param stats: TickStats to count the fired events and failed commands
+        :return: list of sent states
+        """
+        fired = []
+        for command in self.plan():
+            result = send(command['device'], command['action'])
+            if result:
+                fired.append(result)
+            if stats is None:
+                continue
+            if result:
+                stats.fired += len(command['events'])
+            else:
+                stats.failed += 1
+        self.__devices = {}
+        self.__events = {}
+        return fired
@@ -0,0 +1,133 @@
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from devices.models import Workspace
+
+# the workspaces list and devices metadata are part of every dashboard
+GLOBAL_SCOPE = 'global'
+# the dashboard of unassigned workspace shows all devices
+ALL_SCOPE = 'all'
+
+VERSION_KEY = 'dashboard:version:%s'
+DEFAULT_WORKSPACE_KEY = 'dashboard:default:%s'
+PAYLOAD_KEY = 'dashboard:payload:%s'
+WORKSPACES_KEY = 'dashboard:workspaces:%s'
+
+
+def get_version(scope) -> tuple:
+    """
+    Get the current version of the scope, create a new one if not in the cache
+    :param scope: workspace pk, GLOBAL_SCOPE or ALL_SCOPE
+    :return: (version, last modified timestamp)
+    """
+    key = VERSION_KEY % scope
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, (uuid.uuid4().hex, modified_time()), version_timeout())
+        version = cache.get(key)
+    return version
+
+
+def modified_time() -> int:
+    """
+    The Last-Modified date has whole seconds, so the version is stamped with the next second. Two versions
+    created in the same second get the same stamp, which is sent only after that second is over, see validators.
+    :return: timestamp
+    """
+    return int(time.time()) + 1
+
+
+def bump(*scopes):
+    """
+    Invalidate the cached dashboards of the scopes
+    :param scopes: workspace pk, GLOBAL_SCOPE or ALL_SCOPE
+    :return: None
+    """
+    cache.set_many({VERSION_KEY % scope: (uuid.uuid4().hex, modified_time()) for scope in scopes}, version_timeout())
+
+
+def readings_changed(workspace_id):
+    # the readers can't cache the data before the commit under the new version
+    transaction.on_commit(lambda: bump(workspace_id if workspace_id else ALL_SCOPE, ALL_SCOPE))
+
+
+def metadata_changed():
+    transaction.on_commit(lambda: bump(GLOBAL_SCOPE))
+
+
+def resolve_scope(workspace_id: str or None):
+    """
+    Resolve the dashboard scope from the workspace query parameter, the default workspace
+    is kept in the cache till the metadata changed
+    :param workspace_id:
+    :return: workspace pk or ALL_SCOPE
+    """
+    if workspace_id:
+        try:
+            return int(workspace_id)
+        except ValueError:
+            # get unassigned devices
+            return ALL_SCOPE
+
+    global_version = get_version(GLOBAL_SCOPE)[0]
+    key = DEFAULT_WORKSPACE_KEY % global_version
+    scope = cache.get(key)
+    if scope is None:
+        workspace = Workspace.objects.order_by('name').values_list('pk', flat=True).first()
+        scope = workspace if workspace else ALL_SCOPE
+        cache.set(key, scope, timeout())
+    return scope
+
+
+def workspace_exists(pk: int) -> bool:
+    """
+    Check the workspace exists, the workspaces pks are kept in the cache till the metadata changed
+    :param pk:
+    :return: bool
+    """
+    key = WORKSPACES_KEY % get_version(GLOBAL_SCOPE)[0]
+    pks = cache.get(key)
+    if pks is None:
+        pks = set(Workspace.objects.values_list('pk', flat=True))
+        cache.set(key, pks, timeout())
+    return pk in pks
+
+
+def validators(scope, *variant) -> tuple:
+    """
+    Get the ETag and last modified time of the dashboard. The last modified time is None till its second
+    is over, another change in the same second would get the same time.
+    :param scope: workspace pk or ALL_SCOPE
+    :param variant: other parameters changing the response
+    :return: (etag, last modified timestamp or None)
+    """
+    global_version, global_modified = get_version(GLOBAL_SCOPE)
+    scope_version, scope_modified = get_version(scope)
+    tag = ':'.join(str(part) for part in (global_version, scope_version, scope) + variant)
+    last_modified = max(global_modified, scope_modified)
+    return '"%s"' % hashlib.md5(tag.encode()).hexdigest(), last_modified if last_modified <= time.time() else None
+
+
+def get_payload(etag: str):
+    return cache.get(PAYLOAD_KEY % etag)
+
+
+def set_payload(etag: str, payload: dict):
+    cache.set(PAYLOAD_KEY % etag, payload, timeout())
+
+
+def timeout() -> int:
+    return getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 5 * 60)
+
+
+def version_timeout() -> int or None:
+    """
+    The versions bumped in one process aren't seen by the others when the cache isn't shared,
+    so the versions expire after CACHE_STALENESS_LIMIT seconds
+    """
+    return getattr(settings, 'CACHE_STALENESS_LIMIT', None)
@@ -1,25 +1,52 @@
+from functools import lru_cache
+
+from django.utils.module_loading import import_string
+
 from devices.device_types.abstracts import DeviceTypeFactory, FirmwareFactory
-from devices.device_types.tasmota import RelayTasmota, AM2301Tasmota, TasmotaFactory
 from devices.device_types.exceptions import DeviceException
 
+# the drivers are registered by the dotted paths and imported on the first use,
+# so importing the factories doesn't load the firmware modules and their transports
+FIRMWARES = {
+    # payload property identifying the firmware
+    'topic': 'devices.device_types.tasmota.TasmotaFactory',
+}
+
+RELAY_DRIVERS = {
+    'tasmota': 'devices.device_types.tasmota.RelayTasmota',
+    # other firmware types
+}
+
+AM2301_DRIVERS = {
+    'tasmota': 'devices.device_types.tasmota.AM2301Tasmota',
+    # other firmware types
+}
+
+
+@lru_cache(maxsize=None)
+def load_driver(path: str):
+    """
+    Import the driver class
+    :param path: dotted path of the class
+    :return: class
+    """
+    return import_string(path)
+
 
 def identify_by_payload(payload_property: dict) -> FirmwareFactory:
-    if 'topic' in payload_property:
-        return TasmotaFactory
+    for identifier, path in FIRMWARES.items():
+        if identifier in payload_property:
+            return load_driver(path)
     raise NotImplementedError("Firmware not found")
 
 
 class RelayFactory(DeviceTypeFactory):
     def obtain_factory(self):
-        factories = {
-            'tasmota': RelayTasmota,
-            # other firmware types
-        }
         try:
-            relay_factory = factories[self.device.firmware]
-            return relay_factory
+            relay_factory = RELAY_DRIVERS[self.device.firmware]
         except KeyError:
             raise DeviceException('Relay factory not found')
+        return load_driver(relay_factory)
 
 
 class SensorFactory(DeviceTypeFactory):
@@ -40,11 +67,7 @@ class SensorFactory(DeviceTypeFactory):
 
 class AM2302Factory:
     def obtain_factory(self, firmware_type):
-        sensor_types = {
-            'tasmota': AM2301Tasmota,
-            # other firmware types
-        }
         try:
-            return sensor_types[firmware_type]
+            return load_driver(AM2301_DRIVERS[firmware_type])
         except KeyError:
             raise DeviceException('Firmware AM2301 not found in AM2302Factory')
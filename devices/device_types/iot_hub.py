@@ -0,0 +1,205 @@
+import atexit
+import threading
+import time
+import logging
+
+from django.conf import settings
+
+from devices.device_types.exceptions import DeviceException
+
+logger = logging.getLogger('django')
+
+
+class LocalIoTHubTransport:
+    """
+    Offline stand-in for IoTHubRegistryManager. Cloud to device messages are kept in memory
+    instead of being sent to Azure, so the relay commands can be tested without the IoT Hub.
+    """
+
+    def __init__(self, connection_string: str = None):
+        self.connection_string = connection_string
+        self.messages = []
+        self.closed = False
+
+    def send_c2d_message(self, device_id: str, message, properties=None):
+        if self.closed:
+            raise ConnectionError('Local IoT Hub transport is closed')
+        self.messages.append({
+            'device_id': device_id,
+            'message': message,
+            'properties': properties or {}
+        })
+
+    def close(self):
+        self.closed = True
+
+
+def azure_transport(connection_string: str):
+    from azure.iot.hub import IoTHubRegistryManager
+    return IoTHubRegistryManager(connection_string)
+
+
+def azure_connection_errors() -> tuple:
+    from uamqp import errors
+    return OSError, errors.AMQPConnectionError, errors.TokenExpired, errors.ClientTimeout
+
+
+def local_transport(connection_string: str):
+    return LocalIoTHubTransport(connection_string)
+
+
+def local_connection_errors() -> tuple:
+    return OSError,
+
+
+TRANSPORTS = {
+    'azure': azure_transport,
+    'local': local_transport,
+}
+# the errors after which the client is reconnected, the other ones, e.g. unknown device, are raised at once
+CONNECTION_ERRORS = {
+    'azure': azure_connection_errors,
+    'local': local_connection_errors,
+}
+
+
+class PooledClient:
+    def __init__(self, client, transport: str):
+        self.client = client
+        self.transport = transport
+        self.created_at = time.monotonic()
+        self.healthy = True
+        # the AMQP send client isn't thread safe, one message is sent at a time
+        self.lock = threading.Lock()
+
+    def is_healthy(self, max_age: float) -> bool:
+        """
+        The registry manager keeps the AMQP link open so the client is reused until it fails
+        or reaches its max age, after that a new one is created to refresh the connection.
+        :param max_age: seconds
+        :return: bool
+        """
+        return self.healthy and time.monotonic() - self.created_at < max_age
+
+    def close(self):
+        with self.lock:
+            self.__close()
+
+    def __close(self):
+        try:
+            if hasattr(self.client, 'amqp_svc_client') and self.client.amqp_svc_client is not None:
+                self.client.amqp_svc_client.disconnect_sync()
+            elif hasattr(self.client, 'close'):
+                self.client.close()
+        except Exception as e:
+            logger.warning('IoT Hub pool - error when closing the client; %s', e)
+
+
+class IoTHubClientPool:
+    """
+    Process wide pool of the IoT Hub registry clients, one per transport and connection string.
+    The clients are created lazily and shared between threads, the messages of one client are sent one at a time.
+    """
+
+    def __init__(self, transport: str = None, max_age: float = None):
+        self.__transport = transport
+        self.__max_age = max_age
+        self.__clients = {}
+        self.__lock = threading.Lock()
+
+    @property
+    def transport(self) -> str:
+        return self.__transport or getattr(settings, 'IOT_HUB_TRANSPORT', 'azure')
+
+    @property
+    def max_age(self) -> float:
+        if self.__max_age is not None:
+            return self.__max_age
+        return getattr(settings, 'IOT_HUB_CLIENT_MAX_AGE', 60 * 60)
+
+    def get(self, connection_string: str):
+        """
+        Get a healthy client for the connection string, create a new one if needed
+        :param connection_string:
+        :return: IoTHubRegistryManager or LocalIoTHubTransport
+        """
+        return self.__get(connection_string).client
+
+    def __get(self, connection_string: str) -> PooledClient:
+        transport = self.transport
+        try:
+            factory = TRANSPORTS[transport]
+        except KeyError:
+            raise DeviceException('IoT Hub transport %s not found' % transport)
+
+        key = (transport, connection_string)
+        with self.__lock:
+            pooled = self.__clients.get(key)
+            if pooled and pooled.is_healthy(self.max_age):
+                return pooled
+        # the TLS handshake doesn't block the other connection strings
+        try:
+            created = PooledClient(factory(connection_string), transport)
+        except Exception as e:
+            raise DeviceException(str(e))
+        with self.__lock:
+            pooled = self.__clients.get(key)
+            if pooled and pooled.is_healthy(self.max_age):
+                # created by another thread meanwhile
+                stale, result = created, pooled
+            else:
+                stale, result = pooled, created
+                self.__clients[key] = created
+        if stale:
+            stale.close()
+        return result
+
+    def discard(self, connection_string: str, client=None):
+        """
+        Remove the client from the pool, the next get creates a new connection
+        :param connection_string:
+        :param client: remove only if it's still the pooled client
+        :return: None
+        """
+        key = (self.transport, connection_string)
+        with self.__lock:
+            pooled = self.__clients.get(key)
+            if not pooled or (client is not None and pooled.client is not client):
+                return
+            pooled.healthy = False
+            del self.__clients[key]
+        pooled.close()
+
+    def send_c2d_message(self, connection_string: str, device_id: str, message, properties: dict):
+        """
+        Send the message with the pooled client, if the connection fails reconnect and try once again
+        :return: None
+        """
+        connection_errors = CONNECTION_ERRORS[self.transport]()
+        for attempt in range(2):
+            pooled = self.__get(connection_string)
+            try:
+                with pooled.lock:
+                    return pooled.client.send_c2d_message(device_id, message, properties=properties)
+            except connection_errors as e:
+                self.discard(connection_string, pooled.client)
+                if attempt:
+                    raise DeviceException(str(e))
+                logger.warning('IoT Hub pool - connection failed, reconnecting; %s', e)
+            except Exception as e:
+                raise DeviceException(str(e))
+
+    def clear(self):
+        with self.__lock:
+            clients = list(self.__clients.values())
+            self.__clients = {}
+        for pooled in clients:
+            pooled.close()
+
+    def __len__(self):
+        return len(self.__clients)
+
+
+registry_pool = IoTHubClientPool()
+# close the AMQP links before the interpreter tears down the modules
+atexit.register(registry_pool.clear)
@@ -3,7 +3,7 @@ import os
 from devices.device_types.abstracts import FirmwareFactory, FirmwareIdentifyProperties, AbstractDevice
 from devices.device_types import device_type_factories
 from devices.device_types.exceptions import FirmwareFactoryException, DeviceException
-from azure.iot.hub import IoTHubRegistryManager
+from devices.device_types.iot_hub import registry_pool
 
 
 class TasmotaFactory(FirmwareFactory):
@@ -67,22 +67,18 @@ class RelayTasmota(AbstractDevice):
         :return: None
         """
         connection_secret = os.environ.get('CONNECTION_STRING')
-        if not connection_secret:
+        if not connection_secret and registry_pool.transport != 'local':
             raise DeviceException({
                 'error': 'Azure CONNECTION_STRING secret not found. Add CONNECTION_STRING to your environment.'
             })
-        registry_manager = IoTHubRegistryManager(connection_secret)
 
         props = {
             'TOPIC': '/power{}'.format(self.device.gpio if self.device.gpio != 0 else '')
         }
-        try:
-            registry_manager.send_c2d_message(self.device.device_host_id, state, properties=props)
-            return {
-                'state': state
-            }
-        except Exception as e:
-            raise DeviceException(str(e))
+        registry_pool.send_c2d_message(connection_secret, self.device.device_host_id, state, props)
+        return {
+            'state': state
+        }
 
 
 class AM2301Tasmota(AbstractDevice):
@@ -0,0 +1,119 @@
+import threading
+import time
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+
+from devices.device_types.device_type_factories import RelayFactory
+from devices.device_types.exceptions import DeviceException
+from devices.device_types.iot_hub import IoTHubClientPool, LocalIoTHubTransport, TRANSPORTS, registry_pool
+from devices.models import Device
+
+
+@override_settings(IOT_HUB_TRANSPORT='local')
+class TestIoTHubClientPool(TestCase):
+    def setUp(self):
+        self.pool = IoTHubClientPool()
+
+    def test_client_is_reused(self):
+        client = self.pool.get('HostName=test')
+        self.assertIsInstance(client, LocalIoTHubTransport)
+        self.assertIs(self.pool.get('HostName=test'), client)
+        self.assertIsNot(self.pool.get('HostName=other'), client)
+        self.assertEqual(len(self.pool), 2)
+
+    def test_client_expired(self):
+        pool = IoTHubClientPool(max_age=0.000001)
+        client = pool.get('HostName=test')
+        self.assertIsNot(pool.get('HostName=test'), client)
+        self.assertTrue(client.closed)
+
+    def test_reconnect_on_failure(self):
+        client = self.pool.get('HostName=test')
+        client.close()
+        self.pool.send_c2d_message('HostName=test', 't1', 'ON', {'TOPIC': '/power1'})
+        new_client = self.pool.get('HostName=test')
+        self.assertIsNot(new_client, client)
+        self.assertEqual(new_client.messages, [{
+            'device_id': 't1',
+            'message': 'ON',
+            'properties': {'TOPIC': '/power1'}
+        }])
+
+    def test_failure_after_reconnect(self):
+        with patch.object(LocalIoTHubTransport, 'send_c2d_message', side_effect=ConnectionError('Connection lost')):
+            with self.assertRaises(DeviceException) as context:
+                self.pool.send_c2d_message('HostName=test', 't1', 'ON', {})
+        self.assertEqual(str(context.exception), 'Connection lost')
+        self.assertEqual(len(self.pool), 0)
+
+    def test_device_error_not_retried(self):
+        client = self.pool.get('HostName=test')
+        with patch.object(LocalIoTHubTransport, 'send_c2d_message', side_effect=Exception('Device not found')) as send:
+            with self.assertRaises(DeviceException) as context:
+                self.pool.send_c2d_message('HostName=test', 't1', 'ON', {})
+        self.assertEqual(str(context.exception), 'Device not found')
+        self.assertEqual(send.call_count, 1)
+        self.assertIs(self.pool.get('HostName=test'), client)
+
+    def test_zero_max_age(self):
+        pool = IoTHubClientPool(max_age=0)
+        client = pool.get('HostName=test')
+        self.assertIsNot(pool.get('HostName=test'), client)
+
+    def test_messages_of_client_sent_one_at_a_time(self):
+        sending = []
+        overlaps = []
+
+        def send(device_id, message, properties=None):
+            overlaps.append(bool(sending))
+            sending.append(message)
+            time.sleep(0.01)
+            sending.remove(message)
+
+        self.pool.get('HostName=test').send_c2d_message = send
+        threads = [threading.Thread(target=self.pool.send_c2d_message, args=('HostName=test', 't1', str(i), {}))
+                   for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(overlaps, [False] * 4)
+
+    def test_client_created_outside_pool_lock(self):
+        created = threading.Event()
+        release = threading.Event()
+
+        def slow_transport(connection_string):
+            created.set()
+            release.wait(1)
+            return LocalIoTHubTransport(connection_string)
+
+        with patch.dict(TRANSPORTS, {'local': slow_transport}):
+            thread = threading.Thread(target=self.pool.get, args=('HostName=slow',))
+            thread.start()
+            created.wait(1)
+        # the other connection string doesn't wait for the slow handshake
+        self.assertIsInstance(self.pool.get('HostName=test'), LocalIoTHubTransport)
+        self.assertTrue(thread.is_alive())
+        release.set()
+        thread.join()
+        self.assertEqual(len(self.pool), 2)
+
+    def test_transport_not_found(self):
+        pool = IoTHubClientPool(transport='test')
+        with self.assertRaises(DeviceException) as context:
+            pool.get('HostName=test')
+        self.assertEqual(str(context.exception), 'IoT Hub transport test not found')
+
+    def test_relay_message_with_local_transport(self):
+        registry_pool.clear()
+        device = Device(name='Test', device_host_id='t1', type='relay', gpio=2)
+        relay = RelayFactory(device).obtain_factory()
+        with patch.dict('os.environ', {'CONNECTION_STRING': 'HostName=test'}):
+            for state in ['ON', 'OFF']:
+                self.assertEqual(relay(None, device).message(state), {'state': state})
+            messages = registry_pool.get('HostName=test').messages
+        self.assertEqual([msg['message'] for msg in messages], ['ON', 'OFF'])
+        self.assertEqual(messages[0]['properties'], {'TOPIC': '/power2'})
+        registry_pool.clear()
@@ -0,0 +1,52 @@
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+
+from backend.projections import Projection
+from devices import dashboard_cache
+
+# change when the representation of the devices changes without the serializer fields change
+SCHEMA_VERSION = 1
+FRAGMENT_KEY = 'device:fragment:%s:%s:%s:%s:%s'
+
+
+class PreRenderedJSONRenderer(JSONRenderer):
+    """
+    JSON renderer passing the already rendered bytes through
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+def fragment_key(projection: Projection, version: str, pk: int, updated_at) -> str:
+    return FRAGMENT_KEY % (SCHEMA_VERSION, projection.key, version, pk, updated_at.timestamp() if updated_at else '')
+
+
+def render(queryset, projection: Projection) -> bytes:
+    """
+    Render the devices as the JSON array. The JSON of each device is cached by its pk and updated_at,
+    the metadata change invalidates all of them. Only the stale devices are queried and rendered,
+    the array is joined from the cached bytes.
+    :param queryset: devices
+    :param projection:
+    :return: bytes
+    """
+    version = dashboard_cache.get_version(dashboard_cache.GLOBAL_SCOPE)[0]
+    keys = [
+        (pk, fragment_key(projection, version, pk, updated_at))
+        for pk, updated_at in queryset.values_list('pk', 'updated_at')
+    ]
+    fragments = cache.get_many([key for pk, key in keys])
+    missing = [pk for pk, key in keys if key not in fragments]
+    if missing:
+        rows = list(projection.values(queryset.model.objects.filter(pk__in=missing), 'updated_at'))
+        renderer = JSONRenderer()
+        stale = {}
+        for row, item in zip(rows, projection.render_rows(rows)):
+            stale[row['pk']] = (fragment_key(projection, version, row['pk'], row['updated_at']), renderer.render(item))
+        cache.set_many(dict(stale.values()), dashboard_cache.timeout())
+        # the device changed after the keys were read is rendered with the current data
+        fragments.update({key: stale[pk][1] for pk, key in keys if pk in stale})
+    return b'[' + b','.join(fragments[key] for pk, key in keys if key in fragments) + b']'
@@ -0,0 +1,100 @@
+import math
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import make_aware, is_naive
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from devices.models import Device
+from devices.pubsub import hub
+from devices.serializers import DeviceReadingSerializer
+from devices.views import DeviceReadings
+
+
+def is_authenticated(request) -> bool:
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        return bool(drf_request.user and drf_request.user.is_authenticated)
+    except AuthenticationFailed:
+        return False
+
+
+def parse_since(value: str):
+    """
+    Parse the since parameter, the updated_at of the readings endpoint
+    :param value: date in ISO 8601 format
+    :return: datetime
+    """
+    # the plus sign of the time zone is decoded as the space when it's not encoded
+    since = parse_datetime(value.replace(' ', '+'))
+    if not since:
+        raise ValueError('Wrong date format')
+    return make_aware(since) if is_naive(since) else since
+
+
+def parse_wait(value: str) -> float:
+    """
+    Parse the wait parameter
+    :param value: seconds
+    :return: seconds clamped to 0 - READINGS_LONG_POLL_MAX_WAIT
+    """
+    wait = float(value)
+    if not math.isfinite(wait):
+        raise ValueError('The wait must be a finite number')
+    return min(max(wait, 0), settings.READINGS_LONG_POLL_MAX_WAIT)
+
+
+def get_readings(device_id: int) -> dict or None:
+    device = Device.objects.filter(pk=device_id).first()
+    if not device:
+        return None
+    return DeviceReadingSerializer(device).data
+
+
+def is_newer(readings: dict, since) -> bool:
+    updated_at = parse_datetime(readings['updated_at']) if readings['updated_at'] else None
+    return bool(updated_at and updated_at > since)
+
+
+async def device_readings(request, device_id: int):
+    """
+    The readings endpoint with the long polling. When ?since=<updated_at> is given the request waits
+    until the device readings are newer or ?wait=<seconds> passed. The changes are received from
+    the in-process hub, after the timeout the readings are read from the database once again
+    because the change might be received by other process.
+    The waiting doesn't hold a thread only when served by ASGI, under WSGI the worker is blocked
+    for the whole wait, so keep READINGS_LONG_POLL_MAX_WAIT short there.
+    """
+    if request.method != 'GET' or 'since' not in request.GET:
+        return await sync_to_async(DeviceReadings.as_view())(request, device_id=device_id)
+
+    if not await sync_to_async(is_authenticated)(request):
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'},
+                            status=status.HTTP_401_UNAUTHORIZED)
+    try:
+        since = parse_since(request.GET['since'])
+        wait = parse_wait(request.GET.get('wait', 30))
+    except ValueError:
+        return JsonResponse({'error': 'The since must be a date in ISO 8601 format and wait a number'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    # subscribe before reading the database so the change can't be missed
+    with hub.subscribe(devices={device_id}) as subscription:
+        readings = await sync_to_async(get_readings)(device_id)
+        if readings is None:
+            return JsonResponse({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        deadline = time.monotonic() + wait
+        while not is_newer(readings, since):
+            change = await subscription.get(max(deadline - time.monotonic(), 0))
+            if change is None:
+                readings = await sync_to_async(get_readings)(device_id)
+                break
+            message = change[0]
+            readings = {'readings': message['readings'], 'updated_at': message['updated_at']}
+    return JsonResponse(readings)
@@ -0,0 +1,34 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from devices.backtest import evaluate_rules
+
+
+class Command(BaseCommand):
+    help = 'Measure the backtest of the candidate rules against the generated readings every five minutes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help='Days of the readings')
+        parser.add_argument('--rules', type=int, default=10, help='Number of the candidate rules')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of the measurements, the best is used')
+        parser.add_argument('--budget-ms', type=float, default=1000,
+                            help='Fail when the best measurement exceeds the budget')
+
+    def handle(self, *args, **options):
+        times = np.arange(options['days'] * 24 * 12, dtype=np.float64) * 300
+        values = 21 + 3 * np.sin(times / 86400 * 2 * np.pi) + np.random.default_rng(1).normal(0, .3, times.size)
+        rules = [{'rule': '<', 'value': 19 + i * .5, 'hysteresis': .25, 'action': 'ON'}
+                 for i in range(options['rules'])]
+
+        timings = []
+        for _ in range(options['repeat']):
+            start = time.perf_counter()
+            evaluate_rules(times, values, rules)
+            timings.append(time.perf_counter() - start)
+        best_ms = min(timings) * 1000
+        self.stdout.write('Evaluated %i rules against %i readings in %.1f ms' % (len(rules), values.size, best_ms))
+
+        if best_ms > options['budget_ms']:
+            raise CommandError('The backtest took %.1f ms, the budget is %.1f ms' % (best_ms, options['budget_ms']))
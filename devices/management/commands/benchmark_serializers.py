@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from backend.projections import Projection
+from devices.models import Device, Workspace
+from devices.serializers import DeviceSerializer, DeviceDetailSerializer, PkNameSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare the per object rendering cost of the serializers and the values projections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--devices', type=int, default=2000, help='Number of the devices rendered')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of the measurements, the best is used')
+
+    def handle(self, *args, **options):
+        # the devices are created in the transaction which is rolled back after the measurements
+        try:
+            with transaction.atomic():
+                self.create_devices(options['devices'])
+                self.measure(options['repeat'])
+                raise Rollback()
+        except Rollback:
+            pass
+
+    @staticmethod
+    def create_devices(count: int):
+        workspace = Workspace.objects.create(name='Benchmark')
+        now = timezone.now()
+        Device.objects.bulk_create([
+            Device(name='Device %i' % i, type='relay' if i % 2 else 'sensor', device_host_id='bench%i' % i, gpio=1,
+                   workspace=workspace, readings={'state': 'ON', 'temperature': 21.5}, updated_at=now)
+            for i in range(count)
+        ])
+
+    def measure(self, repeat: int):
+        queryset = Device.objects.all()
+        count = queryset.count()
+        self.stdout.write('%-24s %14s %14s %8s' % ('serializer', 'DRF us/object', 'values us/object', 'speedup'))
+        for serializer_class in [DeviceSerializer, DeviceDetailSerializer, PkNameSerializer]:
+            projection = Projection(serializer_class)
+            drf = self.best(lambda: serializer_class(queryset.all(), many=True).data, repeat) / count
+            values = self.best(lambda: projection.render(queryset.all()), repeat) / count
+            self.stdout.write('%-24s %14.2f %16.2f %7.1fx' % (serializer_class.__name__, drf * 1e6, values * 1e6,
+                                                              drf / values))
+
+    @staticmethod
+    def best(func, repeat: int) -> float:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
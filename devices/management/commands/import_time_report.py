@@ -0,0 +1,93 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_MODULES = ['devices.views', 'devices.tasks', 'users.views', 'backend.urls']
+
+STARTUP_SCRIPT = '''
+import importlib, sys, django
+django.setup()
+for module in sys.argv[1:]:
+    importlib.import_module(module)
+'''
+
+
+def parse_importtime(output: str) -> list:
+    """
+    Parse the output of python -X importtime
+    :param output: stderr of the interpreter
+    :return: list of {'module': str, 'self_us': int, 'cumulative_us': int, 'level': int} in the import order
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+            imports.append({
+                'module': name.strip(),
+                'self_us': int(self_us),
+                'cumulative_us': int(cumulative_us),
+                # the nested imports are indented by two spaces
+                'level': (len(name) - len(name.lstrip()) - 1) // 2,
+            })
+        except ValueError:
+            # header line
+            continue
+    return imports
+
+
+class Command(BaseCommand):
+    help = 'Report the import time of the Django startup and the given modules, measured in a new interpreter'
+
+    def add_arguments(self, parser):
+        parser.add_argument('modules', nargs='*', help='Modules imported after django.setup(), by default %s' %
+                                                       ', '.join(DEFAULT_MODULES))
+        parser.add_argument('--top', type=int, default=20, help='Number of the slowest top level imports reported')
+        parser.add_argument('--budget-ms', type=float, help='Fail when the total import time exceeds the budget')
+        parser.add_argument('--forbid', action='append', default=[],
+                            help='Fail when the package is imported at the startup, e.g. azure')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        imports = self.measure(options['modules'] or DEFAULT_MODULES)
+        top_level = [item for item in imports if item['level'] == 0]
+        total_ms = sum(item['cumulative_us'] for item in top_level) / 1000
+        slowest = sorted(top_level, key=lambda item: item['cumulative_us'], reverse=True)[:options['top']]
+        forbidden = sorted({item['module'] for item in imports for package in options['forbid']
+                            if item['module'] == package or item['module'].startswith(package + '.')})
+
+        if options['json']:
+            self.stdout.write(json.dumps({
+                'total_ms': round(total_ms, 2),
+                'modules': len(imports),
+                'slowest': slowest,
+                'forbidden': forbidden,
+            }))
+        else:
+            self.stdout.write('Imported %i modules in %.1f ms' % (len(imports), total_ms))
+            self.stdout.write('%12s %12s  %s' % ('cumulative ms', 'self ms', 'module'))
+            for item in slowest:
+                self.stdout.write('%12.1f %12.1f  %s' % (item['cumulative_us'] / 1000, item['self_us'] / 1000,
+                                                         item['module']))
+
+        if forbidden:
+            raise CommandError('Imported at the startup: %s' % ', '.join(forbidden))
+        if options['budget_ms'] is not None and total_ms > options['budget_ms']:
+            raise CommandError('The startup imports took %.1f ms, the budget is %.1f ms' % (total_ms,
+                                                                                           options['budget_ms']))
+
+    @staticmethod
+    def measure(modules: list) -> list:
+        env = dict(os.environ)
+        env['DJANGO_SETTINGS_MODULE'] = os.environ.get('DJANGO_SETTINGS_MODULE', 'backend.settings')
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT, *modules],
+                                cwd=str(settings.BASE_DIR), env=env, capture_output=True, text=True)
+        if result.returncode:
+            errors = result.stderr.strip().splitlines()
+            raise CommandError('The import failed; %s' % (errors[-1] if errors else result.returncode))
+        return parse_importtime(result.stderr)
@@ -0,0 +1,45 @@
+import asyncio
+import logging
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from devices.scheduler import Scheduler
+from devices.scheduler_metrics import prometheus_client
+
+logger = logging.getLogger('django')
+
+
+class Command(BaseCommand):
+    help = 'Command to run the devices tasks scheduler'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-catch-up', type=int, default=15,
+                            help='Maximum number of the missed ticks to run for the time events')
+        parser.add_argument('--metrics-port', type=int, default=None,
+                            help='Expose the scheduler metrics for Prometheus on the port')
+
+    def handle(self, *args, **options):
+        if options['metrics_port']:
+            if prometheus_client is None:
+                raise CommandError('The prometheus_client package is required to expose the metrics.')
+            prometheus_client.start_http_server(options['metrics_port'])
+        scheduler = Scheduler(max_catch_up=options['max_catch_up'])
+        self.stdout.write('Scheduler started with jobs: %s' % ', '.join(scheduler.jobs))
+        try:
+            asyncio.run(self.run(scheduler))
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write('Scheduler stopped')
+
+    @staticmethod
+    async def run(scheduler: Scheduler):
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:
+                # signal handlers aren't available on Windows
+                pass
+        await scheduler.run(stop)
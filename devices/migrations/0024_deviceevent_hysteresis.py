@@ -0,0 +1,18 @@
+# Generated by Django 3.2.6 on 2026-10-19 10:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0023_alter_deviceevent_rule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deviceevent',
+            name='hysteresis',
+            field=models.FloatField(default=0),
+        ),
+    ]
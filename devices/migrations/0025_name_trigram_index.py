@@ -0,0 +1,32 @@
+from django.db import migrations
+
+TABLES = ['devices_device', 'devices_workspace']
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # the trigram index is used by the database search fallback, available on PostgreSQL only
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in TABLES:
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS %s_name_trgm ON %s USING gin (UPPER(name) gin_trgm_ops)' % (table, table)
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in TABLES:
+        schema_editor.execute('DROP INDEX IF EXISTS %s_name_trgm' % table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0024_deviceevent_hysteresis'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -82,6 +82,8 @@ class DeviceEvent(models.Model):
     reading_type = models.CharField(max_length=40, null=True, blank=True)
     rule = models.CharField(max_length=3, choices=RULES, null=True, blank=True)
     value = models.IntegerField(null=True, blank=True)
+    # the band around the value to stop the relay flipping when the reading sits on the value
+    hysteresis = models.FloatField(default=0)
 
     def __str__(self):
         return self.name
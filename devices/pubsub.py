@@ -0,0 +1,116 @@
+import asyncio
+import json
+import threading
+
+from rest_framework.fields import DateTimeField
+
+from devices.models import Device
+
+
+def reading_message(device: Device) -> dict:
+    """
+    Build the message of the reading change, the same format as the readings endpoint
+    :param device:
+    :return: dict
+    """
+    return {
+        'pk': device.pk,
+        'workspace': device.workspace_id,
+        'readings': device.readings,
+        'updated_at': DateTimeField().to_representation(device.updated_at) if device.updated_at else None,
+    }
+
+
+class Subscription:
+    """
+    Subscription to the reading changes of the workspaces or devices, all changes if none given.
+    The messages are delivered to the event loop of the subscriber.
+    """
+
+    def __init__(self, hub, workspaces: set = None, devices: set = None, max_size: int = 100):
+        self.hub = hub
+        self.workspaces = set(workspaces) if workspaces else None
+        self.devices = set(devices) if devices else None
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_size)
+
+    def matches(self, message: dict) -> bool:
+        if self.workspaces is None and self.devices is None:
+            return True
+        return (self.workspaces is not None and message['workspace'] in self.workspaces) or \
+               (self.devices is not None and message['pk'] in self.devices)
+
+    def deliver(self, message: dict, data: bytes):
+        self.loop.call_soon_threadsafe(self.__put, message, data)
+
+    def __put(self, message: dict, data: bytes):
+        # the slow subscriber loses the oldest changes rather than blocking the publisher
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait((message, data))
+
+    async def get(self, timeout: float = None) -> tuple or None:
+        """
+        Wait for the next change
+        :param timeout: seconds
+        :return: (message, encoded message) or None after the timeout
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ReadingsHub:
+    """
+    In-process publish / subscribe of the devices reading changes. The publisher can run in any thread,
+    each change is encoded once and pushed to all matching subscribers.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__subscriptions = set()
+
+    def subscribe(self, workspaces: set = None, devices: set = None) -> Subscription:
+        subscription = Subscription(self, workspaces, devices)
+        with self.__lock:
+            self.__subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self.__lock:
+            self.__subscriptions.discard(subscription)
+
+    def publish(self, message: dict) -> int:
+        """
+        Push the change to the subscribers
+        :param message: {'pk': int, 'workspace': int or None, 'readings': dict, 'updated_at': str}
+        :return: number of subscribers notified
+        """
+        with self.__lock:
+            subscriptions = [subscription for subscription in self.__subscriptions if subscription.matches(message)]
+        if not subscriptions:
+            return 0
+        data = json.dumps(message).encode()
+        for subscription in subscriptions:
+            try:
+                subscription.deliver(message, data)
+            except RuntimeError:
+                # the event loop of the subscriber is closed
+                self.unsubscribe(subscription)
+        return len(subscriptions)
+
+    def __len__(self):
+        return len(self.__subscriptions)
+
+
+hub = ReadingsHub()
@@ -0,0 +1,155 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+import logging
+import time
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from devices.scheduler_metrics import SchedulerMetrics, TickStats, metrics as scheduler_metrics
+from devices.tasks import sensor_periodic_tasks, time_relay_task, sensor_relay_task
+
+logger = logging.getLogger('django')
+
+
+def next_tick(now: float, interval: int) -> float:
+    """
+    Get the next wall clock aligned tick, e.g. for one minute interval the next full minute. The ticks are aligned
+    to the UTC epoch, not to TIME_ZONE. The full hours are the same in the time zones with the whole hour offset,
+    e.g. Europe/Dublin, but the daily interval would tick at the UTC midnight.
+    :param now: timestamp
+    :param interval: seconds
+    :return: timestamp
+    """
+    return (now // interval + 1) * interval
+
+
+def tick_to_datetime(tick: float) -> datetime:
+    return timezone.localtime(datetime.fromtimestamp(tick, tz=dt_timezone.utc))
+
+
+class Job:
+    """
+    Scheduled job, the func is called with the planned tick time and the tick statistics
+    :param catch_up: run every missed tick, otherwise the missed ticks are merged into one run
+    """
+
+    def __init__(self, name: str, func, interval: int, catch_up: bool = False):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.catch_up = catch_up
+        self.next_run = None
+
+    def schedule(self, now: float):
+        self.next_run = next_tick(now, self.interval)
+
+    def due(self, now: float, max_catch_up: int) -> list:
+        """
+        Get the planned ticks which should be run now and move the job to the next tick
+        :param now: timestamp
+        :param max_catch_up: maximum number of the missed ticks to run
+        :return: list of timestamps
+        """
+        if self.next_run is None or now < self.next_run:
+            return []
+        missed = int((now - self.next_run) // self.interval) + 1
+        ticks = [self.next_run + i * self.interval for i in range(missed)]
+        self.next_run += missed * self.interval
+        if not self.catch_up:
+            return ticks[-1:]
+        if len(ticks) > max_catch_up:
+            logger.warning('Scheduler - %s skipped %d missed ticks', self.name, len(ticks) - max_catch_up)
+            ticks = ticks[-max_catch_up:]
+        return ticks
+
+    def run(self, tick: float, stats: TickStats):
+        return self.func(tick_to_datetime(tick), stats)
+
+    def __str__(self):
+        return self.name
+
+
+def default_jobs() -> list:
+    return [
+        Job('sensor_log', lambda planned, stats: sensor_periodic_tasks(stats), 60 * 60),
+        Job('time_events', lambda planned, stats: time_relay_task(now=planned, stats=stats), 60, catch_up=True),
+        Job('sensor_events', lambda planned, stats: sensor_relay_task(stats), 5 * 60),
+    ]
+
+
+class Scheduler:
+    """
+    Long running scheduler keeping the jobs in memory. The ticks are aligned to the wall clock
+    and the missed ticks are caught up, so no database polling is needed to plan the jobs.
+    """
+
+    def __init__(self, jobs: list = None, clock=time.time, max_catch_up: int = 15, metrics: SchedulerMetrics = None):
+        self.jobs = {}
+        self.clock = clock
+        self.max_catch_up = max_catch_up
+        self.metrics = metrics or scheduler_metrics
+        for job in (jobs if jobs is not None else default_jobs()):
+            self.add(job)
+
+    def add(self, job: Job):
+        if job.name in self.jobs:
+            raise ValueError('Job %s is already scheduled' % job.name)
+        self.jobs[job.name] = job
+        job.schedule(self.clock())
+
+    def pending(self) -> list:
+        """
+        Get the jobs to run ordered by the planned time
+        :return: [(Job, timestamp)]
+        """
+        now = self.clock()
+        pending = []
+        for job in self.jobs.values():
+            pending += [(job, tick) for tick in job.due(now, self.max_catch_up)]
+        return sorted(pending, key=lambda item: item[1])
+
+    def next_run(self) -> float:
+        return min(job.next_run for job in self.jobs.values())
+
+    def run_job(self, job: Job, tick: float):
+        close_old_connections()
+        with self.metrics.tick(job.name, tick) as stats:
+            try:
+                return job.run(tick, stats)
+            except Exception as e:
+                stats.errors += 1
+                logger.exception('Scheduler - job %s failed; %s', job.name, e)
+            finally:
+                close_old_connections()
+
+    def run_pending(self) -> list:
+        """
+        Run the due jobs in the current thread
+        :return: [(job name, timestamp)]
+        """
+        executed = []
+        for job, tick in self.pending():
+            self.run_job(job, tick)
+            executed.append((job.name, tick))
+        return executed
+
+    async def run(self, stop: asyncio.Event = None):
+        """
+        Run the scheduler until the stop event is set. The jobs run one by one in the worker thread
+        because they use the Django ORM.
+        :param stop:
+        :return: None
+        """
+        stop = stop or asyncio.Event()
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='scheduler') as executor:
+            while not stop.is_set():
+                for job, tick in self.pending():
+                    await loop.run_in_executor(executor, self.run_job, job, tick)
+                delay = max(self.next_run() - self.clock(), 0)
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
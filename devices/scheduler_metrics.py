@@ -0,0 +1,148 @@
+from contextlib import contextmanager
+import json
+import logging
+import threading
+import time
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+logger = logging.getLogger('django')
+
+
+class TickStats:
+    """
+    Statistics of the single job run, the tasks count the evaluated and fired events
+    and the failed commands, the errors are the exceptions of the job itself
+    """
+
+    def __init__(self, job: str, planned: float = None, started: float = None):
+        self.job = job
+        self.started = started if started is not None else time.time()
+        self.planned = planned
+        self.duration = None
+        self.evaluated = 0
+        self.fired = 0
+        self.failed = 0
+        self.errors = 0
+
+    @property
+    def lateness(self) -> float or None:
+        if self.planned is None:
+            return None
+        return max(self.started - self.planned, 0)
+
+    def as_dict(self) -> dict:
+        return {
+            'job': self.job,
+            'planned': self.planned,
+            'started': self.started,
+            'lateness': self.lateness,
+            'duration': self.duration,
+            'evaluated': self.evaluated,
+            'fired': self.fired,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
+
+
+class PrometheusExporter:
+    def __init__(self, registry=None):
+        registry = registry or prometheus_client.REGISTRY
+        labels = ['job']
+        self.ticks = prometheus_client.Counter('scheduler_ticks_total', 'Scheduler job runs', labels,
+                                               registry=registry)
+        self.lateness = prometheus_client.Histogram('scheduler_tick_lateness_seconds',
+                                                    'Delay between the planned and the actual start', labels,
+                                                    registry=registry,
+                                                    buckets=(.01, .05, .1, .5, 1, 5, 15, 30, 60, 300))
+        self.duration = prometheus_client.Histogram('scheduler_tick_duration_seconds', 'Job run duration', labels,
+                                                    registry=registry,
+                                                    buckets=(.01, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60))
+        self.evaluated = prometheus_client.Counter('scheduler_events_evaluated_total', 'Evaluated events', labels,
+                                                   registry=registry)
+        self.fired = prometheus_client.Counter('scheduler_events_fired_total', 'Fired events', labels,
+                                               registry=registry)
+        self.failed = prometheus_client.Counter('scheduler_commands_failed_total', 'Failed device commands',
+                                                labels, registry=registry)
+        self.errors = prometheus_client.Counter('scheduler_job_errors_total', 'Job runs ended by an exception',
+                                                labels, registry=registry)
+
+    def record(self, stats: TickStats):
+        self.ticks.labels(stats.job).inc()
+        if stats.lateness is not None:
+            self.lateness.labels(stats.job).observe(stats.lateness)
+        self.duration.labels(stats.job).observe(stats.duration)
+        self.evaluated.labels(stats.job).inc(stats.evaluated)
+        self.fired.labels(stats.job).inc(stats.fired)
+        self.failed.labels(stats.job).inc(stats.failed)
+        self.errors.labels(stats.job).inc(stats.errors)
+
+
+class SchedulerMetrics:
+    """
+    Collects the tick statistics per job, writes them to the log and exports them to Prometheus
+    when prometheus_client is installed
+    """
+
+    def __init__(self, exporter=None):
+        self.__lock = threading.Lock()
+        self.__jobs = {}
+        self.__exporter = exporter
+
+    @property
+    def exporter(self):
+        if self.__exporter is None and prometheus_client is not None:
+            self.__exporter = PrometheusExporter()
+        return self.__exporter
+
+    @contextmanager
+    def tick(self, job: str, planned: float = None):
+        """
+        Measure the job run
+        :param job: job name
+        :param planned: planned start timestamp
+        :return: TickStats
+        """
+        stats = TickStats(job, planned)
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats.duration = time.perf_counter() - start
+            self.record(stats)
+
+    def record(self, stats: TickStats):
+        with self.__lock:
+            job = self.__jobs.setdefault(stats.job, {
+                'ticks': 0,
+                'evaluated': 0,
+                'fired': 0,
+                'failed': 0,
+                'errors': 0,
+                'max_lateness': 0,
+                'max_duration': 0,
+                'last': None,
+            })
+            job['ticks'] += 1
+            job['evaluated'] += stats.evaluated
+            job['fired'] += stats.fired
+            job['failed'] += stats.failed
+            job['errors'] += stats.errors
+            job['max_lateness'] = max(job['max_lateness'], stats.lateness or 0)
+            job['max_duration'] = max(job['max_duration'], stats.duration)
+            job['last'] = stats.as_dict()
+        if self.exporter:
+            self.exporter.record(stats)
+        tick = stats.as_dict()
+        # every tick is logged, the ticks of the jobs share the message
+        logger.info('Scheduler tick %s', json.dumps(tick), extra={'tick': tick, 'rate_limit': False})
+
+    def snapshot(self) -> dict:
+        with self.__lock:
+            return {name: dict(job) for name, job in self.__jobs.items()}
+
+
+metrics = SchedulerMetrics()
@@ -0,0 +1,208 @@
+import random
+import re
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from devices.models import Device, Workspace
+
+# the search needs at least two characters so the names are indexed by bigrams
+GRAM_SIZE = 2
+PREFIX, WORD, SUBSTRING = range(3)
+
+# incremented by every name change so the other processes rebuild their indexes
+VERSION_KEY = 'search:version'
+
+
+def version_timeout() -> int or None:
+    """
+    The version incremented in one process isn't seen by the others when the cache isn't shared,
+    so it expires after SEARCH_INDEX_STALENESS_LIMIT seconds and the indexes are rebuilt
+    """
+    return getattr(settings, 'SEARCH_INDEX_STALENESS_LIMIT', None)
+
+
+def current_version() -> int:
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # the random start doesn't follow the expired version
+        cache.add(VERSION_KEY, random.getrandbits(48), version_timeout())
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def next_version() -> int:
+    """
+    Increment the version atomically, the index is updated only when the new version follows its own
+    :return: new version
+    """
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        return current_version()
+
+
+def grams(text: str) -> set:
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+def rank(name: str, query: str) -> int or None:
+    """
+    Rank the match, prefix is better than a word beginning and the word beginning than a substring
+    :param name: lower case name
+    :param query: lower case query
+    :return: PREFIX, WORD, SUBSTRING or None if not matched
+    """
+    position = name.find(query)
+    if position < 0:
+        return None
+    if position == 0:
+        return PREFIX
+    if re.search(r'(?<![^\W_])' + re.escape(query), name):
+        return WORD
+    return SUBSTRING
+
+
+class NameIndex:
+    """
+    In-memory n-gram index of the model names. The model signals update the index of the process
+    incrementally after the commit, the changes done by other processes change the version in the cache
+    and the index is rebuilt on the next search. Without the shared cache the version expires,
+    so the index is rebuilt every SEARCH_INDEX_STALENESS_LIMIT seconds.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.__lock = threading.RLock()
+        self.__names = {}
+        self.__grams = {}
+        self.__version = None
+
+    @property
+    def is_built(self) -> bool:
+        return self.__version is not None and self.__version == current_version()
+
+    def build(self):
+        # read the version first so the changes done during the build trigger the next one
+        version = current_version()
+        names = self.model.objects.values_list('pk', 'name')
+        with self.__lock:
+            self.__names = {}
+            self.__grams = {}
+            for pk, name in names:
+                self.__add(pk, name)
+            self.__version = version
+
+    def __add(self, pk: int, name: str):
+        self.__remove(pk)
+        name = name or ''
+        self.__names[pk] = (name.lower(), name)
+        for gram in grams(name.lower()):
+            self.__grams.setdefault(gram, set()).add(pk)
+
+    def __remove(self, pk: int):
+        names = self.__names.pop(pk, None)
+        if names is None:
+            return
+        for gram in grams(names[0]):
+            postings = self.__grams.get(gram)
+            if postings is None:
+                continue
+            postings.discard(pk)
+            if not postings:
+                del self.__grams[gram]
+
+    def apply(self, version: int, changes: dict):
+        """
+        Update the index built from the version just before the given one and move it to the given one.
+        The index missing another change is left to be rebuilt on the next search.
+        :param version: version incremented by the change
+        :param changes: {pk: name or None when deleted}
+        :return: None
+        """
+        with self.__lock:
+            if self.__version is None or self.__version != version - 1:
+                return
+            for pk, name in changes.items():
+                if name is None:
+                    self.__remove(pk)
+                else:
+                    self.__add(pk, name)
+            self.__version = version
+
+    def clear(self):
+        with self.__lock:
+            self.__names = {}
+            self.__grams = {}
+            self.__version = None
+
+    def search(self, query: str, limit: int) -> list:
+        """
+        Find the names containing the query
+        :param query: at least two characters
+        :param limit: maximum number of results
+        :return: [{'pk': int, 'name': str}] ordered by rank
+        """
+        if not self.is_built:
+            self.build()
+        query = query.lower()
+        with self.__lock:
+            postings = [self.__grams.get(gram, set()) for gram in grams(query)]
+            if not postings:
+                return []
+            candidates = set.intersection(*sorted(postings, key=len))
+            matches = []
+            for pk in candidates:
+                lower_name, name = self.__names[pk]
+                match_rank = rank(lower_name, query)
+                if match_rank is not None:
+                    matches.append((match_rank, lower_name, pk, name))
+        return [{'pk': pk, 'name': name} for match_rank, lower_name, pk, name in sorted(matches)[:limit]]
+
+
+indexes = {
+    'device': NameIndex(Device),
+    'workspace': NameIndex(Workspace),
+}
+
+
+def names_changed(model, changes: dict):
+    """
+    Increment the version and apply the committed names to the indexes
+    :param model: Device or Workspace
+    :param changes: {pk: name or None when deleted}
+    :return: None
+    """
+    version = next_version()
+    for index in indexes.values():
+        index.apply(version, changes if index.model is model else {})
+
+
+def search_database(model, query: str, limit: int) -> list:
+    """
+    Search without the in-memory index, on PostgreSQL the icontains lookup uses the trigram index
+    :return: [{'pk': int, 'name': str}]
+    """
+    results = model.objects.filter(name__icontains=query)
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+        results = results.annotate(similarity=TrigramSimilarity('name', query)).order_by('-similarity', 'name')
+    else:
+        results = results.order_by('name')
+    return list(results.values('pk', 'name')[:limit])
+
+
+def search(scope: str, query: str, limit: int) -> list:
+    """
+    Search the names of devices or workspaces
+    :param scope: device or workspace
+    :param query:
+    :param limit:
+    :return: [{'pk': int, 'name': str}] ordered by rank
+    """
+    index = indexes[scope]
+    if getattr(settings, 'SEARCH_INDEX_ENABLED', True):
+        return index.search(query, limit)
+    return search_database(index.model, query, limit)
@@ -0,0 +1,37 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from devices import dashboard_cache, search
+from devices.models import Device, Workspace
+
+READINGS_FIELDS = {'readings', 'updated_at'}
+
+
+def name_changed(model, pk: int, name: str or None):
+    dashboard_cache.metadata_changed()
+    # the rolled back name doesn't get to the index
+    transaction.on_commit(lambda: search.names_changed(model, {pk: name}))
+
+
+@receiver(post_save, sender=Device)
+def device_saved(sender, instance: Device, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= READINGS_FIELDS:
+        dashboard_cache.readings_changed(instance.workspace_id)
+    else:
+        name_changed(Device, instance.pk, instance.name)
+
+
+@receiver(post_delete, sender=Device)
+def device_deleted(sender, instance: Device, **kwargs):
+    name_changed(Device, instance.pk, None)
+
+
+@receiver(post_save, sender=Workspace)
+def workspace_saved(sender, instance: Workspace, **kwargs):
+    name_changed(Workspace, instance.pk, instance.name)
+
+
+@receiver(post_delete, sender=Workspace)
+def workspace_deleted(sender, instance: Workspace, **kwargs):
+    name_changed(Workspace, instance.pk, None)
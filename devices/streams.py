@@ -0,0 +1,190 @@
+import asyncio
+import json
+import math
+import secrets
+import time
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from devices.pubsub import hub
+
+STREAM_PATH = '/api/v1/devices/stream/'
+TICKET_KEY = 'stream:ticket:%s'
+# seconds between the keep alive comments, it keeps the connection open through the proxies
+KEEP_ALIVE = 15
+# seconds the stream ticket can be redeemed
+TICKET_TIMEOUT = 30
+# seconds between the checks the user is still active
+USER_CHECK = 60
+
+
+def parse_ids(params: dict, key: str) -> set or None:
+    """
+    Parse the ids from the query, e.g. ?devices=1,2&devices=3
+    :return: set of int or None
+    """
+    values = [value for param in params.get(key, []) for value in param.split(',') if value]
+    if not values:
+        return None
+    return {int(value) for value in values}
+
+
+def get_token(scope: dict) -> str or None:
+    for name, value in scope.get('headers', []):
+        if name == b'authorization' and value.startswith(b'Bearer '):
+            return value[len(b'Bearer '):].decode()
+    return None
+
+
+def issue_ticket(user_id: int, expires: float or None) -> str:
+    """
+    Issue the single use ticket for the clients which can't set the Authorization header, e.g. EventSource.
+    The ticket is sent in the query instead of the token so the token never ends up in the access logs.
+    :param user_id:
+    :param expires: expiration of the access token the ticket was issued for, timestamp or None
+    :return: ticket
+    """
+    ticket = secrets.token_urlsafe(32)
+    cache.set(TICKET_KEY % ticket, {'user_id': user_id, 'expires': expires}, TICKET_TIMEOUT)
+    return ticket
+
+
+def redeem_ticket(ticket: str) -> dict or None:
+    """
+    Redeem the ticket, only the first redemption succeeds
+    :param ticket:
+    :return: dict with the user_id and expires or None
+    """
+    key = TICKET_KEY % ticket
+    credentials = cache.get(key)
+    # only one of the concurrent redemptions deletes the key
+    if credentials is None or not cache.delete(key):
+        return None
+    return credentials
+
+
+def authenticate(scope: dict, params: dict) -> tuple or None:
+    """
+    Authenticate the stream by the access token in the Authorization header or the ticket in the query
+    :return: tuple of the user id and the expiration timestamp or None
+    """
+    if params.get('ticket'):
+        credentials = redeem_ticket(params['ticket'][0])
+        if credentials is None:
+            return None
+        expires = credentials['expires']
+        return credentials['user_id'], math.inf if expires is None else expires
+    raw_token = get_token(scope)
+    if raw_token is None:
+        return None
+    try:
+        token = AccessToken(raw_token)
+    except TokenError:
+        return None
+    if api_settings.USER_ID_CLAIM not in token:
+        return None
+    return token[api_settings.USER_ID_CLAIM], token['exp']
+
+
+def is_active_user(user_id) -> bool:
+    return get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}, is_active=True).exists()
+
+
+async def send_error(send, status: int, error: str):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps({'error': error}).encode()})
+
+
+async def close_stream(send, error: str):
+    body = b'event: close\ndata: %s\n\n' % json.dumps({'error': error}).encode()
+    await send({'type': 'http.response.body', 'body': body, 'more_body': False})
+
+
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def readings_stream(scope, receive, send):
+    """
+    ASGI application streaming the reading changes as server-sent events.
+    The stream is filtered by ?workspace=1,2 and ?devices=3,4, without filters all changes are sent.
+    The changes are pushed from the in-process hub so no database reads are needed.
+    The stream is closed when the access token expires or the user isn't active anymore.
+    """
+    params = parse_qs(scope.get('query_string', b'').decode())
+    credentials = authenticate(scope, params)
+    if credentials is None or not await sync_to_async(is_active_user)(credentials[0]):
+        await send_error(send, 401, 'Given token not valid for any token type')
+        return
+    user_id, expires = credentials
+    try:
+        workspaces = parse_ids(params, 'workspace')
+        devices = parse_ids(params, 'devices')
+    except ValueError:
+        await send_error(send, 400, 'The workspace and device IDs must be numeric')
+        return
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+    disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+    check_at = time.time() + USER_CHECK
+    with hub.subscribe(workspaces, devices) as subscription:
+        try:
+            while not disconnect.done():
+                now = time.time()
+                if now >= expires:
+                    await close_stream(send, 'Token is invalid or expired')
+                    break
+                if now >= check_at:
+                    if not await sync_to_async(is_active_user)(user_id):
+                        await close_stream(send, 'User is inactive')
+                        break
+                    check_at = now + USER_CHECK
+                change = asyncio.ensure_future(subscription.get())
+                timeout = min(KEEP_ALIVE, expires - now, check_at - now)
+                done, pending = await asyncio.wait({change, disconnect}, timeout=timeout,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if change in done:
+                    message, data = change.result()
+                    body = b'event: reading\nid: %d\ndata: %s\n\n' % (message['pk'], data)
+                else:
+                    change.cancel()
+                    body = b': keep-alive\n\n'
+                if disconnect.done():
+                    break
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        finally:
+            disconnect.cancel()
+
+
+def router(django_application):
+    """
+    Route the stream path to the readings stream, all other requests are handled by Django
+    :param django_application:
+    :return: ASGI application
+    """
+    async def application(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == STREAM_PATH:
+            return await readings_stream(scope, receive, send)
+        return await django_application(scope, receive, send)
+    return application
@@ -1,27 +1,42 @@
 from django.utils.datetime_safe import datetime
 
+from devices.command_planner import CommandPlanner, is_state_change, relay_state
 from devices.device_types.device_type_factories import RelayFactory
 from devices.device_types.exceptions import DeviceException
 from devices.models import Device, DeviceLog, DeviceEvent
+from devices.scheduler_metrics import metrics
 from background_task import background
 import logging
 
 logger = logging.getLogger('django')
 
 
-def sensor_periodic_tasks():
+def sensor_periodic_tasks(stats=None):
     """
     At every hour save sensor reading saves to the database
+    :param stats: TickStats
     :return: None
     """
     sensors = Device.objects.filter(type='sensor')
     for sensor in sensors:
+        if stats:
+            stats.evaluated += 1
         if not sensor.readings:
             continue
         DeviceLog.objects.create(device=sensor, readings=sensor.readings)
+        if stats:
+            stats.fired += 1
 
 
-def is_event_time(event_time: datetime) -> bool:
+def is_event_time(event_time: datetime, now: datetime = None) -> bool:
+    """
+    Check is the event time now
+    :param event_time:
+    :param now: the planned tick time from the scheduler, when it's given the minute must match exactly
+    :return: bool
+    """
+    if now:
+        return now.hour == event_time.hour and now.minute == event_time.minute
     now = datetime.now()
     # the event can be run at the same minute twice to avoid
     # skipping the task allow run task when difference is one minute
@@ -30,18 +45,7 @@ def is_event_time(event_time: datetime) -> bool:
 
 
 def is_eligible_to_fire_task_based_on_readings(task: DeviceEvent) -> bool:
-    if not task.device.readings:
-        return True
-    try:
-        readings = task.device.readings
-        device_state = readings['state'].lower()
-        return task.action.lower() != device_state
-    except KeyError:
-        logger.error('Task - the device state cannot be obtained')
-        return False
-    except TypeError:
-        logger.error('Task - the device state not found in readings')
-        return False
+    return is_state_change(task.device, task.action)
 
 
 def relay_action(device: Device, state: str):
@@ -51,29 +55,30 @@ def relay_action(device: Device, state: str):
         action = relay.message(state)
         return action['state']
     except DeviceException as e:
-        logger.error("Task -  problem to send message to the device - %s" % str(e))
+        logger.error("Task -  problem to send message to the device - %s", e)
     except KeyError:
         logger.error('Task - problem with message method state key not found')
     except Exception as e:
         logging.error('Task error - %s' % str(e))
 
 
-def time_relay_task():
+def time_relay_task(now: datetime = None, stats=None):
     """
     At every minute check is any event to run
+    :param now: the planned tick time in the local time zone
+    :param stats: TickStats
     :return:
     """
-    tasks = DeviceEvent.objects.filter(type='time')
-    # fired_tasks is for testing purposes
-    fired_tasks = []
+    tasks = DeviceEvent.objects.filter(type='time').select_related('device')
+    planner = CommandPlanner()
     for task in tasks:
-        if not (is_event_time(task.time) and is_eligible_to_fire_task_based_on_readings(task)):
+        if stats:
+            stats.evaluated += 1
+        if not is_event_time(task.time, now):
             continue
-        # fire action
-        action = relay_action(task.device, task.action)
-        if action:
-            fired_tasks.append(action)
-    return fired_tasks
+        planner.add(task)
+    # fired tasks are returned for testing purposes
+    return planner.flush(relay_action, stats)
 
 
 def get_sensor_reading_type(sensor: Device, reading_type: str) -> float or None:
@@ -90,11 +95,21 @@ def get_sensor_reading_type(sensor: Device, reading_type: str) -> float or None:
         return None
 
 
-def sensor_rule_task(rule: str, sensor_reading: float, task_reading: float) -> bool:
+def sensor_rule_task(rule: str, sensor_reading: float, task_reading: float, hysteresis: float = 0,
+                     active: bool = False) -> bool:
+    """
+    Check the sensor reading against the rule with the hysteresis band around the value. The rule switches
+    the relay when the reading passes the far edge of the band and keeps it till the reading passes
+    the near edge, so the reading around the value doesn't flip the relay on every check.
+    :param hysteresis: half width of the band
+    :param active: the relay is already in the rule action state
+    :return: bool
+    """
+    offset = -(hysteresis or 0) if active else hysteresis or 0
     try:
         rules = {
-            '>': sensor_reading > task_reading,
-            '<': sensor_reading < task_reading,
+            '>': sensor_reading > task_reading + offset,
+            '<': sensor_reading < task_reading - offset,
         }
         return rules[rule]
     except KeyError:
@@ -102,24 +117,24 @@ def sensor_rule_task(rule: str, sensor_reading: float, task_reading: float) -> b
         return False
 
 
-def sensor_relay_task():
+def sensor_relay_task(stats=None):
     """
     Every five minutes check sensor task based on sensor readings fire task
+    :param stats: TickStats
     :return:
     """
-    tasks = DeviceEvent.objects.filter(type='sensor')
-    # fired_tasks is for testing purposes
-    fired_tasks = []
+    tasks = DeviceEvent.objects.filter(type='sensor').select_related('device', 'sensor')
+    planner = CommandPlanner()
     for task in tasks:
+        if stats:
+            stats.evaluated += 1
         sensor = task.sensor
         sensor_reading = get_sensor_reading_type(sensor, task.reading_type)
-        if sensor_reading and is_eligible_to_fire_task_based_on_readings(task) and sensor_rule_task(task.rule,
-                                                                                                    sensor_reading,
-                                                                                                    task.value):
-            action = relay_action(task.device, task.action)
-            if action:
-                fired_tasks.append(action)
-    return fired_tasks
+        active = relay_state(task.device) == task.action.lower()
+        if sensor_reading and sensor_rule_task(task.rule, sensor_reading, task.value, task.hysteresis, active):
+            planner.add(task)
+    # fired tasks are returned for testing purposes
+    return planner.flush(relay_action, stats)
 
 
 @background
@@ -128,7 +143,8 @@ def task_for_every_hour():
     At every hour save sensor reading to the database
     :return: None
     """
-    sensor_periodic_tasks()
+    with metrics.tick('sensor_log') as stats:
+        sensor_periodic_tasks(stats)
 
 
 @background
@@ -137,7 +153,8 @@ def time_task():
     Task runs for every minute
     :return:
     """
-    time_relay_task()
+    with metrics.tick('time_events') as stats:
+        time_relay_task(stats=stats)
 
 
 @background
@@ -146,4 +163,5 @@ def senor_tasks():
     Task runs for every five minutes
     :return:
     """
-    sensor_relay_task()
+    with metrics.tick('sensor_events') as stats:
+        sensor_relay_task(stats)
@@ -4,7 +4,6 @@ import os
 from datetime import datetime
 from unittest.mock import patch
 
-from azure.iot.hub import IoTHubRegistryManager
 from django.contrib.auth.models import User
 from django.utils.timezone import make_aware
 from rest_framework.authtoken.models import Token
@@ -162,6 +161,27 @@ class TestDevices(APITestCase):
         self.assertEqual(content['readings'], readings)
         self.assertEqual(content['updated_at'], str(updated_at).replace(' ', 'T'))
 
+    def test_get_bulk_readings(self):
+        workspace = Workspace.objects.create(name='Kitchen')
+        relay = Device.objects.create(name='Relay', readings={'state': 'ON'}, workspace=workspace)
+        sensor = Device.objects.create(name='Sensor', readings={'temperature': 21.5})
+        Device.objects.create(name='Other')
+        # the user and the readings
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/v1/devices/readings/?ids=%i,%i' % (relay.pk, sensor.pk))
+        content = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, {
+            str(relay.pk): {'readings': {'state': 'ON'}, 'updated_at': None},
+            str(sensor.pk): {'readings': {'temperature': 21.5}, 'updated_at': None},
+        })
+        response = self.client.get('/api/v1/devices/readings/?workspace=%i' % workspace.pk)
+        self.assertEqual(list(response.json()), [str(relay.pk)])
+
+    def test_get_bulk_readings_wrong_ids(self):
+        self.assertEqual(self.client.get('/api/v1/devices/readings/').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/devices/readings/?ids=1,a').status_code, 400)
+
     def test_update_readings_for_multiple_devices(self):
         usr = User.objects.create_user(username='username2', password='password')
         # generate the token rather use JWT to check correct error
@@ -331,7 +351,7 @@ class TestDevices(APITestCase):
                                     content_type='application/json')
         self.assertEqual(response.status_code, 405)
 
-    @patch.object(IoTHubRegistryManager, 'send_c2d_message')
+    @patch('azure.iot.hub.IoTHubRegistryManager.send_c2d_message')
     @patch.object(os.environ, 'get')
     def test_change_device_state(self, mock_env_connection_string, mock_send_c2d_message):
         # keep this key format otherwise will throw exception
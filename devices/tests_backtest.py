@@ -0,0 +1,135 @@
+from datetime import datetime
+from io import StringIO
+
+import numpy as np
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils.timezone import make_aware
+from rest_framework.test import APITestCase
+
+from devices.backtest import evaluate_rules, load_history
+from devices.models import Device, DeviceLog
+from devices.tasks import sensor_rule_task
+from devices.tests import authenticate
+
+
+def create_history(sensor: Device, temperatures: list):
+    for hour, temperature in enumerate(temperatures):
+        log = DeviceLog.objects.create(device=sensor, readings={'temperature': temperature, 'humidity': 50})
+        # rewrite date
+        log.time = make_aware(datetime(2021, 9, 1, hour))
+        log.save()
+
+
+class TestBacktest(TestCase):
+    def test_evaluate_rules(self):
+        times = np.arange(6, dtype=np.float64) * 3600
+        values = np.array([20.0, 21.2, 20.9, 21.3, 20.4, 21.6])
+        results = evaluate_rules(times, values, [
+            {'rule': '>', 'value': 21, 'hysteresis': 0, 'action': 'OFF'},
+            {'rule': '>', 'value': 21, 'hysteresis': 0.5, 'action': 'OFF'},
+            {'rule': '<', 'value': 21, 'hysteresis': 0, 'action': 'ON'},
+        ])
+        # the reading around the value flips the relay on every crossing
+        self.assertEqual(results[0]['fired'], 3)
+        self.assertEqual(results[0]['firing_times'], [3600.0, 10800.0, 18000.0])
+        # the hysteresis band suppresses the chatter
+        self.assertEqual(results[1]['fired'], 1)
+        self.assertEqual(results[1]['firing_times'], [18000.0])
+        self.assertEqual(results[1]['duty_cycle'], 1.0)
+        self.assertEqual(results[2]['fired'], 3)
+        self.assertAlmostEqual(results[2]['duty_cycle'], 0.6)
+
+    def test_evaluate_rules_as_scheduler(self):
+        values = np.array([20.0, 21.6, 21.2, 20.6, 0, 20.4, 21.4, 21.6, 20.9])
+        times = np.arange(values.size, dtype=np.float64) * 300
+        rules = [
+            {'rule': '>', 'value': 21, 'hysteresis': 0.5, 'action': 'OFF'},
+            {'rule': '<', 'value': 21, 'hysteresis': 0.5, 'action': 'ON'},
+        ]
+        for rule, result in zip(rules, evaluate_rules(times, values, rules)):
+            # the scheduler decides with the relay state, the opposite rule switches the relay back
+            firing_times, active = [], False
+            for timestamp, value in zip(times, values):
+                if not value:
+                    continue
+                if sensor_rule_task(rule['rule'], value, rule['value'], rule['hysteresis'], active):
+                    if not active:
+                        firing_times.append(timestamp)
+                    active = True
+                else:
+                    active = False
+            self.assertEqual(result['firing_times'], firing_times)
+            self.assertEqual(result['fired'], len(firing_times))
+
+    def test_evaluate_unknown_rule(self):
+        with self.assertRaises(ValueError):
+            evaluate_rules(np.array([0.0]), np.array([21.0]), [{'rule': '=', 'value': 21, 'action': 'ON'}])
+
+    def test_evaluate_rules_without_history(self):
+        results = evaluate_rules(np.array([]), np.array([]), [{'rule': '<', 'value': 21, 'action': 'ON'}])
+        self.assertEqual(results, [{'fired': 0, 'firing_times': [], 'duty_cycle': 0.0}])
+
+    def test_evaluate_year_of_readings(self):
+        # readings every five minutes for the whole year
+        times = np.arange(365 * 24 * 12, dtype=np.float64) * 300
+        values = 21 + 3 * np.sin(times / 86400 * 2 * np.pi) + np.random.default_rng(1).normal(0, .3, times.size)
+        rules = [{'rule': '<', 'value': 19 + i * .5, 'hysteresis': .25, 'action': 'ON'} for i in range(10)]
+        results = evaluate_rules(times, values, rules)
+        self.assertEqual(len(results), 10)
+        self.assertTrue(results[0]['duty_cycle'] < results[-1]['duty_cycle'])
+
+    def test_benchmark_command(self):
+        output = StringIO()
+        call_command('benchmark_backtest', '--days', '7', '--repeat', '1', stdout=output)
+        self.assertIn('Evaluated 10 rules against 2016 readings', output.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('benchmark_backtest', '--days', '1', '--repeat', '1', '--budget-ms', '0', stdout=StringIO())
+
+    def test_load_history(self):
+        sensor = Device.objects.create(name='Sensor', type='sensor', sensor_type='am2301')
+        create_history(sensor, [20, 21.5, 22])
+        DeviceLog.objects.create(device=sensor, readings={'humidity': 50})
+        times, values = load_history(sensor, 'temperature')
+        self.assertEqual(values.tolist(), [20, 21.5, 22])
+        self.assertEqual(np.diff(times).tolist(), [3600, 3600])
+
+
+class TestBacktestView(APITestCase):
+    def setUp(self):
+        self.client = authenticate(self.client)
+
+    def test_backtest(self):
+        sensor = Device.objects.create(name='Sensor', type='sensor', sensor_type='am2301')
+        create_history(sensor, [20.0, 21.2, 20.9, 21.3, 20.4, 21.6])
+        response = self.client.post('/api/v1/devices/event/backtest/', {
+            'sensor': sensor.pk,
+            'reading_type': 'temperature',
+            'rules': [{'rule': '>', 'value': 21, 'hysteresis': 0.5, 'action': 'off'}]
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        content = response.json()
+        self.assertEqual(content['samples'], 6)
+        self.assertEqual(content['rules'][0]['action'], 'OFF')
+        self.assertEqual(content['rules'][0]['fired'], 1)
+        self.assertEqual(content['rules'][0]['firing_times'], ['2021-09-01T05:00:00+01:00'])
+
+    def test_backtest_wrong_rule(self):
+        sensor = Device.objects.create(name='Sensor', type='sensor', sensor_type='am2301')
+        response = self.client.post('/api/v1/devices/event/backtest/', {
+            'sensor': sensor.pk,
+            'reading_type': 'temperature',
+            'rules': [{'rule': '=', 'value': 21}]
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'The rule or action isn\'t implemented'})
+
+    def test_backtest_relay(self):
+        relay = Device.objects.create(name='Relay', type='relay')
+        response = self.client.post('/api/v1/devices/event/backtest/', {
+            'sensor': relay.pk,
+            'reading_type': 'temperature',
+            'rules': [{'rule': '>', 'value': 21}]
+        }, format='json')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,149 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from devices import dashboard_cache
+from devices.models import Workspace, Device
+from devices.tests import authenticate
+
+
+class TestDashboardCache(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = authenticate(self.client)
+        self.workspace = Workspace.objects.create(name='Workspace')
+        self.relay = Device.objects.create(name='Relay', device_host_id='t1', type='relay', gpio=1,
+                                           workspace=self.workspace)
+        Device.objects.create(name='Sensor', device_host_id='t1', type='sensor', sensor_type='am2301',
+                              workspace=self.workspace)
+
+    def get_dashboard(self, query='', **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/devices/dashboard/%s' % query, **headers)
+        devices_queries = [q['sql'] for q in queries.captured_queries if 'devices_' in q['sql']]
+        return response, devices_queries
+
+    def test_not_modified_without_database(self):
+        with patch('devices.dashboard_cache.time') as clock:
+            clock.time.return_value = 1000.5
+            response, queries = self.get_dashboard()
+            # the version created in the current second may be followed by another one with the same date
+            self.assertFalse(response.has_header('Last-Modified'))
+            clock.time.return_value = 1001
+            response, queries = self.get_dashboard()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        response, queries = self.get_dashboard(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(queries, [])
+
+        response, queries = self.get_dashboard(HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(queries, [])
+
+    def test_change_in_same_second_not_cached_by_date(self):
+        since = 'Thu, 01 Jan 1970 00:16:41 GMT'
+        with patch('devices.dashboard_cache.time') as clock:
+            clock.time.return_value = 1000.2
+            response, queries = self.get_dashboard()
+            self.assertFalse(response.has_header('Last-Modified'))
+            self.relay.readings = {'state': 'ON'}
+            clock.time.return_value = 1000.7
+            with self.captureOnCommitCallbacks(execute=True):
+                self.relay.save(update_fields=['readings', 'updated_at'])
+            # both versions have the same date, it isn't used till the second is over
+            response, queries = self.get_dashboard(HTTP_IF_MODIFIED_SINCE=since)
+            self.assertEqual(response.status_code, 200)
+            clock.time.return_value = 1002
+            response, queries = self.get_dashboard(HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['Last-Modified'], since)
+
+    def test_bumped_after_commit(self):
+        response, queries = self.get_dashboard()
+        self.relay.readings = {'state': 'ON'}
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.relay.save(update_fields=['readings', 'updated_at'])
+            # the data before the commit is cached under the current version
+            self.assertEqual(self.get_dashboard(HTTP_IF_NONE_MATCH=response['ETag'])[0].status_code, 304)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.get_dashboard(HTTP_IF_NONE_MATCH=response['ETag'])[0].status_code, 200)
+
+    def test_cached_payload(self):
+        first, queries = self.get_dashboard('?workspace=%i' % self.workspace.pk)
+        self.assertTrue(len(queries) > 0)
+        second, queries = self.get_dashboard('?workspace=%i' % self.workspace.pk)
+        self.assertEqual(queries, [])
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_readings_changed(self):
+        response, queries = self.get_dashboard()
+        etag = response['ETag']
+        self.relay.readings = {'state': 'ON'}
+        self.relay.updated_at = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.relay.save(update_fields=['readings', 'updated_at'])
+
+        response, queries = self.get_dashboard(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['devices']['relays'][0]['readings'], {'state': 'ON'})
+
+    def test_readings_changed_in_other_workspace(self):
+        other = Workspace.objects.create(name='Other')
+        relay = Device.objects.create(name='Relay', device_host_id='t2', type='relay', gpio=1, workspace=other)
+        response, queries = self.get_dashboard('?workspace=%i' % self.workspace.pk)
+        relay.readings = {'state': 'ON'}
+        relay.save(update_fields=['readings', 'updated_at'])
+        response, queries = self.get_dashboard('?workspace=%i' % self.workspace.pk,
+                                               HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_metadata_changed(self):
+        response, queries = self.get_dashboard()
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Workspace.objects.create(name='Other')
+        response, queries = self.get_dashboard(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['workspaces']), 2)
+        # the new workspace is the first by name so it's the default one now
+        self.assertEqual(len(response.json()['devices']['relays']), 0)
+
+        response, queries = self.get_dashboard('?workspace=%i' % self.workspace.pk)
+        self.relay.name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.relay.save()
+        response, queries = self.get_dashboard('?workspace=%i' % self.workspace.pk,
+                                               HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['devices']['relays'][0]['name'], 'Renamed')
+
+    def test_workspace_not_found(self):
+        response, queries = self.get_dashboard('?workspace=99')
+        self.assertEqual(response.status_code, 404)
+
+    def test_conditional_request_for_missing_workspace(self):
+        query = '?workspace=%i' % self.workspace.pk
+        response, queries = self.get_dashboard(query)
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.workspace.delete()
+        response, queries = self.get_dashboard(query, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 404)
+        response, queries = self.get_dashboard('?workspace=99', HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
+
+    def test_version_expires_without_shared_cache(self):
+        with self.settings(CACHE_STALENESS_LIMIT=60), patch('devices.dashboard_cache.cache') as mock_cache:
+            mock_cache.get.return_value = None
+            dashboard_cache.bump(dashboard_cache.GLOBAL_SCOPE)
+        self.assertEqual(mock_cache.set_many.call_args[0][1], 60)
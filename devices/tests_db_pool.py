@@ -0,0 +1,251 @@
+import threading
+import unittest
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from backend.db.pool import ConnectionPool, PoolCollector, PoolTimeout, REGISTRY, get_pool, pools
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+try:
+    import psycopg2
+    from psycopg2 import extensions
+    from backend.db.postgresql_pool import base
+except ImportError:
+    psycopg2 = None
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.healthy = True
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(**kwargs) -> ConnectionPool:
+    options = {'max_size': 2, 'timeout': 0.1, 'stats_interval': 0}
+    options.update(kwargs)
+    return ConnectionPool(FakeConnection, FakeConnection.close, check=lambda connection: connection.healthy,
+                          **options)
+
+
+class TestConnectionPool(SimpleTestCase):
+    def test_connection_reused(self):
+        pool = make_pool()
+        connection = pool.acquire()
+        pool.release(connection)
+        self.assertIs(pool.acquire(), connection)
+        stats = pool.stats()
+        self.assertEqual((stats['created'], stats['reused'], stats['in_use'], stats['idle']), (1, 1, 1, 0))
+
+    def test_unhealthy_connection_replaced(self):
+        pool = make_pool()
+        connection = pool.acquire()
+        pool.release(connection)
+        connection.healthy = False
+        self.assertIsNot(pool.acquire(), connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()['unhealthy'], 1)
+
+    def test_check_skipped_for_recently_used(self):
+        check = mock.Mock(return_value=True)
+        pool = ConnectionPool(FakeConnection, FakeConnection.close, check=check, check_after=60, stats_interval=0)
+        pool.release(pool.acquire())
+        pool.acquire()
+        check.assert_not_called()
+
+    def test_expired_connection_replaced(self):
+        pool = make_pool(max_lifetime=60)
+        with mock.patch('backend.db.pool.time.monotonic', return_value=1000):
+            connection = pool.acquire()
+            pool.release(connection)
+        with mock.patch('backend.db.pool.time.monotonic', return_value=1061):
+            self.assertIsNot(pool.acquire(), connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()['expired'], 1)
+
+    def test_broken_connection_not_returned(self):
+        pool = ConnectionPool(FakeConnection, FakeConnection.close, reset=lambda connection: False, stats_interval=0)
+        connection = pool.acquire()
+        pool.release(connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(len(pool), 0)
+        self.assertEqual(pool.stats()['broken'], 1)
+
+    def test_checkout_timeout(self):
+        pool = make_pool(max_size=1)
+        pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_checkout_waits_for_release(self):
+        pool = make_pool(max_size=1, timeout=5)
+        connection = pool.acquire()
+        timer = threading.Timer(0.05, pool.release, [connection])
+        timer.start()
+        self.assertIs(pool.acquire(), connection)
+        timer.join()
+        self.assertEqual(pool.stats()['waits'], 1)
+
+    def test_discarded_connection_closed(self):
+        pool = make_pool(max_size=1)
+        connection = pool.acquire()
+        pool.discard(connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(len(pool), 0)
+        self.assertIsNot(pool.acquire(), connection)
+
+    def test_failed_connect_frees_the_place(self):
+        pool = ConnectionPool(mock.Mock(side_effect=OSError('refused')), FakeConnection.close, max_size=1,
+                              timeout=0.1, stats_interval=0)
+        for _ in range(2):
+            with self.assertRaises(OSError):
+                pool.acquire()
+
+    def test_pool_recreated_after_fork(self):
+        first = get_pool(('test', ()), make_pool)
+        self.assertIs(get_pool(('test', ()), make_pool), first)
+        with mock.patch('backend.db.pool.os.getpid', return_value=first.pid + 1):
+            self.assertIsNot(get_pool(('test', ()), make_pool), first)
+
+    def test_connection_opened_before_fork_not_closed(self):
+        parent = make_pool()
+        connection = parent.acquire()
+        child = make_pool()
+        child.release(connection)
+        child.discard(connection)
+        # the socket is shared with the parent process, closing it would end the parent's session
+        self.assertFalse(connection.closed)
+        self.assertEqual(len(child), 0)
+
+    @unittest.skipUnless(prometheus_client, 'prometheus_client is not installed')
+    def test_metrics_exported(self):
+        registry = prometheus_client.CollectorRegistry()
+        registry.register(PoolCollector())
+        self.addCleanup(pools.pop, ('metrics_test', ()), None)
+        pool = get_pool(('metrics_test', ()), lambda: make_pool(name='metrics_test'))
+        connection = pool.acquire()
+        pool.release(connection)
+        connection = pool.acquire()
+        labels = {'pool': 'metrics_test'}
+        self.assertEqual(registry.get_sample_value('db_pool_created_total', labels), 1)
+        self.assertEqual(registry.get_sample_value('db_pool_reused_total', labels), 1)
+        self.assertEqual(registry.get_sample_value('db_pool_in_use', labels), 1)
+        self.assertEqual(registry.get_sample_value('db_pool_max_size', labels), 2)
+        self.assertEqual(registry.get_sample_value('db_pool_wait_seconds_total', labels), 0)
+        # the collector is registered with the default registry when the first pool is created
+        self.assertIsNotNone(REGISTRY.get_sample_value('db_pool_created_total', labels))
+
+
+class PgConnection(FakeConnection):
+    """
+    psycopg2 connection returned by the mocked psycopg2.connect
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.isolation_level = None
+        self.set_session = mock.Mock(side_effect=self.__set_session)
+
+    def __set_session(self, isolation_level=None):
+        self.isolation_level = isolation_level
+
+    def get_transaction_status(self):
+        return extensions.TRANSACTION_STATUS_IDLE
+
+    def cursor(self):
+        # the checkout check runs SELECT 1
+        return mock.MagicMock()
+
+
+@unittest.skipUnless(psycopg2, 'psycopg2 is not installed')
+class TestPooledDatabaseWrapper(SimpleTestCase):
+    alias = 'pool_test'
+
+    def setUp(self):
+        patcher = mock.patch('backend.db.postgresql_pool.base.psycopg2.connect', side_effect=lambda **_: PgConnection())
+        self.connect = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('backend.db.postgresql_pool.base.psycopg2.extras.register_default_jsonb')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.remove_pools)
+
+    def remove_pools(self):
+        for key in [key for key in pools if key[0] == self.alias]:
+            del pools[key]
+
+    def make_wrapper(self, **options) -> 'base.DatabaseWrapper':
+        return base.DatabaseWrapper({
+            'ENGINE': 'backend.db.postgresql_pool', 'NAME': 'backend', 'USER': 'backend', 'PASSWORD': '',
+            'HOST': 'localhost', 'PORT': '', 'OPTIONS': options, 'POOL': {'STATS_INTERVAL': 0}, 'TIME_ZONE': None,
+            'CONN_MAX_AGE': 0, 'AUTOCOMMIT': True, 'ATOMIC_REQUESTS': False, 'TEST': {},
+        }, self.alias)
+
+    @staticmethod
+    def open(wrapper: 'base.DatabaseWrapper'):
+        wrapper.connection = wrapper.get_new_connection(wrapper.get_connection_params())
+        return wrapper.connection
+
+    def test_connection_returned_to_pool(self):
+        wrapper = self.make_wrapper()
+        connection = self.open(wrapper)
+        wrapper.close()
+        self.assertIsNone(wrapper.connection)
+        self.assertFalse(connection.closed)
+        self.assertIs(self.open(self.make_wrapper()), connection)
+        self.connect.assert_called_once_with(database='backend', user='backend', host='localhost')
+
+    def test_isolation_level_on_reuse(self):
+        serializable = extensions.ISOLATION_LEVEL_SERIALIZABLE
+        wrapper = self.make_wrapper(isolation_level=serializable)
+        connection = self.open(wrapper)
+        connection.set_session.assert_called_once_with(isolation_level=serializable)
+        wrapper.close()
+
+        wrapper = self.make_wrapper(isolation_level=serializable)
+        self.assertIs(self.open(wrapper), connection)
+        # the level is kept by the pooled connection
+        connection.set_session.assert_called_once()
+        wrapper.close()
+
+        read_committed = extensions.ISOLATION_LEVEL_READ_COMMITTED
+        wrapper = self.make_wrapper(isolation_level=read_committed)
+        self.assertIs(self.open(wrapper), connection)
+        connection.set_session.assert_called_with(isolation_level=read_committed)
+        self.assertEqual(wrapper.isolation_level, read_committed)
+        wrapper.close()
+
+        # without the option the level of the connection is used
+        wrapper = self.make_wrapper()
+        self.open(wrapper)
+        self.assertEqual(wrapper.isolation_level, read_committed)
+
+    def test_closed_in_atomic_block_not_reused(self):
+        wrapper = self.make_wrapper()
+        connection = self.open(wrapper)
+        wrapper.in_atomic_block = True
+        wrapper.close()
+        # Django keeps the connection until the atomic block exits
+        self.assertIs(wrapper.connection, connection)
+        self.assertTrue(connection.closed)
+        self.assertIsNot(self.open(self.make_wrapper()), connection)
+        self.assertEqual(wrapper.pool_stats()['size'], 1)
+
+    def test_test_database_destroyed_after_pool_cleared(self):
+        wrapper = self.make_wrapper()
+        connection = self.open(wrapper)
+        wrapper.close()
+        creation = base.DatabaseCreation(wrapper)
+        with mock.patch('django.db.backends.postgresql.creation.DatabaseCreation._destroy_test_db') as destroy:
+            creation._destroy_test_db('test_backend', 0)
+        destroy.assert_called_once_with('test_backend', 0)
+        self.assertTrue(connection.closed)
+        self.assertEqual(wrapper.pool_stats()['size'], 0)
@@ -0,0 +1,69 @@
+import json
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from backend.projections import Projection
+from devices import fragments
+from devices.models import Device
+from devices.serializers import DeviceSerializer
+from devices.tests import authenticate
+
+
+class TestFragments(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.projection = Projection(DeviceSerializer)
+        self.devices = [Device.objects.create(name='Device %i' % i, type='relay', readings={'state': 'OFF'},
+                                              updated_at=timezone.now()) for i in range(3)]
+
+    def render(self) -> tuple:
+        with CaptureQueriesContext(connection) as queries:
+            content = fragments.render(Device.objects.all(), self.projection)
+        return json.loads(content), queries
+
+    def test_same_as_projection(self):
+        content, queries = self.render()
+        self.assertEqual(content, json.loads(json.dumps(self.projection.render(Device.objects.all()))))
+        self.assertEqual(len(queries), 2)
+
+    def test_only_changed_device_rendered(self):
+        self.render()
+        content, queries = self.render()
+        # only the keys are read
+        self.assertEqual(len(queries), 1)
+
+        device = self.devices[1]
+        device.readings = {'state': 'ON'}
+        device.updated_at = timezone.now()
+        device.save(update_fields=['readings', 'updated_at'])
+        content, queries = self.render()
+        self.assertEqual(len(queries), 2)
+        self.assertIn('IN (%i)' % device.pk, queries[1]['sql'])
+        self.assertEqual([item['readings']['state'] for item in content], ['OFF', 'ON', 'OFF'])
+
+    def test_metadata_change_renders_all(self):
+        self.render()
+        self.devices[0].name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.devices[0].save()
+        content, queries = self.render()
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(content[0]['name'], 'Renamed')
+
+
+class TestFragmentsView(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = authenticate(self.client)
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_browsable_api(self):
+        Device.objects.create(name='Device', type='relay')
+        response = self.client.get('/api/v1/devices/details/', HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Device', response.content)
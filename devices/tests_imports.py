@@ -0,0 +1,43 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from devices.device_types import device_type_factories
+from devices.device_types.device_type_factories import load_driver
+from devices.management.commands.import_time_report import parse_importtime
+
+
+class TestDriverRegistry(SimpleTestCase):
+    def test_drivers_registered_by_path(self):
+        for path in [*device_type_factories.FIRMWARES.values(), *device_type_factories.RELAY_DRIVERS.values(),
+                     *device_type_factories.AM2301_DRIVERS.values()]:
+            self.assertEqual(load_driver(path).__name__, path.rsplit('.', 1)[1])
+
+    def test_identify_by_payload(self):
+        self.assertEqual(str(device_type_factories.identify_by_payload({'topic': 'test/STATE'})(
+            {'topic': 'test/STATE'}, {})), 'tasmota')
+        with self.assertRaises(NotImplementedError):
+            device_type_factories.identify_by_payload({})
+
+
+class TestImportTimeReport(SimpleTestCase):
+    def test_parse_importtime(self):
+        output = '\n'.join([
+            'import time: self [us] | cumulative | imported package',
+            'import time:       120 |        120 |     _io',
+            'import time:       300 |        420 |   encodings',
+            'import time:        50 |         50 | gc',
+        ])
+        imports = parse_importtime(output)
+        self.assertEqual([(item['module'], item['level'], item['cumulative_us']) for item in imports],
+                         [('_io', 2, 120), ('encodings', 1, 420), ('gc', 0, 50)])
+
+    def test_sdk_not_imported_at_startup(self):
+        out = StringIO()
+        call_command('import_time_report', '--json', '--top', '3', '--forbid', 'azure', '--forbid', 'uamqp',
+                     stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['forbidden'], [])
+        self.assertEqual(len(report['slowest']), 3)
@@ -0,0 +1,88 @@
+import io
+import logging
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from backend.log_handlers import QueuedRotatingFileHandler, QueuedStreamHandler, RateLimitFilter
+
+
+def make_record(msg: str, *args, level: int = logging.WARNING) -> logging.LogRecord:
+    return logging.LogRecord('django', level, __file__, 0, msg, args, None)
+
+
+class TestRateLimitFilter(SimpleTestCase):
+    def test_repeated_message_suppressed(self):
+        rate_limit = RateLimitFilter(rate=2, period=60)
+        message = 'UpdateReadings - Readings were not updated; %s; Device - %s'
+        passed = [rate_limit.filter(make_record(message, 'error', 'device %i' % i)) for i in range(5)]
+        self.assertEqual(passed, [True, True, False, False, False])
+        # the other messages are not limited
+        self.assertTrue(rate_limit.filter(make_record('Another message')))
+
+    def test_errors_and_exempt_records_not_limited(self):
+        rate_limit = RateLimitFilter(rate=1, period=60)
+        self.assertTrue(all(rate_limit.filter(make_record('Failed %s', i, level=logging.ERROR)) for i in range(3)))
+        records = [make_record('Scheduler tick %s', i, level=logging.INFO) for i in range(3)]
+        for record in records:
+            record.rate_limit = False
+        self.assertTrue(all(rate_limit.filter(record) for record in records))
+
+    def test_suppressed_reported_after_period(self):
+        rate_limit = RateLimitFilter(rate=1, period=60)
+        with mock.patch('backend.log_handlers.time.monotonic', return_value=100):
+            rate_limit.filter(make_record('Repeated %s', 1))
+            self.assertFalse(rate_limit.filter(make_record('Repeated %s', 2)))
+            self.assertFalse(rate_limit.filter(make_record('Repeated %s', 3)))
+        with mock.patch('backend.log_handlers.time.monotonic', return_value=160):
+            record = make_record('Repeated %s', 4)
+            self.assertTrue(rate_limit.filter(record))
+        self.assertEqual(record.getMessage(), 'Repeated 4 (2 similar messages suppressed)')
+
+
+class TestQueuedRotatingFileHandler(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'test.log')
+        self.logger = logging.getLogger('tests.queued')
+        self.logger.propagate = False
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def log(self, handler: QueuedRotatingFileHandler, *messages):
+        self.logger.addHandler(handler)
+        try:
+            for message in messages:
+                self.logger.warning(message)
+        finally:
+            self.logger.removeHandler(handler)
+            handler.close()
+
+    def test_written_by_listener(self):
+        handler = QueuedRotatingFileHandler(self.filename)
+        handler.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
+        self.log(handler, 'first', 'second')
+        with open(self.filename) as file:
+            self.assertEqual(file.read(), 'WARNING: first\nWARNING: second\n')
+
+    def test_file_per_process(self):
+        handler = QueuedRotatingFileHandler(os.path.join(self.directory.name, 'app.{pid}.log'))
+        self.log(handler, 'message')
+        self.assertTrue(os.path.exists(os.path.join(self.directory.name, 'app.%i.log' % os.getpid())))
+
+    def test_stream(self):
+        stream = io.StringIO()
+        handler = QueuedStreamHandler(stream)
+        self.log(handler, 'first')
+        # closing twice doesn't fail
+        handler.close()
+        self.assertEqual(stream.getvalue(), 'first\n')
+
+    def test_rotated_by_size(self):
+        handler = QueuedRotatingFileHandler(self.filename, maxBytes=20, backupCount=2)
+        self.log(handler, *['message %i' % i for i in range(4)])
+        self.assertTrue(os.path.exists(self.filename + '.1'))
+        self.assertLessEqual(os.path.getsize(self.filename), 20)
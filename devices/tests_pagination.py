@@ -0,0 +1,61 @@
+from rest_framework.test import APITestCase
+
+from devices.models import Device, Workspace
+from devices.tests import authenticate
+
+
+class TestKeysetPagination(APITestCase):
+    def setUp(self):
+        self.client = authenticate(self.client)
+        self.workspace = Workspace.objects.create(name='Kitchen')
+        self.devices = [
+            Device.objects.create(name='Device %i' % i, type='relay' if i % 2 else 'sensor', workspace=self.workspace)
+            for i in range(5)
+        ]
+
+    def get_all_pages(self, url: str) -> list:
+        pages = []
+        while url:
+            content = self.client.get(url).json()
+            pages.append(content)
+            url = content['next']
+        return pages
+
+    def test_device_list_without_pagination(self):
+        response = self.client.get('/api/v1/devices/details/')
+        self.assertEqual(len(response.json()), 5)
+
+    def test_device_list_pages(self):
+        pages = self.get_all_pages('/api/v1/devices/details/?limit=2')
+        self.assertEqual([len(page['results']) for page in pages], [2, 2, 1])
+        self.assertEqual([device['pk'] for page in pages for device in page['results']],
+                         [device.pk for device in self.devices])
+        self.assertEqual(set(pages[0]['results'][0]), {'pk', 'name', 'type', 'firmware', 'updated_at',
+                                                       'device_host_id', 'gpio', 'sensor_type', 'workspace'})
+
+    def test_page_stable_after_insert(self):
+        first = self.client.get('/api/v1/devices/details/?limit=2').json()
+        Device.objects.create(name='New', type='relay')
+        second = self.client.get(first['next']).json()
+        self.assertEqual([device['pk'] for device in second['results']], [self.devices[2].pk, self.devices[3].pk])
+
+    def test_fields_projection(self):
+        response = self.client.get('/api/v1/devices/details/?fields=pk,name')
+        self.assertEqual(response.json()[0], {'pk': self.devices[1].pk, 'name': 'Device 1'})
+        response = self.client.get('/api/v1/devices/details/?fields=pk,password')
+        self.assertEqual(response.status_code, 400)
+
+    def test_workspace_list_pages(self):
+        Workspace.objects.create(name='Bathroom')
+        content = self.client.get('/api/v1/devices/workspaces/?limit=1&fields=name').json()
+        self.assertEqual(content['results'], [{'name': 'Kitchen'}])
+        self.assertEqual(self.client.get(content['next']).json()['results'], [{'name': 'Bathroom'}])
+
+    def test_dashboard_pages(self):
+        url = '/api/v1/devices/dashboard/?workspace=%i&limit=3&fields=pk' % self.workspace.pk
+        pages = self.get_all_pages(url)
+        self.assertEqual(len(pages), 2)
+        self.assertEqual(pages[0]['devices'], {'relays': [{'pk': self.devices[1].pk}],
+                                               'sensors': [{'pk': self.devices[0].pk}, {'pk': self.devices[2].pk}]})
+        self.assertEqual(pages[1]['workspaces'], [{'pk': self.workspace.pk, 'name': 'Kitchen'}])
+        self.assertIsNone(pages[1]['next'])
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+
+from backend.profiling import QueryBudgetExceeded, QueryRecorder
+from devices.models import Device
+from devices.tests import authenticate
+
+
+class TestQueryRecorder(TestCase):
+    def test_most_repeated_query(self):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            Device.objects.count()
+            for pk in range(3):
+                Device.objects.filter(pk=pk).first()
+        sql, count = recorder.most_repeated()
+        self.assertEqual(recorder.count, 4)
+        self.assertEqual(count, 3)
+        self.assertIn('WHERE "devices_device"."id" = %s', sql)
+
+
+class TestProfilingMiddleware(APITestCase):
+    def setUp(self):
+        self.client = authenticate(self.client)
+
+    @override_settings(QUERY_BUDGETS={'DeviceList': 0})
+    def test_budget_exceeded_raises(self):
+        with self.settings(PROFILING={'SAMPLE_RATE': 1, 'MODE': 'raise'}), self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/api/v1/devices/details/')
+
+    @override_settings(QUERY_BUDGETS={'DeviceList': 0}, PROFILING={'SAMPLE_RATE': 1, 'MODE': 'log'})
+    def test_budget_exceeded_logged(self):
+        with self.assertLogs('django', 'WARNING') as logs:
+            response = self.client.get('/api/v1/devices/details/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(any('DeviceList executed' in line for line in logs.output))
+
+    @override_settings(PROFILING={'SAMPLE_RATE': 1, 'SLOW_REQUEST_MS': 0, 'MODE': 'log'})
+    def test_slow_request_logged(self):
+        with self.assertLogs('django', 'WARNING') as logs:
+            self.client.get('/api/v1/devices/details/')
+        self.assertIn('"view": "DeviceList"', logs.output[0])
+        self.assertIn('"queries": ', logs.output[0])
+
+    @override_settings(QUERY_BUDGETS={'DeviceList': 0}, PROFILING={'SAMPLE_RATE': 0, 'MODE': 'raise'})
+    def test_not_sampled_request(self):
+        self.assertEqual(self.client.get('/api/v1/devices/details/').status_code, 200)
+
+    def test_runner_profiles_every_request(self):
+        self.assertEqual(settings.PROFILING['SAMPLE_RATE'], 1)
+        self.assertEqual(settings.PROFILING['MODE'], 'raise')
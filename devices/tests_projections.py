@@ -0,0 +1,42 @@
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework import serializers
+
+from backend.projections import Projection
+from devices.models import Device, Workspace
+from devices.serializers import DeviceSerializer, DeviceDetailSerializer, PkNameSerializer, DeviceInfoSerializer
+
+
+class TestProjection(TestCase):
+    def setUp(self):
+        workspace = Workspace.objects.create(name='Kitchen')
+        Device.objects.create(name='Relay', type='relay', device_host_id='r1', gpio=1, workspace=workspace,
+                              readings={'state': 'ON'}, updated_at=timezone.now())
+        Device.objects.create(name='Sensor', type='sensor', sensor_type='am2301', device_host_id='s1',
+                              readings={'temperature': 21.5, 'humidity': 40})
+        Device.objects.create(name='Empty', type='relay')
+
+    def test_same_as_serializer(self):
+        for serializer_class in [DeviceSerializer, DeviceDetailSerializer, PkNameSerializer]:
+            devices = Device.objects.all()
+            self.assertEqual(Projection(serializer_class).render(devices),
+                             serializer_class(devices, many=True).data)
+
+    def test_selected_fields(self):
+        self.assertEqual(Projection(DeviceDetailSerializer, ['pk', 'workspace']).render(Device.objects.all()),
+                         [{'pk': d.pk, 'workspace': d.workspace_id} for d in Device.objects.all()])
+
+    def test_nested_serializer_not_supported(self):
+        with self.assertRaises(ValueError):
+            Projection(DeviceInfoSerializer)
+
+    def test_method_field_not_supported(self):
+        class MethodSerializer(serializers.ModelSerializer):
+            upper_name = serializers.SerializerMethodField()
+
+            class Meta:
+                model = Device
+                fields = ['pk', 'upper_name']
+
+        with self.assertRaises(ValueError):
+            Projection(MethodSerializer)
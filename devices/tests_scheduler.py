@@ -0,0 +1,133 @@
+import asyncio
+import os
+from datetime import datetime as dt
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.utils.datetime_safe import datetime
+
+from devices.models import DeviceEvent
+from devices.scheduler import Job, Scheduler, next_tick, tick_to_datetime
+from devices.scheduler_metrics import SchedulerMetrics, PrometheusExporter, prometheus_client
+from devices.tasks import is_event_time
+from devices.tests_tasks import create_device, mock_time_return
+
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@patch('devices.scheduler.close_old_connections')
+class TestScheduler(TestCase):
+    def setUp(self):
+        # 2021-01-01 18:29:30 UTC
+        self.clock = Clock(1609525770.0)
+        self.runs = []
+        self.registry = prometheus_client.CollectorRegistry() if prometheus_client else None
+        self.metrics = SchedulerMetrics(PrometheusExporter(self.registry) if prometheus_client else None)
+
+    def job(self, name: str, interval: int, catch_up=False):
+        return Job(name, lambda planned, stats: self.runs.append((name, planned)), interval, catch_up)
+
+    def test_next_tick(self, mock_close):
+        self.assertEqual(next_tick(1609525770.0, 60), 1609525800.0)
+        self.assertEqual(next_tick(1609525800.0, 60), 1609525860.0)
+        self.assertEqual(next_tick(1609525770.0, 3600), 1609527600.0)
+
+    def test_run_pending_aligned_to_wall_clock(self, mock_close):
+        scheduler = Scheduler([self.job('minute', 60), self.job('hour', 3600)], clock=self.clock)
+        self.assertEqual(scheduler.run_pending(), [])
+        self.clock.now = 1609525800.5
+        self.assertEqual(scheduler.run_pending(), [('minute', 1609525800.0)])
+        self.assertEqual(self.runs[0][1], tick_to_datetime(1609525800.0))
+        self.assertEqual(scheduler.next_run(), 1609525860.0)
+
+    def test_catch_up_missed_ticks(self, mock_close):
+        scheduler = Scheduler([self.job('minute', 60, catch_up=True), self.job('five', 300)], clock=self.clock,
+                              max_catch_up=3)
+        # the process was blocked for ten minutes
+        self.clock.now = 1609526400.0
+        executed = scheduler.run_pending()
+        self.assertEqual([name for name, tick in executed], ['minute', 'minute', 'minute', 'five'])
+        self.assertEqual([tick for name, tick in executed], [1609526280.0, 1609526340.0, 1609526400.0,
+                                                             1609526400.0])
+        self.assertEqual(scheduler.next_run(), 1609526460.0)
+
+    def test_failed_job_doesnt_stop_scheduler(self, mock_close):
+        def fail(planned, stats):
+            raise ValueError('Failed')
+        scheduler = Scheduler([Job('fail', fail, 60), self.job('minute', 60)], clock=self.clock,
+                              metrics=self.metrics)
+        self.clock.now = 1609525800.0
+        self.assertEqual(len(scheduler.run_pending()), 2)
+        self.assertEqual(len(self.runs), 1)
+        # the job error isn't counted as the failed command
+        self.assertEqual(self.metrics.snapshot()['fail']['errors'], 1)
+        self.assertEqual(self.metrics.snapshot()['fail']['failed'], 0)
+
+    def test_duplicated_job(self, mock_close):
+        with self.assertRaises(ValueError):
+            Scheduler([self.job('minute', 60), self.job('minute', 300)], clock=self.clock)
+
+    def test_run_until_stopped(self, mock_close):
+        stopped = []
+
+        def tick(planned, stats):
+            self.runs.append(planned)
+            # the job takes the whole minute so the next tick is due without waiting
+            self.clock.now += 60
+            if len(self.runs) == 3:
+                stopped[0]()
+
+        scheduler = Scheduler([Job('minute', tick, 60)], clock=self.clock)
+        self.clock.now = 1609525800.0
+
+        async def run():
+            stop = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            # the job runs in the worker thread
+            stopped.append(lambda: loop.call_soon_threadsafe(stop.set))
+            await asyncio.wait_for(scheduler.run(stop), 5)
+
+        asyncio.run(run())
+        self.assertEqual(self.runs, [tick_to_datetime(tick) for tick in (1609525800.0, 1609525860.0, 1609525920.0)])
+
+    @patch.object(datetime, 'now')
+    def test_is_event_time_with_planned_tick(self, mock_time_now, mock_close):
+        mock_time_now.return_value = mock_time_return(18, 29)
+        event = create_device(None)
+        task = DeviceEvent.objects.create(name='Event', device=event, type='time',
+                                          action='ON', time=mock_time_return(18, 30))
+        # the scheduler ticks exactly so the one minute margin isn't needed
+        self.assertFalse(is_event_time(task.time, dt(2021, 1, 1, 18, 29)))
+        self.assertTrue(is_event_time(task.time, dt(2021, 1, 1, 18, 30)))
+
+    @patch('azure.iot.hub.IoTHubRegistryManager.send_c2d_message', return_value='')
+    @patch.dict(os.environ, {'CONNECTION_STRING': 'HostName=test;SharedAccessKeyName=test;SharedAccessKey=test'})
+    def test_tick_metrics(self, mock_send_message, mock_close):
+        for i in range(0, 3):
+            device = create_device({'state': 'off'})
+            DeviceEvent.objects.create(name='Event', device=device, type='time', action='ON', time='18:3%i' % i)
+        with patch('time.time', return_value=1609525802.5):
+            scheduler = Scheduler(clock=self.clock, metrics=self.metrics)
+            # the tick at 18:30 UTC, the local time zone is the same in January
+            self.clock.now = 1609525802.5
+            scheduler.run_pending()
+
+        tick = self.metrics.snapshot()['time_events']
+        self.assertEqual(tick['ticks'], 1)
+        self.assertEqual(tick['last']['lateness'], 2.5)
+        self.assertEqual(tick['last']['evaluated'], 3)
+        self.assertEqual(tick['last']['fired'], 1)
+        self.assertEqual(tick['last']['failed'], 0)
+        self.assertEqual(tick['last']['errors'], 0)
+        self.assertIsNotNone(tick['last']['duration'])
+        if prometheus_client:
+            self.assertEqual(self.registry.get_sample_value('scheduler_events_fired_total',
+                                                            {'job': 'time_events'}), 1)
+            self.assertEqual(self.registry.get_sample_value('scheduler_tick_lateness_seconds_count',
+                                                            {'job': 'time_events'}), 1)
@@ -0,0 +1,115 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase
+from rest_framework.test import APITestCase
+
+from devices.models import Device, Workspace
+from devices.search import NameIndex, VERSION_KEY, rank, search, PREFIX, WORD, SUBSTRING
+from devices.tests import authenticate
+
+
+class TestSearchIndex(TestCase):
+    def setUp(self):
+        # the new version rebuilds the indexes
+        cache.clear()
+        for name in ['Kitchen heater', 'Heater', 'Bathroom heater', 'Theater light', 'Sensor']:
+            Device.objects.create(name=name, type='relay')
+
+    def test_rank(self):
+        self.assertEqual(rank('heater', 'he'), PREFIX)
+        self.assertEqual(rank('kitchen heater', 'he'), WORD)
+        self.assertEqual(rank('kitchen_heater', 'he'), WORD)
+        self.assertEqual(rank('theater', 'he'), SUBSTRING)
+        self.assertIsNone(rank('sensor', 'he'))
+
+    def test_ranked_search(self):
+        names = [device['name'] for device in search('device', 'heat', 10)]
+        self.assertEqual(names, ['Heater', 'Bathroom heater', 'Kitchen heater', 'Theater light'])
+
+    def test_search_limit(self):
+        self.assertEqual(len(search('device', 'heat', 2)), 2)
+
+    def test_index_updated(self):
+        self.assertEqual(len(search('device', 'heat', 10)), 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            device = Device.objects.create(name='Hall heater', type='relay')
+        self.assertEqual(len(search('device', 'heat', 10)), 5)
+        device.name = 'Hall light'
+        with self.captureOnCommitCallbacks(execute=True):
+            device.save()
+        self.assertEqual([d['name'] for d in search('device', 'light', 10)], ['Hall light', 'Theater light'])
+        with self.captureOnCommitCallbacks(execute=True):
+            device.delete()
+        self.assertEqual(len(search('device', 'light', 10)), 1)
+
+    def test_index_updated_incrementally(self):
+        search('device', 'heat', 10)
+        search('workspace', 'kit', 10)
+        with patch.object(NameIndex, 'build') as build:
+            with self.captureOnCommitCallbacks(execute=True):
+                device = Device.objects.create(name='Hall heater', type='relay')
+            self.assertEqual(len(search('device', 'heat', 10)), 5)
+            with self.captureOnCommitCallbacks(execute=True):
+                Workspace.objects.create(name='Kitchen')
+            self.assertEqual([w['name'] for w in search('workspace', 'kit', 10)], ['Kitchen'])
+            with self.captureOnCommitCallbacks(execute=True):
+                device.delete()
+            self.assertEqual(len(search('device', 'heat', 10)), 4)
+        build.assert_not_called()
+
+    def test_index_rebuilt_after_change_of_other_process(self):
+        search('device', 'heat', 10)
+        # the other process renamed a device between the changes of this process
+        Device.objects.filter(name='Heater').update(name='Boiler')
+        cache.incr(VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            Device.objects.create(name='Hall heater', type='relay')
+        names = [device['name'] for device in search('device', 'heat', 10)]
+        self.assertEqual(names, ['Bathroom heater', 'Hall heater', 'Kitchen heater', 'Theater light'])
+
+    def test_rolled_back_name_not_indexed(self):
+        search('device', 'heat', 10)
+        with patch.object(NameIndex, 'build') as build, self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Device.objects.create(name='Hall heater', type='relay')
+                    raise ValueError()
+            except ValueError:
+                pass
+            self.assertEqual(len(search('device', 'heat', 10)), 4)
+        build.assert_not_called()
+
+    def test_search_workspaces(self):
+        Workspace.objects.create(name='Kitchen')
+        self.assertEqual([w['name'] for w in search('workspace', 'kit', 10)], ['Kitchen'])
+
+    def test_database_search(self):
+        with self.settings(SEARCH_INDEX_ENABLED=False):
+            names = [device['name'] for device in search('device', 'heat', 10)]
+        self.assertEqual(sorted(names), ['Bathroom heater', 'Heater', 'Kitchen heater', 'Theater light'])
+
+
+class TestSearchView(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = authenticate(self.client)
+
+    def test_search_with_limit(self):
+        for i in range(1, 6):
+            Device.objects.create(name='Relay %i' % i, type='relay')
+        response = self.client.get('/api/v1/devices/search/?name=rel&limit=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([device['name'] for device in response.json()], ['Relay 1', 'Relay 2'])
+
+    def test_search_limit_below_one(self):
+        Device.objects.create(name='Relay', type='relay')
+        for limit in ['0', '-1']:
+            response = self.client.get('/api/v1/devices/search/?name=rel&limit=%s' % limit)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'error': 'The limit must be at least 1'})
+
+    def test_search_wrong_scope(self):
+        response = self.client.get('/api/v1/devices/search/?name=rel&scope=user')
+        self.assertEqual(response.status_code, 400)
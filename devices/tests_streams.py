@@ -0,0 +1,236 @@
+import asyncio
+import base64
+import json
+import threading
+import time
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TransactionTestCase
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from devices.long_poll import parse_wait
+from devices.models import Device
+from devices.pubsub import hub, ReadingsHub
+from devices.streams import issue_ticket, readings_stream, redeem_ticket, router, STREAM_PATH, USER_CHECK
+from devices.tests import authenticate
+
+
+def message(pk: int, workspace: int or None = None) -> dict:
+    return {'pk': pk, 'workspace': workspace, 'readings': {'state': 'ON'}, 'updated_at': None}
+
+
+class TestReadingsHub(SimpleTestCase):
+    def test_publish_to_matching_subscribers(self):
+        readings_hub = ReadingsHub()
+
+        async def run():
+            everything = readings_hub.subscribe()
+            workspace = readings_hub.subscribe(workspaces={1})
+            device = readings_hub.subscribe(devices={2})
+            # publish from the other thread like the request thread does
+            publisher = threading.Thread(target=lambda: [readings_hub.publish(message(2)),
+                                                         readings_hub.publish(message(3, 1))])
+            publisher.start()
+            publisher.join()
+            received = [(await everything.get(1))[0]['pk'], (await everything.get(1))[0]['pk'],
+                        (await workspace.get(1))[0]['pk'], (await device.get(1))[0]['pk']]
+            self.assertIsNone(await device.get(0.01))
+            for subscription in [everything, workspace, device]:
+                subscription.close()
+            return received
+
+        self.assertEqual(asyncio.run(run()), [2, 3, 3, 2])
+        self.assertEqual(len(readings_hub), 0)
+
+
+class TestReadingsStream(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='email@email.com', username='username', password='password')
+
+    def access_token(self) -> str:
+        token = AccessToken()
+        token['user_id'] = self.user.pk
+        return str(token)
+
+    @staticmethod
+    def stream(query: str, publish: list, token: str or None = None, after_publish=None) -> list:
+        sent = []
+
+        async def run():
+            disconnected = asyncio.Event()
+
+            async def receive():
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(event):
+                sent.append(event)
+                # the stream is closed by the server or the client disconnects after the first event
+                closed = not event.get('more_body', True)
+                if closed or (after_publish is None and event.get('body', b'').startswith(b'event:')):
+                    disconnected.set()
+
+            headers = [(b'authorization', b'Bearer ' + token.encode())] if token else []
+            scope = {'type': 'http', 'path': STREAM_PATH, 'query_string': query.encode(), 'headers': headers}
+            stream = asyncio.ensure_future(router(None)(scope, receive, send))
+            await asyncio.sleep(0.05)
+            if after_publish is not None:
+                await sync_to_async(after_publish)()
+            for item in publish:
+                hub.publish(item)
+            await asyncio.wait_for(stream, 2)
+
+        asyncio.run(run())
+        return sent
+
+    def test_stream_reading(self):
+        sent = self.stream('devices=5', [message(4), message(5, 1)], token=self.access_token())
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), sent[0]['headers'])
+        self.assertEqual(sent[1]['body'], b'event: reading\nid: %d\ndata: %s\n\n' % (5, json.dumps(message(5, 1)).encode()))
+        self.assertEqual(len(hub), 0)
+
+    def test_stream_without_token(self):
+        sent = self.stream('devices=5', [])
+        self.assertEqual(sent[0]['status'], 401)
+
+    def test_stream_token_in_query_not_accepted(self):
+        sent = self.stream('token=%s&devices=5' % self.access_token(), [])
+        self.assertEqual(sent[0]['status'], 401)
+
+    def test_stream_inactive_user(self):
+        self.user.is_active = False
+        self.user.save()
+        sent = self.stream('devices=5', [], token=self.access_token())
+        self.assertEqual(sent[0]['status'], 401)
+
+    def test_stream_wrong_ids(self):
+        sent = self.stream('workspace=test', [], token=self.access_token())
+        self.assertEqual(sent[0]['status'], 400)
+
+    def test_stream_ticket_single_use(self):
+        ticket = issue_ticket(self.user.pk, None)
+        sent = self.stream('ticket=%s&devices=5' % ticket, [message(5)])
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertTrue(sent[1]['body'].startswith(b'event: reading'))
+        self.assertEqual(self.stream('ticket=%s&devices=5' % ticket, [])[0]['status'], 401)
+        self.assertEqual(self.stream('ticket=wrong&devices=5', [])[0]['status'], 401)
+
+    def test_stream_closed_when_token_expires(self):
+        token = AccessToken(self.access_token())
+        with patch('devices.streams.time') as clock:
+            clock.time.return_value = token['exp'] - 60
+
+            def expire():
+                clock.time.return_value = token['exp']
+
+            sent = self.stream('devices=5', [message(5)], token=str(token), after_publish=expire)
+        self.assertTrue(sent[1]['body'].startswith(b'event: reading'))
+        self.assertEqual(sent[2]['body'], b'event: close\ndata: {"error": "Token is invalid or expired"}\n\n')
+        self.assertFalse(sent[2]['more_body'])
+        self.assertEqual(len(hub), 0)
+
+    def test_stream_closed_when_user_deactivated(self):
+        with patch('devices.streams.time') as clock:
+            clock.time.return_value = time.time()
+
+            def deactivate():
+                User.objects.filter(pk=self.user.pk).update(is_active=False)
+                clock.time.return_value += USER_CHECK
+
+            sent = self.stream('devices=5', [message(5)], token=self.access_token(), after_publish=deactivate)
+        self.assertTrue(sent[1]['body'].startswith(b'event: reading'))
+        self.assertEqual(sent[2]['body'], b'event: close\ndata: {"error": "User is inactive"}\n\n')
+
+    def test_issue_ticket(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.access_token())
+        response = client.post('/api/v1/devices/stream/ticket/')
+        self.assertEqual(response.status_code, 201)
+        credentials = redeem_ticket(response.json()['ticket'])
+        self.assertEqual(credentials['user_id'], self.user.pk)
+        self.assertIsNotNone(credentials['expires'])
+        self.assertIsNone(redeem_ticket(response.json()['ticket']))
+        self.assertEqual(APIClient().post('/api/v1/devices/stream/ticket/').status_code, 401)
+
+
+class TestPublishReadings(APITestCase):
+    def setUp(self):
+        self.client = authenticate(self.client)
+
+    @patch.object(hub, 'publish')
+    def test_update_readings_publish_change(self, mock_publish):
+        device = Device.objects.create(name='Test', device_host_id='t1', type='relay', gpio=2)
+        data = [{
+            'data': {
+                'body': base64.urlsafe_b64encode(json.dumps({'POWER2': 'ON'}).encode()).decode(),
+                'properties': {'topic': 't1/RESULT'},
+            }
+        }]
+        self.client.post('/api/v1/devices/eventhub/', json.dumps(data), content_type='application/json')
+        mock_publish.assert_called_once()
+        published = mock_publish.call_args[0][0]
+        self.assertEqual(published['pk'], device.pk)
+        self.assertEqual(published['readings'], {'state': 'ON'})
+        self.assertIsNotNone(published['updated_at'])
+
+
+class TestReadingsLongPoll(APITestCase):
+    def setUp(self):
+        self.client = authenticate(self.client)
+        self.device = Device.objects.create(name='Test', type='relay', readings={'state': 'OFF'},
+                                            updated_at='2021-08-24T10:00:00+00:00')
+
+    def get(self, since: str, wait: float):
+        return self.client.get('/api/v1/devices/readings/%i/' % self.device.pk, {'since': since, 'wait': wait})
+
+    def test_newer_readings_returned_immediately(self):
+        response = self.get('2021-08-24T09:00:00+00:00', 5)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['readings'], {'state': 'OFF'})
+
+    def test_wait_for_change(self):
+        change = {'pk': self.device.pk, 'workspace': None, 'readings': {'state': 'ON'},
+                  'updated_at': '2021-08-24T10:01:00Z'}
+        publisher = threading.Timer(0.2, hub.publish, [change])
+        publisher.start()
+        response = self.get('2021-08-24T10:00:00+00:00', 5)
+        publisher.join()
+        self.assertEqual(response.json(), {'readings': {'state': 'ON'}, 'updated_at': '2021-08-24T10:01:00Z'})
+        self.assertEqual(len(hub), 0)
+
+    def test_timeout_returns_current_readings(self):
+        response = self.get('2021-08-24T10:00:00+00:00', 0.1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['readings'], {'state': 'OFF'})
+
+    def test_wrong_since(self):
+        self.assertEqual(self.get('yesterday', 1).status_code, 400)
+
+    def test_wrong_wait(self):
+        for wait in ['nan', 'inf', '-inf', 'soon']:
+            self.assertEqual(self.get('2021-08-24T10:00:00+00:00', wait).status_code, 400)
+
+    def test_negative_wait_returns_immediately(self):
+        response = self.get('2021-08-24T10:00:00+00:00', -5)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['readings'], {'state': 'OFF'})
+
+    def test_parse_wait_clamped(self):
+        with self.settings(READINGS_LONG_POLL_MAX_WAIT=30):
+            self.assertEqual(parse_wait('-1'), 0)
+            self.assertEqual(parse_wait('1e9'), 30)
+            self.assertEqual(parse_wait('2.5'), 2.5)
+
+    def test_not_authenticated(self):
+        self.client.credentials()
+        self.assertEqual(self.get('2021-08-24T10:00:00+00:00', 1).status_code, 401)
+
+    def test_not_found(self):
+        response = self.client.get('/api/v1/devices/readings/0/', {'since': '2021-08-24T10:00:00+00:00'})
+        self.assertEqual(response.status_code, 404)
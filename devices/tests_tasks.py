@@ -3,6 +3,7 @@ from unittest.mock import patch
 from django.test import TestCase
 from django.utils.datetime_safe import datetime
 from devices.models import Device, DeviceLog, DeviceEvent
+from devices.command_planner import is_state_change, relay_state
 from devices.tasks import sensor_periodic_tasks, time_relay_task, is_event_time, \
     is_eligible_to_fire_task_based_on_readings, get_sensor_reading_type, sensor_rule_task, sensor_relay_task
 
@@ -77,6 +78,17 @@ class TestTask(TestCase):
                                            action='ON', time='18:30')
         self.assertFalse(is_eligible_to_fire_task_based_on_readings(event))
 
+    def test_is_state_change(self):
+        self.assertTrue(is_state_change(create_device(None), 'ON'))
+        self.assertTrue(is_state_change(create_device({'state': 'OFF'}), 'on'))
+        self.assertFalse(is_state_change(create_device({'state': 'on'}), 'ON'))
+        self.assertFalse(is_state_change(create_device({'test': 'test'}), 'ON'))
+
+    def test_relay_state(self):
+        self.assertEqual(relay_state(create_device({'state': 'ON'})), 'on')
+        self.assertIsNone(relay_state(create_device(None)))
+        self.assertIsNone(relay_state(Device(name='Test', device_host_id='t1', type='relay', readings='test_faulty')))
+
     def test_get_sensor_reading(self):
         sensor = create_device({
             'temperature': 22.8,
@@ -104,6 +116,18 @@ class TestTask(TestCase):
         self.assertTrue(sensor_rule_task('<', 25.3, 26.1))
         self.assertFalse(sensor_rule_task('<', 22.3, 21.1))
 
+    def test_sensor_rule_task_with_hysteresis(self):
+        # the relay is switched when the reading passes the far edge of the band
+        self.assertFalse(sensor_rule_task('>', 21.4, 21, 0.5))
+        self.assertTrue(sensor_rule_task('>', 21.6, 21, 0.5))
+        self.assertFalse(sensor_rule_task('<', 20.6, 21, 0.5))
+        self.assertTrue(sensor_rule_task('<', 20.4, 21, 0.5))
+        # and kept till the reading passes the near edge
+        self.assertTrue(sensor_rule_task('>', 20.6, 21, 0.5, active=True))
+        self.assertFalse(sensor_rule_task('>', 20.4, 21, 0.5, active=True))
+        self.assertTrue(sensor_rule_task('<', 21.4, 21, 0.5, active=True))
+        self.assertFalse(sensor_rule_task('<', 21.6, 21, 0.5, active=True))
+
     def test_sensor_rule_task_wrong_rule(self):
         self.assertFalse(sensor_rule_task('test', 22, 21))
 
@@ -167,8 +191,9 @@ class TestFireTasks(TestCase):
                                    sensor=sensor, action='OFF', value=21)
         DeviceEvent.objects.create(name='Event', device=relay, type='sensor', reading_type='temperature', rule='<',
                                    sensor=sensor, action='OFF', value=23)
+        # both events target the same relay so they are merged into one command
         fired_tasks = sensor_relay_task()
-        self.assertEqual(len(fired_tasks), 2)
+        self.assertEqual(fired_tasks, ['OFF'])
 
     def test_sensor_task_with_no_relay_readings(self, mock1, mock2):
         relay = create_device(None)
@@ -191,3 +216,54 @@ class TestFireTasks(TestCase):
                                    sensor=sensor, action='ON', value=21)
         fired_tasks = sensor_relay_task()
         self.assertEqual(len(fired_tasks), 0)
+
+    @patch.object(datetime, 'now')
+    def test_time_relay_task_merge_actions(self, mock_time_now, mock_connection_key, mock_send_message):
+        mock_time_now.return_value = mock_time_return(18, 30)
+        device = create_device({'state': 'on'})
+        device2 = create_device({'state': 'off'})
+        for action in ['ON', 'OFF', 'ON']:
+            DeviceEvent.objects.create(name='Event', device=device, type='time', action=action, time='18:30')
+            DeviceEvent.objects.create(name='Event', device=device2, type='time', action='ON', time='18:30')
+        # OFF wins for the first device, the second one gets one command only
+        self.assertEqual(sorted(time_relay_task()), ['OFF', 'ON'])
+        self.assertEqual(mock_send_message.call_count, 2)
+
+    def test_sensor_task_within_hysteresis(self, mock_connection_key, mock_send_message):
+        relay = create_device({'state': 'on'})
+        sensor = create_device({'temperature': 21.2}, 'sensor')
+        DeviceEvent.objects.create(name='Event', device=relay, type='sensor', reading_type='temperature', rule='>',
+                                   sensor=sensor, action='OFF', value=21, hysteresis=0.5)
+        self.assertEqual(len(sensor_relay_task()), 0)
+        mock_send_message.assert_not_called()
+
+    def test_sensor_task_hysteresis_band(self, mock_connection_key, mock_send_message):
+        relay = create_device({'state': 'on'})
+        sensor = create_device({'temperature': 20.8}, 'sensor')
+        # the heater is switched off above 21.5 and on below 20.5
+        DeviceEvent.objects.create(name='Event', device=relay, type='sensor', reading_type='temperature', rule='>',
+                                   sensor=sensor, action='OFF', value=21, hysteresis=0.5)
+        DeviceEvent.objects.create(name='Event', device=relay, type='sensor', reading_type='temperature', rule='<',
+                                   sensor=sensor, action='ON', value=21, hysteresis=0.5)
+        fired = []
+        for temperature in [20.8, 21.4, 21.6, 21.4, 20.6, 20.4, 20.8]:
+            sensor.readings = {'temperature': temperature}
+            sensor.save()
+            states = sensor_relay_task()
+            fired.append(states)
+            if states:
+                relay.readings = {'state': states[0]}
+                relay.save()
+        self.assertEqual(fired, [[], [], ['OFF'], [], [], ['ON'], []])
+
+    def test_sensor_task_suppressed_by_dwell_time(self, mock_connection_key, mock_send_message):
+        relay = create_device({'state': 'on'})
+        sensor = create_device({'temperature': 22.6}, 'sensor')
+        DeviceEvent.objects.create(name='Event', device=relay, type='sensor', reading_type='temperature', rule='>',
+                                   sensor=sensor, action='OFF', value=21)
+        # the relay has been switched on a moment ago
+        DeviceLog.objects.create(device=relay, readings={'state': 'ON'})
+        with self.settings(RELAY_MIN_DWELL_TIME={'ON': 300, 'OFF': 300}):
+            self.assertEqual(len(sensor_relay_task()), 0)
+        with self.settings(RELAY_MIN_DWELL_TIME={'ON': 0, 'OFF': 300}):
+            self.assertEqual(sensor_relay_task(), ['OFF'])
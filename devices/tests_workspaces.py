@@ -1,13 +1,16 @@
 import json
 
+from django.core.cache import cache
 from rest_framework.test import APITestCase
 
 from devices.models import Workspace, Device
 from devices.tests import authenticate
+from devices.views_workspaces import attach_device_list_to_workspace
 
 
 class TestsWorkspaces(APITestCase):
     def setUp(self):
+        cache.clear()
         self.client = authenticate(self.client)
 
     def test_dashboard_with_no_workspaces(self):
@@ -138,6 +141,36 @@ class TestsWorkspaces(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(Device.objects.filter(workspace__pk=workspace.pk)), 0)
 
+    def test_update_workspace_devices_in_constant_queries(self):
+        workspace = Workspace.objects.create(name='Workspace')
+        attached = [Device.objects.create(name='Old', workspace=workspace) for _ in range(5)]
+        devices = [Device.objects.create(name='New').pk for _ in range(20)]
+        self.assertIsNone(attach_device_list_to_workspace(devices[:2], workspace))
+        # the savepoint, the two updates and the release
+        with self.assertNumQueries(4):
+            self.assertIsNone(attach_device_list_to_workspace(devices, workspace))
+        self.assertEqual(set(Device.objects.filter(workspace=workspace).values_list('pk', flat=True)), set(devices))
+        self.assertFalse(Device.objects.filter(pk__in=[device.pk for device in attached], workspace__isnull=False))
+
+    def test_update_workspace_with_device_not_existing_keeps_devices(self):
+        workspace = Workspace.objects.create(name='Workspace')
+        device = Device.objects.create(name='Test', workspace=workspace)
+        response = self.client.put('/api/v1/devices/workspace/single/%i/' % workspace.pk, json.dumps({
+            'name': 'Test',
+            'devices': [99]
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Device.objects.get(pk=device.pk).workspace, workspace)
+
+    def test_attach_with_device_not_existing_rolled_back(self):
+        workspace = Workspace.objects.create(name='Workspace')
+        attached = Device.objects.create(name='Old', workspace=workspace)
+        device = Device.objects.create(name='New')
+        result = attach_device_list_to_workspace([device.pk, 99], workspace)
+        self.assertEqual(result, {'error': 'The device doesn\'t exist'})
+        self.assertIsNone(Device.objects.get(pk=device.pk).workspace)
+        self.assertEqual(Device.objects.get(pk=attached.pk).workspace, workspace)
+
     def test_update_workspace_with_empty_name(self):
         workspace = Workspace(name='Test workspace')
         workspace.save()
@@ -220,3 +253,35 @@ class TestsWorkspaces(APITestCase):
         Workspace.objects.get(pk=w.pk).delete()
         d = Device.objects.get(pk=d.pk)
         self.assertEqual(d.workspace, None)
+
+    def test_workspaces_summary(self):
+        kitchen = Workspace.objects.create(name='Kitchen')
+        bathroom = Workspace.objects.create(name='Bathroom')
+        Device.objects.create(name='Relay 1', type='relay', workspace=kitchen, readings={'state': 'ON'})
+        Device.objects.create(name='Relay 2', type='relay', workspace=kitchen, readings={'state': 'OFF'})
+        Device.objects.create(name='Sensor 1', type='sensor', workspace=kitchen, readings={'temperature': 20})
+        Device.objects.create(name='Sensor 2', type='sensor', workspace=kitchen, readings={'temperature': 23.5})
+        Device.objects.create(name='Sensor 3', type='sensor', workspace=kitchen)
+        # the user and the summary
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/v1/devices/workspaces/summary/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [
+            {'pk': bathroom.pk, 'name': 'Bathroom', 'relays': 0, 'sensors': 0, 'relays_on': 0, 'temperature_min': None,
+             'temperature_max': None, 'temperature_avg': None},
+            {'pk': kitchen.pk, 'name': 'Kitchen', 'relays': 2, 'sensors': 3, 'relays_on': 1,
+             'temperature_min': 20.0, 'temperature_max': 23.5, 'temperature_avg': 21.75},
+        ])
+
+    def test_workspaces_summary_cached_till_readings_changed(self):
+        kitchen = Workspace.objects.create(name='Kitchen')
+        relay = Device.objects.create(name='Relay', type='relay', workspace=kitchen, readings={'state': 'OFF'})
+        self.client.get('/api/v1/devices/workspaces/summary/')
+        # the user and the summary are cached
+        with self.assertNumQueries(0):
+            self.client.get('/api/v1/devices/workspaces/summary/')
+        relay.readings = {'state': 'ON'}
+        with self.captureOnCommitCallbacks(execute=True):
+            relay.save(update_fields=['readings', 'updated_at'])
+        response = self.client.get('/api/v1/devices/workspaces/summary/')
+        self.assertEqual(response.json()[0]['relays_on'], 1)
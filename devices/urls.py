@@ -1,4 +1,5 @@
 from django.urls import path
+from devices import long_poll
 from devices import views
 from devices import views_events
 from devices import views_workspaces
@@ -8,6 +9,7 @@ urlpatterns = [
     path('details/', views.DeviceList.as_view()),
     path('dashboard/', views.DashboardView.as_view()),
     path('workspaces/', views_workspaces.WorkspaceList.as_view()),
+    path('workspaces/summary/', views_workspaces.WorkspaceSummary.as_view()),
     path('workspace/<int:pk>/', views_workspaces.WorkspaceDetail.as_view()),
     path('workspace/single/<int:workspace_id>/', views_workspaces.WorkspaceSingle.as_view()),
     path('eventhub/', views.UpdateReadings.as_view()),
@@ -15,8 +17,11 @@ urlpatterns = [
     path('single/<int:device_id>/', views.DeviceSingle.as_view()),
     path('event/<int:pk>/', views_events.DeviceEventDetail.as_view()),
     path('event/', views_events.DeviceEventCreate.as_view()),
+    path('event/backtest/', views_events.EventBacktest.as_view()),
     path('events/<int:device_id>/', views_events.EventsDeviceList.as_view()),
     path('log/<int:device_id>/', views.DeviceLogByDate.as_view()),
     path('search/', views.DeviceSearch.as_view()),
-    path('readings/<int:device_id>/', views.DeviceReadings.as_view()),
+    path('stream/ticket/', views.StreamTicket.as_view()),
+    path('readings/', views.DeviceReadingsBulk.as_view()),
+    path('readings/<int:device_id>/', long_poll.device_readings),
 ]
@@ -3,83 +3,148 @@ from datetime import datetime
 import json
 from urllib.request import Request
 
-from rest_framework.exceptions import MethodNotAllowed, ValidationError
+from rest_framework.exceptions import MethodNotAllowed, NotFound, ValidationError
+from rest_framework.fields import DateTimeField
 from rest_framework.generics import get_object_or_404
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
 from rest_framework.response import Response
 from rest_framework import mixins, generics, status
 from rest_framework.views import APIView
 import base64
 
+from backend.pagination import KeysetPagination, list_response, request_projection
+from backend.projections import Projection
+from devices import dashboard_cache, fragments, search, streams
 from devices.device_types.device_type_factories import RelayFactory, identify_by_payload
 from devices.device_types.exceptions import FirmwareFactoryException, DeviceException
+from devices.fragments import PreRenderedJSONRenderer
 
 from devices.models import Device, Workspace, DeviceLog
+from devices.pubsub import hub, reading_message
 from devices.serializers import DeviceSerializer, PkNameSerializer, DeviceInfoSerializer, DeviceLogSerializer, \
     DeviceReadingSerializer, DeviceDetailSerializer
 from django.utils import timezone
+from django.utils.http import http_date, parse_http_date_safe
 import logging
 
 logger = logging.getLogger('django')
 
+# the read-only list endpoints render the values without the serializers
+pk_name_projection = Projection(PkNameSerializer)
+
 
 class DashboardView(APIView):
+    renderer_classes = [PreRenderedJSONRenderer, BrowsableAPIRenderer]
+
     def get(self, request):
+        """
+        Get the dashboard of the workspace, the payload is cached till the readings or metadata changed.
+        The unchanged dashboard returns 304 when the client sends ETag or last modified date.
+        The devices are paginated by ?limit= and ?cursor=, and limited to ?fields=.
+        :param request:
+        :return: Response
+        """
         workspace_id = request.query_params.get('workspace')
-        if workspace_id:
-            try:
-                workspace = Workspace.objects.get(pk=workspace_id)
-            except ValueError:
-                # get unassigned devices
-                workspace = False
+        scope = dashboard_cache.resolve_scope(workspace_id)
+        # the missing workspace is 404 even for the conditional request
+        if scope != dashboard_cache.ALL_SCOPE and not dashboard_cache.workspace_exists(scope):
+            raise NotFound()
+        variant = [request.query_params.get(param, '') for param in ('fields', 'limit', 'cursor')]
+        etag, last_modified = dashboard_cache.validators(scope, *variant)
+        headers = {
+            'ETag': etag,
+            'Cache-Control': 'private, no-cache',
+        }
+        if last_modified is not None:
+            headers['Last-Modified'] = http_date(last_modified)
+        if self.is_not_modified(request, etag, last_modified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
-        else:
-            workspace = Workspace.objects.order_by('name').first()
+        content = dashboard_cache.get_payload(etag)
+        if content is None:
+            content = self.get_content(scope, request)
+            dashboard_cache.set_payload(etag, content)
+        return Response(content, headers=headers)
 
-        if workspace:
-            relays = Device.objects.filter(workspace__pk=workspace.pk).filter(type='relay')
-            sensors = Device.objects.filter(workspace__pk=workspace.pk).filter(type='sensor')
+    @staticmethod
+    def is_not_modified(request, etag: str, last_modified: int or None) -> bool:
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            return if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+        if last_modified is None:
+            return False
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE'))
+        return if_modified_since is not None and last_modified <= if_modified_since
+
+    def get_content(self, scope, request) -> dict or bytes:
+        if scope != dashboard_cache.ALL_SCOPE:
+            workspace = get_object_or_404(Workspace, pk=scope)
+            devices = Device.objects.filter(workspace__pk=workspace.pk)
         else:
-            relays = Device.objects.filter(type='relay')
-            sensors = Device.objects.filter(type='sensor')
+            devices = Device.objects.all()
 
-        workspaces = Workspace.objects.all()
-        w_serializer = PkNameSerializer(workspaces, many=True)
-        r_serializer = DeviceSerializer(relays, many=True)
-        s_serializer = DeviceSerializer(sensors, many=True)
+        projection = request_projection(request, DeviceSerializer)
         content = {
             'devices': {
-                'relays': r_serializer.data,
-                'sensors': s_serializer.data
+                'relays': [],
+                'sensors': [],
             },
-            'workspaces': w_serializer.data
+            'workspaces': pk_name_projection.render(Workspace.objects.all())
         }
-        return Response(content)
+        if not KeysetPagination.requested(request):
+            # joined from the devices fragments, only the changed devices are rendered
+            return b'{"devices":{"relays":%s,"sensors":%s},"workspaces":%s}' % (
+                fragments.render(devices.filter(type='relay'), projection),
+                fragments.render(devices.filter(type='sensor'), projection),
+                JSONRenderer().render(content['workspaces']),
+            )
+
+        # one page of the devices ordered by pk, split by the type
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(projection.values(devices, 'type'), request, self)
+        for device_type, key in [('relay', 'relays'), ('sensor', 'sensors')]:
+            content['devices'][key] = projection.render_rows(row for row in page if row['type'] == device_type)
+        content['next'] = paginator.get_next_link()
+        content['previous'] = paginator.get_previous_link()
+        return content
 
 
 class DeviceSearch(APIView):
     def get(self, request):
-        search_by = request.query_params.get('name')
+        """
+        Search devices or workspaces (scope=workspace) by name, the prefix matches are returned first
+        :param request:
+        :return: Response
+        """
+        search_by = request.query_params.get('name', '')
         if len(search_by) < 2:
             raise ValidationError('You must enter at least 2 character to search.')
-
-        devices = Device.objects.filter(name__contains=search_by)
-        # for devices used the same serializer only two same fields wanted.
-        d_serializer = PkNameSerializer(devices, many=True)
-        return Response(d_serializer.data)
+        scope = request.query_params.get('scope', 'device')
+        if scope not in search.indexes:
+            raise ValidationError({'error': 'The search scope must be device or workspace'})
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), 100)
+        except ValueError:
+            raise ValidationError({'error': 'The limit must be numeric'})
+        if limit < 1:
+            raise ValidationError({'error': 'The limit must be at least 1'})
+        return Response(search.search(scope, search_by, limit))
 
 
 class DeviceList(APIView):
+    renderer_classes = [PreRenderedJSONRenderer, BrowsableAPIRenderer]
 
     def get(self, request):
         """
-        Get all devices if parameter type it'll filter by type
+        Get all devices if parameter type it'll filter by type, paginated by ?limit= and ?cursor=
         :param request:
         :return: Response
         """
         device_type = request.query_params.get('type')
         devices = Device.objects.filter(type=device_type) if device_type else Device.objects.all()
-        serializer = DeviceDetailSerializer(devices, many=True)
-        return Response(serializer.data)
+        if KeysetPagination.requested(request):
+            return list_response(request, devices, DeviceDetailSerializer, self)
+        return Response(fragments.render(devices, request_projection(request, DeviceDetailSerializer)))
 
     def post(self, request):
         """
@@ -122,6 +187,18 @@ class DeviceDetail(mixins.RetrieveModelMixin,
         return self.destroy(request, *args, **kwargs)
 
 
+class StreamTicket(APIView):
+    def post(self, request):
+        """
+        Method for issuing the single use ticket of the readings stream, it's sent as ?ticket= by the clients
+        which can't set the Authorization header
+        :return: Response
+        """
+        expires = request.auth.get('exp') if hasattr(request.auth, 'get') else None
+        ticket = streams.issue_ticket(request.user.pk, expires)
+        return Response({'ticket': ticket, 'expires_in': streams.TICKET_TIMEOUT}, status=status.HTTP_201_CREATED)
+
+
 class DeviceReadings(APIView):
     def get(self, request, device_id):
         """
@@ -133,6 +210,32 @@ class DeviceReadings(APIView):
         return Response(serializer.data)
 
 
+class DeviceReadingsBulk(APIView):
+    def get(self, request):
+        """
+        Get the readings of many devices with one query, the devices are selected by ?ids=1,2 or ?workspace=1
+        :param request:
+        :return: Response {pk: {readings, updated_at}}
+        """
+        ids = [pk for param in request.query_params.getlist('ids') for pk in param.split(',') if pk]
+        workspace_id = request.query_params.get('workspace')
+        if not ids and not workspace_id:
+            raise ValidationError({'error': 'The device IDs or workspace must be given'})
+        try:
+            devices = Device.objects.filter(pk__in=[int(pk) for pk in ids]) if ids else \
+                Device.objects.filter(workspace_id=int(workspace_id))
+        except ValueError:
+            raise ValidationError({'error': 'The device IDs and workspace must be numeric'})
+
+        updated_at_field = DateTimeField()
+        return Response({
+            pk: {
+                'readings': readings,
+                'updated_at': updated_at_field.to_representation(updated_at) if updated_at else None,
+            } for pk, readings, updated_at in devices.values_list('pk', 'readings', 'updated_at')
+        })
+
+
 class UpdateReadings(APIView):
     @staticmethod
     def __decode_body_msg(body) -> dict:
@@ -152,7 +255,7 @@ class UpdateReadings(APIView):
         :return: Response
         """
         if not isinstance(request.data, list):
-            logger.error('UpdateReadings - Supplied %s needed list' % str(type(request.data)))
+            logger.error('UpdateReadings - Supplied %s needed list', type(request.data))
             raise MethodNotAllowed(method=self, detail='Request data must be a list')
         for item in request.data:
             try:
@@ -169,7 +272,7 @@ class UpdateReadings(APIView):
                 logger.error('UpdateReadings - KeyError. Happened during assigning values body and properties')
                 continue
             except NotImplementedError as e:
-                logger.error('UpdateReadings - %s' % str(e))
+                logger.error('UpdateReadings - %s', e)
                 continue
             except json.decoder.JSONDecodeError:
                 logger.error('UpdateReadings - Error when trying to convert body to json')
@@ -190,14 +293,14 @@ class UpdateReadings(APIView):
                     readings = obtained_device.get_readings()
                     device.readings = readings
                     device.updated_at = timezone.now()
-                    device.save()
+                    device.save(update_fields=['readings', 'updated_at'])
+                    hub.publish(reading_message(device))
                     # save this event to the database
                     if save_to_db:
                         DeviceLog.objects.create(readings=readings, device=device)
 
                 except DeviceException as e:
-                    logger.warning(
-                        'UpdateReadings - Readings were not updated; %s; Device - %s' % (str(e), device.name))
+                    logger.warning('UpdateReadings - Readings were not updated; %s; Device - %s', e, device.name)
                     continue
         return Response({
             'msg': 'success',
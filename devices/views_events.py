@@ -1,9 +1,12 @@
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import make_aware, is_naive
 from rest_framework import mixins, generics
 from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from devices.backtest import backtest, RULES, ACTIONS
 from devices.models import Device, DeviceEvent
 from devices.serializers import PkNameSerializer, DeviceEventSerializer
 
@@ -96,3 +99,57 @@ class DeviceEventCreate(mixins.CreateModelMixin, generics.GenericAPIView):
         validate.is_valid(request)
 
         return self.create(request, *args, **kwarg)
+
+
+class EventBacktest(APIView):
+    def post(self, request):
+        """
+        Check how often the candidate sensor rules would have fired against the sensor log
+        :param request: {
+            'sensor': int,
+            'reading_type': str,
+            'rules': [{'rule': '>' or '<', 'value': float, 'hysteresis': float, 'action': 'ON' or 'OFF'}],
+            'date_from': optional datetime,
+            'date_to': optional datetime
+        }
+        :return: Response
+        """
+        sensor = get_object_or_404(Device, pk=request.data.get('sensor'), type='sensor')
+        reading_type = request.data.get('reading_type')
+        if not reading_type:
+            raise ValidationError({'error': 'Sensor reading type is required'})
+        rules = self.validate_rules(request.data.get('rules'))
+        try:
+            date_from = self.parse_date(request.data.get('date_from'))
+            date_to = self.parse_date(request.data.get('date_to'))
+        except ValueError:
+            raise ValidationError({'error': 'The date must be in ISO 8601 format'})
+        return Response(backtest(sensor, reading_type, rules, date_from, date_to))
+
+    @staticmethod
+    def parse_date(value):
+        if not value:
+            return None
+        date = parse_datetime(value)
+        if not date:
+            raise ValueError('Wrong date format')
+        return make_aware(date) if is_naive(date) else date
+
+    @staticmethod
+    def validate_rules(rules) -> list:
+        if not rules or not isinstance(rules, list):
+            raise ValidationError({'error': 'At least one rule is required'})
+        validated = []
+        for rule in rules:
+            try:
+                validated.append({
+                    'rule': rule['rule'],
+                    'value': float(rule['value']),
+                    'hysteresis': float(rule.get('hysteresis') or 0),
+                    'action': str(rule.get('action', 'OFF')).upper(),
+                })
+            except (KeyError, TypeError, ValueError):
+                raise ValidationError({'error': 'The rule must contain the rule and numeric value'})
+            if validated[-1]['rule'] not in RULES or validated[-1]['action'] not in ACTIONS:
+                raise ValidationError({'error': 'The rule or action isn\'t implemented'})
+        return validated
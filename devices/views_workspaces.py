@@ -1,45 +1,53 @@
-from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import Avg, Count, FloatField, Max, Min, Q
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast
 from rest_framework import status, mixins, generics
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from backend.pagination import list_response
+from devices import dashboard_cache
 from devices.models import Device, Workspace
 from devices.serializers import PkNameSerializer
 
 
 def attach_device_list_to_workspace(devices, workspace):
+    """
+    Replace the devices of the workspace. The new devices are attached and the previously attached ones cleared
+    by two update statements in one transaction. The IDs are validated by the row count of the attach in the same
+    transaction, so a device deleted meanwhile rolls the change back.
+    :param devices: list of the device IDs
+    :param workspace: Workspace
+    :return: dict with the error or None
+    """
     try:
-        attached_devices = Device.objects.filter(workspace=workspace)
-        # clear previously attached devices
-        for device in attached_devices:
-            device.workspace = None
-            device.save()
-        if not devices:
-            return
-        for device_id in devices:
-            device = Device.objects.get(pk=device_id)
-            device.workspace = workspace
-            device.save()
-    except ValueError:
+        device_ids = {int(device_id) for device_id in devices or []}
+    except (TypeError, ValueError):
         return {
             'error': 'The device ID isn\'t numeric'
         }
-    except ObjectDoesNotExist:
-        return {
-            'error': 'The device doesn\'t exist'
-        }
+    try:
+        with transaction.atomic():
+            if device_ids and Device.objects.filter(pk__in=device_ids).update(workspace=workspace) != len(device_ids):
+                transaction.set_rollback(True)
+                return {
+                    'error': 'The device doesn\'t exist'
+                }
+            # clear previously attached devices
+            Device.objects.filter(workspace=workspace).exclude(pk__in=device_ids).update(workspace=None)
     except Exception as error:
         return {
             'error': str(error)
         }
+    # the update doesn't send the save signals
+    dashboard_cache.metadata_changed()
 
 
 class WorkspaceList(APIView):
     def get(self, request):
-        workspaces = Workspace.objects.all()
-        serializer = PkNameSerializer(workspaces, many=True)
-        return Response(serializer.data)
+        return list_response(request, Workspace.objects.all(), PkNameSerializer, self)
 
     def post(self, request):
         # add new workspace
@@ -58,6 +66,38 @@ class WorkspaceList(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class WorkspaceSummary(APIView):
+    def get(self, request):
+        """
+        Get the workspaces with the number of devices per type, relays on and the current temperatures.
+        The summary is computed by one query and cached till the readings or metadata changed.
+        :param request:
+        :return: Response
+        """
+        # the readings of all devices bump the all scope
+        etag = dashboard_cache.validators(dashboard_cache.ALL_SCOPE, 'summary')[0]
+        content = dashboard_cache.get_payload(etag)
+        if content is None:
+            content = list(self.get_summary())
+            dashboard_cache.set_payload(etag, content)
+        return Response(content)
+
+    @staticmethod
+    def get_summary():
+        relays = Q(device__type='relay')
+        sensors = Q(device__type='sensor')
+        temperature = Cast(KeyTextTransform('temperature', 'device__readings'), FloatField())
+        return Workspace.objects.annotate(
+            relays=Count('device', filter=relays),
+            sensors=Count('device', filter=sensors),
+            relays_on=Count('device', filter=relays & Q(device__readings__state='ON')),
+            temperature_min=Min(temperature, filter=sensors),
+            temperature_max=Max(temperature, filter=sensors),
+            temperature_avg=Avg(temperature, filter=sensors),
+        ).order_by('name').values('pk', 'name', 'relays', 'sensors', 'relays_on', 'temperature_min',
+                                  'temperature_max', 'temperature_avg')
+
+
 class WorkspaceDetail(mixins.RetrieveModelMixin,
                       mixins.UpdateModelMixin,
                       mixins.CreateModelMixin,
@@ -0,0 +1,120 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+USER_KEY = 'auth:user:%s'
+TOKEN_KEY = 'auth:token:%s'
+
+
+def user_cache_timeout() -> int:
+    """
+    Seconds the authenticated user is cached, it's never longer than the access token lifetime
+    :return: int
+    """
+    lifetime = int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+    return min(getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60), lifetime)
+
+
+def invalidate_user(user_id):
+    cache.delete(USER_KEY % user_id)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication with the users cached by the user id, the frequent requests of the same user
+    don't query the database. The user is removed from the cache when saved or deleted.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+        key = USER_KEY % user_id
+        user = cache.get(key)
+        if user is None:
+            # the inactive or not existing user raises the exception so it's never cached
+            user = super().get_user(validated_token)
+            cache.set(key, user, user_cache_timeout())
+        return user
+
+
+class LocalCache:
+    """
+    Small in-process LRU cache with the expiration, it's in front of the shared cache
+    """
+
+    def __init__(self, max_size: int, timeout: float):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.__lock = threading.Lock()
+        self.__items = OrderedDict()
+
+    def get(self, key):
+        with self.__lock:
+            item = self.__items.get(key)
+            if item is None:
+                return None
+            if item[1] < time.monotonic():
+                del self.__items[key]
+                return None
+            self.__items.move_to_end(key)
+            return item[0]
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self.__lock:
+            self.__items[key] = (value, time.monotonic() + self.timeout)
+            self.__items.move_to_end(key)
+            while len(self.__items) > self.max_size:
+                self.__items.popitem(last=False)
+
+    def delete(self, key):
+        with self.__lock:
+            self.__items.pop(key, None)
+
+    def clear(self):
+        with self.__lock:
+            self.__items.clear()
+
+
+# the other processes can't invalidate it so the timeout is short
+local_tokens = LocalCache(getattr(settings, 'AUTH_TOKEN_LOCAL_CACHE_SIZE', 1000),
+                          getattr(settings, 'AUTH_TOKEN_LOCAL_CACHE_TIMEOUT', 5))
+
+
+def token_cache_key(key: str) -> str:
+    # the token isn't stored in the cache keys
+    return TOKEN_KEY % hashlib.sha256(key.encode()).hexdigest()
+
+
+def invalidate_token(key: str):
+    cache_key = token_cache_key(key)
+    local_tokens.delete(cache_key)
+    cache.delete(cache_key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication with the token and user cached by the key in the in-process LRU and the shared cache.
+    The token is removed from the caches when the token or its user is saved or deleted.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        credentials = local_tokens.get(cache_key)
+        if credentials is None:
+            credentials = cache.get(cache_key)
+            if credentials is None:
+                # the not existing token or inactive user raises the exception so it's never cached
+                credentials = super().authenticate_credentials(key)
+                cache.set(cache_key, credentials, getattr(settings, 'AUTH_TOKEN_CACHE_TIMEOUT', 5 * 60))
+            local_tokens.set(cache_key, credentials)
+        return credentials
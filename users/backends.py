@@ -3,7 +3,17 @@ from django.contrib.auth.models import User
 
 class EmailAuth:
 
-    """Authenticate a user by an exact match on the email and password"""
+    """Authenticate a user by a case-insensitive match on the email and password"""
+
+    @staticmethod
+    def get_user_by_email(email):
+        """
+        Get the user by the email ignoring the case, the lookup uses the UPPER(email) index on PostgreSQL
+        """
+        try:
+            return User.objects.get(email__iexact=email)
+        except (User.DoesNotExist, User.MultipleObjectsReturned):
+            return None
 
     @staticmethod
     def authenticate(email=None, password=None):
@@ -11,15 +21,11 @@ class EmailAuth:
         Get an instance of `User` based off the email and verify the
         password
         """
-        try:
-            user = User.objects.get(email=email)
-
-            if user.check_password(password):
-                return user
+        user = EmailAuth.get_user_by_email(email)
+        if user and user.check_password(password):
+            return user
 
-            return None
-        except User.DoesNotExist:
-            return None
+        return None
 
     @staticmethod
     def get_user(user_id):
@@ -0,0 +1,94 @@
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+# changed by every blacklisted token so the other processes load the new ones
+VERSION_KEY = 'auth:blacklist:version'
+
+
+class TokenBlacklist:
+    """
+    In-memory set of the blacklisted JTIs, used only with the shared cache. The new tokens are loaded incrementally
+    when the version in the cache changed, all of them are reloaded every TOKEN_BLACKLIST_SYNC_INTERVAL seconds
+    so the rows committed out of order or removed by the compaction are reflected as well. The set is loaded
+    by the first check in the process.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.__tokens = set()
+        self.__last_id = 0
+        self.__version = None
+        self.__loaded_at = None
+
+    def sync(self):
+        version = cache.get(VERSION_KEY)
+        interval = getattr(settings, 'TOKEN_BLACKLIST_SYNC_INTERVAL', 60)
+        with self.__lock:
+            if self.__loaded_at is None or time.monotonic() - self.__loaded_at > interval:
+                self.__load(full=True)
+            elif version != self.__version:
+                self.__load(full=False)
+            self.__version = version
+
+    def __load(self, full: bool):
+        rows = BlacklistedToken.objects.filter(token__expires_at__gt=aware_utcnow())
+        if not full:
+            rows = rows.filter(pk__gt=self.__last_id)
+        rows = list(rows.values_list('pk', 'token__jti'))
+        if full:
+            self.__tokens = {jti for pk, jti in rows}
+            self.__loaded_at = time.monotonic()
+        else:
+            self.__tokens.update(jti for pk, jti in rows)
+        self.__last_id = max([pk for pk, jti in rows] + [0 if full else self.__last_id])
+
+    def add(self, jti: str):
+        with self.__lock:
+            self.__tokens.add(jti)
+        cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+    def __contains__(self, jti: str) -> bool:
+        self.sync()
+        return jti in self.__tokens
+
+    def __len__(self):
+        return len(self.__tokens)
+
+
+blacklist = TokenBlacklist()
+
+
+class CachedBlacklistRefreshToken(RefreshToken):
+    """
+    Refresh token checked against the in-memory blacklist rather than the blacklist table when the cache is shared.
+    The per-process cache can't tell the other processes about the new tokens, then the table is checked.
+    """
+
+    def check_blacklist(self):
+        if not getattr(settings, 'SHARED_CACHE', False):
+            return super().check_blacklist()
+        if self.payload[api_settings.JTI_CLAIM] in blacklist:
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        result = super().blacklist()
+        blacklist.add(self.payload[api_settings.JTI_CLAIM])
+        return result
+
+
+class CachedBlacklistTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = CachedBlacklistRefreshToken
@@ -0,0 +1,110 @@
+import logging
+import os
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger('django')
+
+
+class CircuitBreaker:
+    """
+    Stop calling the failing service. After failure_threshold failures in a row the circuit is open and
+    the calls are rejected for reset_timeout seconds, then the calls are tried again and the first failure
+    opens the circuit again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.__lock = threading.Lock()
+        self.__failures = 0
+        self.__opened_at = None
+
+    def allow(self) -> bool:
+        with self.__lock:
+            if self.__opened_at is None:
+                return True
+            if time.monotonic() - self.__opened_at >= self.reset_timeout:
+                # half open
+                self.__opened_at = None
+                self.__failures = self.failure_threshold - 1
+                return True
+            return False
+
+    def success(self):
+        with self.__lock:
+            self.__failures = 0
+            self.__opened_at = None
+
+    def failure(self):
+        with self.__lock:
+            self.__failures += 1
+            if self.__failures >= self.failure_threshold:
+                self.__opened_at = time.monotonic()
+
+    @property
+    def is_open(self) -> bool:
+        return self.__opened_at is not None
+
+
+class CaptchaVerifier:
+    """
+    Verify the reCAPTCHA responses with the pooled connections and the timeouts, the unavailable service
+    is not called while the circuit breaker is open. The captcha is treated as invalid when it can't be verified.
+    The verdicts aren't cached, the response token can be used only once.
+    """
+
+    def __init__(self, url: str = None, timeout: tuple = None, pool_size: int = 10, failure_threshold: int = None,
+                 reset_timeout: float = None):
+        self.url = url or getattr(settings, 'CAPTCHA_VERIFY_URL', 'https://www.google.com/recaptcha/api/siteverify')
+        # connect and read timeouts in seconds
+        self.timeout = timeout or getattr(settings, 'CAPTCHA_TIMEOUT', (3.05, 5))
+        self.breaker = CircuitBreaker(
+            failure_threshold or getattr(settings, 'CAPTCHA_FAILURE_THRESHOLD', 5),
+            reset_timeout if reset_timeout is not None else getattr(settings, 'CAPTCHA_RESET_TIMEOUT', 30),
+        )
+        self.session = requests.Session()
+        self.session.mount(self.url, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+
+    def verify(self, recaptcha_response: str) -> bool:
+        """
+        Verify the captcha response
+        :param recaptcha_response: token sent by the client
+        :return: True if valid
+        """
+        captcha_secret = os.environ.get('CAPTCHA_SECRET')
+        if not captcha_secret or not recaptcha_response or not isinstance(recaptcha_response, str):
+            return False
+        if not self.breaker.allow():
+            logger.warning('CaptchaVerifier - The verification is skipped, the service is unavailable')
+            return False
+
+        try:
+            response = self.session.post(self.url, data={
+                'secret': captcha_secret,
+                'response': recaptcha_response
+            }, timeout=self.timeout)
+        except requests.RequestException as e:
+            logger.warning('CaptchaVerifier - The verification failed; %s', e)
+            self.breaker.failure()
+            return False
+        if response.status_code >= 500:
+            logger.warning('CaptchaVerifier - The verification failed with the status %s', response.status_code)
+            self.breaker.failure()
+            return False
+        self.breaker.success()
+
+        if not response.headers.get('Content-Type', '').startswith('application/json'):
+            return False
+        try:
+            data = response.json()
+        except ValueError:
+            return False
+        return isinstance(data, dict) and data.get('success') is True
+
+
+verifier = CaptchaVerifier()
@@ -0,0 +1,157 @@
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import authenticate, user_login_failed
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser, FormParser, MultiPartParser
+from rest_framework.request import Request
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users.backends import EmailAuth
+
+ATTEMPTS_KEY = 'login:attempts:%s'
+# the backends verified by the username or email lookup and the password check in the executor
+EXECUTOR_BACKENDS = {'django.contrib.auth.backends.ModelBackend', 'users.backends.EmailAuth'}
+INVALID_CREDENTIALS = 'No active account found with the given credentials'
+
+# the password hashing is CPU bound, the workers bound the number of the logins hashed at once
+hasher_executor = ThreadPoolExecutor(max_workers=getattr(settings, 'LOGIN_HASHER_WORKERS', 4),
+                                     thread_name_prefix='login-hasher')
+
+
+def get_credentials(request) -> dict:
+    drf_request = Request(request, parsers=[JSONParser(), FormParser(), MultiPartParser()])
+    return {field: drf_request.data.get(field) for field in ('username', 'password')}
+
+
+def client_ip(request) -> str:
+    # behind the proxy the server must set REMOTE_ADDR from the forwarded headers, e.g. uvicorn --proxy-headers
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def attempts_key(identifier: str, ip: str) -> str:
+    # the attempts are counted per the username and the client, the failed attempts of the other clients
+    # don't lock the account out
+    return ATTEMPTS_KEY % hashlib.sha256(('%s:%s' % (identifier.lower(), ip)).encode()).hexdigest()
+
+
+def is_rate_limited(identifier: str, ip: str) -> bool:
+    """
+    Check the failed login attempts of the identifier from the client
+    :param identifier: username or email
+    :param ip: client IP address
+    :return: True when the failed attempts reached LOGIN_RATE_LIMIT in the window
+    """
+    attempts = getattr(settings, 'LOGIN_RATE_LIMIT', (10, 60))[0]
+    return cache.get(attempts_key(identifier, ip), 0) >= attempts
+
+
+def record_attempt(identifier: str, ip: str, success: bool):
+    key = attempts_key(identifier, ip)
+    if success:
+        cache.delete(key)
+        return
+    window = getattr(settings, 'LOGIN_RATE_LIMIT', (10, 60))[1]
+    if not cache.add(key, 1, window):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # the key expired meanwhile
+            cache.add(key, 1, window)
+
+
+def get_user(identifier: str) -> User or None:
+    user = User.objects.filter(username=identifier).first()
+    if user is None and '@' in identifier:
+        user = EmailAuth.get_user_by_email(identifier)
+    return user
+
+
+def verify_password(user: User, password: str) -> tuple:
+    """
+    Verify the password in the hasher executor, the hash is upgraded on the request thread
+    so the executor threads don't hold the database connections
+    :return: (valid, the hash must be upgraded)
+    """
+    must_update = []
+    valid = check_password(password, user.password, setter=lambda raw_password: must_update.append(True))
+    return valid, bool(must_update)
+
+
+def upgrade_password(user: User, password: str):
+    # the same as the setter of User.check_password
+    user.set_password(password)
+    user.save(update_fields=['password'])
+
+
+def login_failed(request, username: str):
+    user_login_failed.send(sender=__name__, credentials={'username': username}, request=request)
+
+
+def get_tokens(user: User) -> dict:
+    refresh = RefreshToken.for_user(user)
+    return {
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+    }
+
+
+async def login(request):
+    """
+    Obtain the refresh and access tokens by the username or email and password. The user is loaded on the
+    request thread, the password is verified in the bounded executor so the logins don't block the other requests.
+    With the other AUTHENTICATION_BACKENDS the credentials are verified by authenticate() on the request thread.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'detail': 'Method "%s" not allowed.' % request.method},
+                            status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    try:
+        credentials = await sync_to_async(get_credentials)(request)
+    except ParseError as error:
+        return JsonResponse({'detail': str(error.detail)}, status=status.HTTP_400_BAD_REQUEST)
+    errors = {field: ['This field is required.'] for field, value in credentials.items() if not value}
+    errors.update({field: ['Not a valid string.'] for field, value in credentials.items()
+                   if value and not isinstance(value, str)})
+    if errors:
+        return JsonResponse(errors, status=status.HTTP_400_BAD_REQUEST)
+
+    username, password = credentials['username'], credentials['password']
+    ip = client_ip(request)
+    if await sync_to_async(is_rate_limited)(username, ip):
+        return JsonResponse({'detail': 'Too many login attempts, try again later.'},
+                            status=status.HTTP_429_TOO_MANY_REQUESTS)
+
+    if not set(settings.AUTHENTICATION_BACKENDS) <= EXECUTOR_BACKENDS:
+        # the custom backends are verified on the request thread, authenticate sends user_login_failed
+        user = await sync_to_async(authenticate)(request, username=username, password=password)
+        success = user is not None
+    else:
+        user = await sync_to_async(get_user)(username)
+        loop = asyncio.get_running_loop()
+        if user is None:
+            # hash the password anyway so the missing user isn't revealed by the response time
+            await loop.run_in_executor(hasher_executor, make_password, password)
+            valid, must_update = False, False
+        else:
+            valid, must_update = await loop.run_in_executor(hasher_executor, verify_password, user, password)
+        if valid and must_update:
+            await sync_to_async(upgrade_password)(user, password)
+        success = valid and user.is_active
+        if not success:
+            await sync_to_async(login_failed)(request, username)
+    await sync_to_async(record_attempt)(username, ip, success)
+    if not success:
+        return JsonResponse({'detail': INVALID_CREDENTIALS}, status=status.HTTP_401_UNAUTHORIZED)
+    return JsonResponse(await sync_to_async(get_tokens)(user))
+
+
+# the async view can't be wrapped by csrf_exempt in this Django version
+login.csrf_exempt = True
@@ -0,0 +1,152 @@
+import atexit
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail import get_connection, EmailMessage
+
+logger = logging.getLogger('django')
+
+
+class MailQueue:
+    """
+    Outbound mail queue sent by the background thread. The queued messages are sent in batches over one
+    connection. The failed message doesn't stop the rest of the batch, it's retried alone with the exponential
+    backoff while the worker keeps sending the other messages.
+    The queue is in memory so the messages not sent yet are lost when the process is killed.
+    """
+
+    def __init__(self, batch_size: int = None, max_retries: int = None, backoff: float = None):
+        self.batch_size = batch_size or getattr(settings, 'MAIL_QUEUE_BATCH_SIZE', 50)
+        self.max_retries = max_retries if max_retries is not None else getattr(settings, 'MAIL_QUEUE_MAX_RETRIES', 3)
+        self.backoff = backoff if backoff is not None else getattr(settings, 'MAIL_QUEUE_BACKOFF', 1)
+        # (message, attempt)
+        self.__queue = queue.Queue()
+        # (due time, sequence, message, attempt) waiting for the retry, used only by the worker thread
+        self.__retries = []
+        self.__sequence = itertools.count()
+        self.__lock = threading.Lock()
+        self.__thread = None
+
+    def enqueue(self, message: EmailMessage):
+        with self.__lock:
+            if self.__thread is None or not self.__thread.is_alive():
+                self.__thread = threading.Thread(target=self.__run, name='mail-queue', daemon=True)
+                self.__thread.start()
+        self.__queue.put((message, 0))
+
+    def __run(self):
+        while True:
+            batch = self.__due_retries()
+            try:
+                if not batch:
+                    batch.append(self.__queue.get(timeout=self.__next_retry_in()))
+                while len(batch) < self.batch_size:
+                    batch.append(self.__queue.get_nowait())
+            except queue.Empty:
+                pass
+            if not batch:
+                continue
+            try:
+                self.process(batch)
+            except Exception as e:
+                logger.error('MailQueue - Unexpected error; %s', e)
+
+    def __due_retries(self) -> list:
+        now = time.monotonic()
+        due = []
+        while self.__retries and self.__retries[0][0] <= now and len(due) < self.batch_size:
+            _, _, message, attempt = heapq.heappop(self.__retries)
+            due.append((message, attempt))
+        return due
+
+    def __next_retry_in(self) -> float or None:
+        if not self.__retries:
+            return None
+        return max(self.__retries[0][0] - time.monotonic(), 0)
+
+    def process(self, batch: list):
+        """
+        Send the batch, the failed messages are scheduled for the retry or dropped after max_retries
+        :param batch: list of (EmailMessage, attempt)
+        :return: None
+        """
+        attempts = {id(message): attempt for message, attempt in batch}
+        failed = self.send_batch([message for message, _ in batch])
+        for message in failed:
+            attempt = attempts[id(message)] + 1
+            if attempt <= self.max_retries:
+                due = time.monotonic() + self.backoff * 2 ** (attempt - 1)
+                heapq.heappush(self.__retries, (due, next(self.__sequence), message, attempt))
+            else:
+                logger.error('MailQueue - Message "%s" was not sent after %i attempts', message.subject, attempt)
+                self.__queue.task_done()
+        for _ in range(len(batch) - len(failed)):
+            self.__queue.task_done()
+
+    def send_batch(self, messages: list) -> list:
+        """
+        Send the messages over one connection, the connection is reopened after the failed message
+        :param messages: list of EmailMessage
+        :return: list of the messages not sent
+        """
+        failed = []
+        connection = None
+        for index, message in enumerate(messages):
+            if connection is None:
+                connection = get_connection()
+                try:
+                    connection.open()
+                except Exception as e:
+                    # the server is unavailable, the rest of the batch is retried later
+                    logger.warning('MailQueue - Connection failed; %s', e)
+                    return failed + messages[index:]
+            try:
+                connection.send_messages([message])
+            except Exception as e:
+                logger.warning('MailQueue - Sending "%s" failed; %s', message.subject, e)
+                failed.append(message)
+                self.__close(connection)
+                connection = None
+        self.__close(connection)
+        return failed
+
+    @staticmethod
+    def __close(connection):
+        if connection is None:
+            return
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Wait till the queued messages are processed
+        :param timeout: seconds
+        :return: False after the timeout
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self.__queue.all_tasks_done:
+            while self.__queue.unfinished_tasks:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.__queue.all_tasks_done.wait(remaining)
+        return True
+
+
+mail_queue = MailQueue()
+# give the sender the chance to finish before the process exits
+atexit.register(mail_queue.flush, 10)
+
+
+def queue_mail(subject: str, message: str, from_email: str, recipient_list: list):
+    """
+    Queue the message, the arguments are the same as send_mail
+    """
+    mail_queue.enqueue(EmailMessage(subject, message, from_email, recipient_list))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+
+class Command(BaseCommand):
+    help = 'Remove the expired outstanding and blacklisted tokens in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Number of the tokens removed at once')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to wait between the chunks')
+
+    def handle(self, *args, **options):
+        now = aware_utcnow()
+        removed = 0
+        while True:
+            # the blacklisted tokens are removed with the outstanding ones by the cascade
+            ids = list(OutstandingToken.objects.filter(expires_at__lte=now).order_by('pk')
+                       .values_list('pk', flat=True)[:options['chunk_size']])
+            if not ids:
+                break
+            OutstandingToken.objects.filter(pk__in=ids).delete()
+            removed += len(ids)
+            if options['pause']:
+                time.sleep(options['pause'])
+        self.stdout.write('Removed %i expired tokens' % removed)
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+def create_email_index(apps, schema_editor):
+    # the email__iexact lookup compares UPPER(email), the expression index is available on PostgreSQL only
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE INDEX IF NOT EXISTS auth_user_email_upper ON auth_user (UPPER(email))')
+
+
+def drop_email_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS auth_user_email_upper')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_email_index, drop_email_index),
+    ]
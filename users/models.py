@@ -1,12 +1,18 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django_rest_passwordreset.signals import reset_password_token_created
-from django.core.mail import send_mail
+from rest_framework.authtoken.models import Token
+
+from users.authentication import invalidate_user, invalidate_token
+from users.mail_queue import queue_mail
 
 
 @receiver(reset_password_token_created)
 def password_reset_token_created(sender, instance, reset_password_token, *args, **kwargs):
     email_plaintext_message = '{}?token={}'.format('http://home-automation.dev/', reset_password_token.key)
-    send_mail(
+    # the mail is sent by the background sender so the request doesn't wait for SMTP
+    queue_mail(
         # title:
         "Password Reset for {title}".format(title="Some website title"),
         # message:
@@ -16,3 +22,18 @@ def password_reset_token_created(sender, instance, reset_password_token, *args,
         # to:
         [reset_password_token.user.email]
     )
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    # the authenticated user is cached by the id
+    invalidate_user(instance.pk)
+    for key in Token.objects.filter(user_id=instance.pk).values_list('key', flat=True):
+        invalidate_token(key)
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def token_changed(sender, instance, **kwargs):
+    invalidate_token(instance.key)
@@ -1,12 +1,31 @@
 import json
+import os
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
 from unittest.mock import Mock, patch
 
+from django.contrib.auth import user_login_failed
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
 from django.core import mail
+from django.core.mail import EmailMessage, get_connection
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
 import urllib.parse as urlparse
 
+from users import captcha
+from users.blacklist import blacklist, VERSION_KEY
+from users.captcha import CaptchaVerifier
+from users.mail_queue import MailQueue, mail_queue
 from users.views import ResetPasswordView
 
 
@@ -67,6 +86,7 @@ class TestUsers(APITestCase):
             'recaptcha_response': 'captcha'
         })
         self.assertEqual(login.json(), {'status': 'OK'})
+        self.assertTrue(mail_queue.flush(5))
         self.assertEqual(len(mail.outbox), 1)
         message = mail.outbox[0]
         parsed = urlparse.urlparse(message.body)
@@ -120,6 +140,56 @@ class TestUsers(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(10, len(json_response))
 
+    def test_users_list_pages(self):
+        self.__authenticate()
+        for i in range(1, 4):
+            User.objects.create_user(username='username_%i' % i, email='email@email{}.com'.format(i))
+        response = self.client.get('/api/v1/users/?limit=3&fields=username')
+        content = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content['results'], [{'username': 'username'}, {'username': 'username_1'},
+                                              {'username': 'username_2'}])
+        self.assertEqual(self.client.get(content['next']).json()['results'], [{'username': 'username_3'}])
+
+    def test_authenticated_user_cached(self):
+        self.__authenticate()
+        self.client.get('/api/v1/protected/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/v1/protected/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_drf_token_cached(self):
+        user = User.objects.create_user(username='integration', password='password')
+        token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token {}'.format(token.key))
+        self.client.get('/api/v1/protected/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/v1/protected/')
+        self.assertEqual(response.status_code, 200)
+
+        # rotate the token
+        token.delete()
+        Token.objects.create(user=user)
+        self.assertEqual(self.client.get('/api/v1/protected/').status_code, 401)
+
+    def test_drf_token_invalidated_on_user_save(self):
+        user = User.objects.create_user(username='integration', password='password')
+        token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token {}'.format(token.key))
+        self.assertEqual(self.client.get('/api/v1/protected/').status_code, 200)
+        user.is_active = False
+        user.save()
+        self.assertEqual(self.client.get('/api/v1/protected/').status_code, 401)
+
+    def test_cached_user_invalidated_on_save(self):
+        self.__authenticate()
+        self.client.get('/api/v1/protected/')
+        user = User.objects.get(username='username')
+        user.is_active = False
+        user.save()
+        response = self.client.get('/api/v1/protected/')
+        self.assertEqual(response.status_code, 401)
+
     def test_create_user(self):
         self.assertEqual(User.objects.all().count(), 0)
         self.__authenticate()
@@ -230,3 +300,276 @@ class TestUsers(APITestCase):
             'error': 'You cannot delete the superuser'
         })
         self.assertEqual(User.objects.all().count(), 2)
+
+
+class TestTokenBlacklist(APITestCase):
+    def setUp(self):
+        blacklist.clear()
+        self.user = User.objects.create_user(username='username', password='password')
+
+    def refresh(self, token: RefreshToken):
+        return self.client.post('/api/v1/users/token/refresh/', {'refresh': str(token)})
+
+    @override_settings(SHARED_CACHE=True)
+    def test_refresh_without_queries(self):
+        token = RefreshToken.for_user(self.user)
+        self.refresh(token)
+        with self.assertNumQueries(0):
+            response = self.refresh(token)
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(SHARED_CACHE=True)
+    def test_token_blacklisted_by_other_process(self):
+        token = RefreshToken.for_user(self.user)
+        self.assertEqual(self.refresh(token).status_code, 200)
+        # the other process blacklists the token and changes the version
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token['jti']))
+        cache.set(VERSION_KEY, 'changed')
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_blacklisted_by_other_process_without_shared_cache(self):
+        token = RefreshToken.for_user(self.user)
+        self.assertEqual(self.refresh(token).status_code, 200)
+        # the version changed by the other process isn't seen, the table is checked as by simplejwt
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token['jti']))
+        self.assertEqual(self.refresh(token).status_code, 401)
+        self.assertEqual(len(blacklist), 0)
+
+    def test_compaction(self):
+        expired = RefreshToken.for_user(self.user)
+        expired.blacklist()
+        OutstandingToken.objects.filter(jti=expired['jti']).update(expires_at=timezone.now() - timedelta(days=1))
+        valid = RefreshToken.for_user(self.user)
+        valid.blacklist()
+        call_command('compact_token_blacklist', '--chunk-size', '1', stdout=StringIO())
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [valid['jti']])
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+
+class TestLogin(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='Email@Email.com', username='username', password='password')
+
+    def login(self, username: str, password: str):
+        return self.client.post('/api/v1/users/login/', {'username': username, 'password': password})
+
+    def test_login_by_email_ignoring_case(self):
+        response = self.login('email@EMAIL.com', 'password')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue('access' in response.json() and 'refresh' in response.json())
+
+    def test_password_verified_in_executor(self):
+        threads = []
+
+        def verify(password, encoded, setter=None):
+            threads.append(threading.current_thread().name)
+            return True
+
+        with patch('users.login.check_password', side_effect=verify):
+            self.assertEqual(self.login('username', 'password').status_code, 200)
+        self.assertTrue(threads[0].startswith('login-hasher'))
+
+    def test_inactive_user(self):
+        self.user.is_active = False
+        self.user.save()
+        response = self.login('username', 'password')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'detail': 'No active account found with the given credentials'})
+
+    @override_settings(LOGIN_RATE_LIMIT=(2, 60))
+    def test_rate_limit_failed_attempts(self):
+        self.assertEqual(self.login('username', 'wrong').status_code, 401)
+        self.assertEqual(self.login('username', 'wrong').status_code, 401)
+        self.assertEqual(self.login('USERNAME', 'password').status_code, 429)
+        # the other usernames aren't limited
+        self.assertEqual(self.login('other', 'wrong').status_code, 401)
+        # the failed attempts of the other clients don't lock the account out
+        response = self.client.post('/api/v1/users/login/', {'username': 'username', 'password': 'password'},
+                                    REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, 200)
+
+    def test_required_fields(self):
+        response = self.client.post('/api/v1/users/login/', {'username': 'username'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'password': ['This field is required.']})
+
+    def test_not_string_fields(self):
+        for credentials in [{'username': 1, 'password': 'password'}, {'username': ['username'], 'password': 'x'},
+                            {'username': 'username', 'password': {'a': 1}}, {'username': None, 'password': 1}]:
+            response = self.client.post('/api/v1/users/login/', credentials, format='json')
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'username': ['This field is required.'],
+                                           'password': ['Not a valid string.']})
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.PBKDF2PasswordHasher',
+                                         'django.contrib.auth.hashers.MD5PasswordHasher'])
+    def test_password_hash_upgraded(self):
+        self.user.password = make_password('password', hasher='md5')
+        self.user.save()
+        self.assertEqual(self.login('username', 'password').status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+
+    def test_login_failed_signal(self):
+        failed = []
+
+        def receiver(sender, credentials, request, **kwargs):
+            failed.append(credentials['username'])
+
+        user_login_failed.connect(receiver)
+        try:
+            self.assertEqual(self.login('username', 'wrong').status_code, 401)
+            self.assertEqual(self.login('missing', 'wrong').status_code, 401)
+        finally:
+            user_login_failed.disconnect(receiver)
+        self.assertEqual(failed, ['username', 'missing'])
+
+    @override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.AllowAllUsersModelBackend'])
+    def test_other_authentication_backends(self):
+        # verified by authenticate(), the backend allows the inactive users
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.login('username', 'password').status_code, 200)
+        self.assertEqual(self.login('username', 'wrong').status_code, 401)
+
+
+class CaptchaHandler(BaseHTTPRequestHandler):
+    # set by the test: (status, content type, body, delay)
+    reply = (200, 'application/json', b'{"success": true}', 0)
+    requests = 0
+
+    def do_POST(self):
+        CaptchaHandler.requests += 1
+        status_code, content_type, body, delay = CaptchaHandler.reply
+        self.rfile.read(int(self.headers['Content-Length']))
+        time.sleep(delay)
+        try:
+            self.send_response(status_code)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client timed out
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@patch.dict(os.environ, {'CAPTCHA_SECRET': 'secret'})
+class TestCaptchaVerifier(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), CaptchaHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.url = 'http://127.0.0.1:%i/siteverify' % cls.server.server_port
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        CaptchaHandler.requests = 0
+        self.verifier = CaptchaVerifier(url=self.url, timeout=(1, 0.2), failure_threshold=2, reset_timeout=60)
+
+    def test_verified_response_not_replayed(self):
+        CaptchaHandler.reply = (200, 'application/json', b'{"success": true}', 0)
+        self.assertTrue(self.verifier.verify('token'))
+        # the service rejects the used token, the verdict isn't taken from the cache
+        CaptchaHandler.reply = (200, 'application/json', b'{"success": false, "error-codes": ["timeout-or-duplicate"]}',
+                                0)
+        self.assertFalse(self.verifier.verify('token'))
+        self.assertEqual(CaptchaHandler.requests, 2)
+
+    def test_not_string_response(self):
+        for response in [1, ['token'], {'token': 1}]:
+            self.assertFalse(self.verifier.verify(response))
+        self.assertEqual(CaptchaHandler.requests, 0)
+        response = self.client.post('/api/v1/users/password-reset/', {
+            'email': 'email@email.com',
+            'recaptcha_response': ['captcha']
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_not_successful_response(self):
+        CaptchaHandler.reply = (200, 'application/json', b'{"success": false}', 0)
+        self.assertFalse(self.verifier.verify('token'))
+        CaptchaHandler.reply = (200, 'text/html', b'success', 0)
+        self.assertFalse(self.verifier.verify('token'))
+
+    def test_circuit_opened_after_timeouts(self):
+        CaptchaHandler.reply = (200, 'application/json', b'{"success": true}', 0.5)
+        self.assertFalse(self.verifier.verify('token'))
+        self.assertFalse(self.verifier.verify('token'))
+        self.assertTrue(self.verifier.breaker.is_open)
+        # the service isn't called while the circuit is open
+        CaptchaHandler.reply = (200, 'application/json', b'{"success": true}', 0)
+        self.assertFalse(self.verifier.verify('token'))
+        self.assertEqual(CaptchaHandler.requests, 2)
+
+    def test_password_reset_with_captcha(self):
+        CaptchaHandler.reply = (500, 'application/json', b'{}', 0)
+        with patch.object(captcha, 'verifier', self.verifier):
+            response = self.client.post('/api/v1/users/password-reset/', {
+                'email': 'email@email.com',
+                'recaptcha_response': 'captcha'
+            })
+        self.assertEqual(response.status_code, 400)
+
+
+class TestMailQueue(TestCase):
+    def test_batch_sent_over_one_connection(self):
+        queue = MailQueue(batch_size=10, max_retries=0)
+        with patch('users.mail_queue.get_connection', wraps=get_connection) as mock_connection:
+            self.assertEqual(queue.send_batch([EmailMessage('Subject %i' % i, 'Body', to=['a@a.com'])
+                                               for i in range(3)]), [])
+        mock_connection.assert_called_once()
+        self.assertEqual([message.subject for message in mail.outbox], ['Subject 0', 'Subject 1', 'Subject 2'])
+
+    def test_failed_message_does_not_block_batch(self):
+        queue = MailQueue(max_retries=2, backoff=0)
+        connection = Mock()
+        # the second message fails
+        connection.send_messages.side_effect = [1, ConnectionError('Recipient refused'), 1]
+        messages = [EmailMessage('First'), EmailMessage('Second'), EmailMessage('Third')]
+        with patch('users.mail_queue.get_connection', return_value=connection):
+            self.assertEqual(queue.send_batch(messages), [messages[1]])
+        # reconnected after the failure
+        self.assertEqual(connection.open.call_count, 2)
+        self.assertEqual([call[0][0][0].subject for call in connection.send_messages.call_args_list],
+                         ['First', 'Second', 'Third'])
+
+    def test_failing_message_retried_alone(self):
+        queue = MailQueue(batch_size=10, max_retries=2, backoff=0)
+        sent = []
+
+        def send_messages(messages):
+            if messages[0].subject == 'Bad':
+                raise ConnectionError('Recipient refused')
+            sent.append(messages[0].subject)
+            return 1
+
+        connection = Mock()
+        connection.send_messages.side_effect = send_messages
+        with patch('users.mail_queue.get_connection', return_value=connection):
+            for subject in ['First', 'Bad', 'Third']:
+                queue.enqueue(EmailMessage(subject))
+            self.assertTrue(queue.flush(5))
+        self.assertEqual(sent, ['First', 'Third'])
+        # the first attempt and two retries
+        self.assertEqual([call[0][0][0].subject for call in connection.send_messages.call_args_list].count('Bad'),
+                         3)
+
+    def test_background_sender(self):
+        queue = MailQueue()
+        queue.enqueue(EmailMessage('Queued', 'Body', to=['a@a.com']))
+        self.assertTrue(queue.flush(5))
+        self.assertEqual(mail.outbox[0].subject, 'Queued')
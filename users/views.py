@@ -1,6 +1,3 @@
-import os
-
-import requests
 from django.contrib.auth.models import User
 from django_rest_passwordreset.views import ResetPasswordRequestToken, ResetPasswordConfirm
 from rest_framework import status, mixins, generics
@@ -8,7 +5,10 @@ from rest_framework.exceptions import ValidationError
 from rest_framework.generics import UpdateAPIView, GenericAPIView, get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
+
+from backend.pagination import list_response
+from users import captcha
+from users.blacklist import CachedBlacklistRefreshToken
 from users.serializers import UserSerializer, UserPasswordChangeSerializer, NewUserSerializer
 
 
@@ -28,7 +28,7 @@ class HelloView(APIView):
 class ApiLogout(APIView):
     def post(self, request):
         refresh_token = request.data.get('refresh')
-        token = RefreshToken(refresh_token)
+        token = CachedBlacklistRefreshToken(refresh_token)
         token.blacklist()
         return Response({
             'status': 'Successfully logged out'
@@ -37,9 +37,7 @@ class ApiLogout(APIView):
 
 class UserList(APIView):
     def get(self, request):
-        users = User.objects.all()
-        serializer = UserSerializer(users, many=True)
-        return Response(serializer.data)
+        return list_response(request, User.objects.all(), UserSerializer, self)
 
     def post(self, request):
         serializer = NewUserSerializer(data=request.data)
@@ -105,21 +103,7 @@ class ResetPasswordView(GenericAPIView):
 
     @staticmethod
     def _validate_captcha(recaptcha_response) -> bool:
-        captcha_secret = os.environ.get('CAPTCHA_SECRET')
-        if not captcha_secret:
-            return False
-        response = requests.post(
-            'https://www.google.com/recaptcha/api/siteverify',
-            data={
-                'secret': captcha_secret,
-                'response': recaptcha_response
-            })
-        if not response.headers['Content-Type'].startswith('application/json'):
-            return False
-        json_response = response.json()
-        if 'success' in json_response:
-            return True
-        return False
+        return captcha.verifier.verify(recaptcha_response)
 
     @staticmethod
     def _raise_exception(error):